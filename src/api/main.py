@@ -1,29 +1,67 @@
+import json
 import logging
+import shutil
+import threading
 import traceback
 
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from uuid import uuid4
 from datetime import datetime
 
-from src.api.schemas import BFTRequest, BFTResponse, RAGDocumentRequest, RAGDocumentResponse, HistoryListResponse, HistoryDetailResponse, RagUploadResponse
+from src.api.schemas import BatchJobResponse, BatchRequest, BFTRequest, BFTResponse, RAGDocumentRequest, RAGDocumentResponse, HistoryListResponse, HistoryDetailResponse, HistorySearchResponse, RagUploadResponse, SnapshotImportResponse, SystemAutocompleteResponse
 
+from src.core.batch import BatchRunner
+from src.core.compaction import CompactionInProgress, CompactionJob, enable_incremental_vacuum
+from src.core.concurrency import (
+    AdmissionRejected,
+    get_admission_controller,
+    get_analysis_flight,
+)
+from src.core.idempotency import compute_analysis_key
 from src.core.pipeline import process_bft
+from src.retrieval.budget import RetrievalOptions
 from src.db.base import init_db
+from src.db.registry import init_registry_tracking
+from src.db.search import history_search_available, init_history_search, init_system_search
 from src.config import get_settings
 from src.retrieval.hybrid import (
     build_generic_documents,
     get_hybrid_retrieval_manager,
 )
+from src.retrieval.namespaces import InvalidNamespaceError
+from src.retrieval.snapshot import SnapshotError, export_snapshot, import_snapshot
+from src.retrieval.history_index import (
+    backfill_history_embeddings,
+    embed_bft_text,
+    get_history_similarity_index,
+)
+from src.retrieval.system_index import get_system_search_index
 from src.db import crud
+from src.utils.logging_utils import request_context, setup_logging
+from src.utils.metrics import (
+    ANALYSIS_SECONDS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    IN_FLIGHT,
+    record_cache,
+    render_metrics,
+    stage,
+)
 from langchain_core.documents import Document
 
 
-logging.basicConfig(filename='./tmp/app.log', level=logging.INFO)
-
 settings = get_settings()
+
+setup_logging()
+logger = logging.getLogger(__name__)
 app = FastAPI(title=settings.app_name)
 
+IN_FLIGHT.set_function(lambda: get_admission_controller().active, state="running")
+IN_FLIGHT.set_function(lambda: get_admission_controller().waiting, state="queued")
+
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,15 +71,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    # контекст копируется в потоки синхронных эндпоинтов вместе с request id
+    with request_context(request.headers.get("X-Request-ID")) as request_id:
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 @app.on_event("startup")
 def on_startup():
     init_db()
+    init_registry_tracking()
+    init_system_search()
+    init_history_search()
+    if settings.index_role == "reader":
+        # обслуживание общей БД и возобновление задач — забота процесса-писателя,
+        # иначе каждый воркер выполнял бы их повторно
+        return
+    # однократно: дальше сжатие возвращает место без полного VACUUM живой базы
+    enable_incremental_vacuum()
+    if history_search_available():
+        crud.sync_history_search_index()
+    if settings.history_similarity_enabled:
+        # эмбеддинги старых записей считаются в фоне, не задерживая старт
+        threading.Thread(target=backfill_history_embeddings, daemon=True).start()
+    batch_runner.resume()
+    compaction_job.start(settings.compaction_interval_hours)
 
-@app.post(f"{settings.api_prefix}/analyze", response_model=BFTResponse)
-def analyze_bft(request: BFTRequest):
+
+@app.on_event("shutdown")
+def on_shutdown():
+    batch_runner.shutdown()
+    compaction_job.shutdown()
+
+
+def _index_history_embedding(history_id: int, text: str, embedding=None) -> None:
+    if not settings.history_similarity_enabled:
+        return
     try:
-        result = process_bft(bft_id=request.bft_id, text=request.text)
-        
+        if embedding is None:
+            embedding = embed_bft_text(text)
+        get_history_similarity_index().add(history_id, embedding)
+    except Exception:
+        logger.exception("Failed to index history entry %s", history_id)
+
+
+def _run_analysis(
+    request: BFTRequest,
+    analysis_key: str,
+    prior: dict | None = None,
+    embedding=None,
+    bounded: bool = True,
+) -> BFTResponse:
+    with get_admission_controller().slot(bounded=bounded):
+        with ANALYSIS_SECONDS.time(mode="full" if prior is None else "delta"):
+            result = process_bft(
+                bft_id=request.bft_id,
+                text=request.text,
+                prior=prior,
+                retrieval=_retrieval_options(request),
+                force=request.force,
+            )
+
+    with stage("history_write"):
         history_entry = crud.create_history_entry(
             bft_id=request.bft_id,
             request_text=request.text,
@@ -49,23 +143,241 @@ def analyze_bft(request: BFTRequest):
             artifacts=result.artifacts,
             raw_llm_output=result.raw_llm_output,
             retrieved_context=result.retrieved_context,
+            # анализ по неполному контексту не переиспользуется: ключ не учитывает бюджет,
+            # и разовый таймаут стал бы ответом до изменения корпуса
+            analysis_key=None if result.retrieval_degraded else analysis_key,
         )
-        
-        return BFTResponse(
-            bft_id=request.bft_id,
-            structured_output=result.structured_output,
-            artifacts=result.artifacts,
-            history_id=history_entry.id,
-            created_at=history_entry.created_at
+    _index_history_embedding(history_entry.id, request.text, embedding)
+
+    return BFTResponse(
+        bft_id=request.bft_id,
+        structured_output=result.structured_output,
+        artifacts=result.artifacts,
+        history_id=history_entry.id,
+        created_at=history_entry.created_at
+    )
+
+
+def _find_similar_history(request: BFTRequest, embedding):
+    """Ближайший прошлый анализ, если его близость не ниже порога, иначе None."""
+    match = get_history_similarity_index().most_similar(embedding)
+    if match is None:
+        return None
+    history_id, similarity = match
+    threshold = request.similarity_threshold
+    if threshold is None:
+        threshold = settings.history_similarity_threshold
+    if similarity < threshold:
+        return None
+    entry = crud.get_history_by_id(history_id)
+    return (entry, similarity) if entry else None
+
+
+def _retrieval_options(request: BFTRequest) -> RetrievalOptions:
+    namespaces = None
+    if request.namespace or request.fanout_namespaces:
+        primary = request.namespace or settings.rag_default_namespace
+        namespaces = tuple(dict.fromkeys([primary, *request.fanout_namespaces]))
+    return RetrievalOptions.from_settings(
+        enabled=request.retrieval_enabled,
+        top_k=request.retrieval_top_k,
+        budget_seconds=request.retrieval_budget_seconds,
+        namespaces=namespaces,
+    )
+
+
+def _analyze(request: BFTRequest, bounded: bool = True) -> BFTResponse:
+    analysis_key = compute_analysis_key(
+        request.bft_id, request.text, retrieval=_retrieval_options(request)
+    )
+    if not request.force:
+        existing = crud.get_history_by_analysis_key(analysis_key)
+        record_cache("analysis_key", existing is not None)
+        if existing:
+            return BFTResponse(
+                bft_id=existing.bft_id,
+                structured_output=existing.structured_output,
+                artifacts=existing.artifacts,
+                history_id=existing.id,
+                created_at=existing.created_at,
+                reused=True,
+            )
+
+    similar_mode = request.similar_mode
+    if request.force and similar_mode == "return":
+        # force — всегда новый прогон: готовый похожий результат не возвращаем
+        similar_mode = "off"
+
+    embedding = None
+    prior = None
+    if similar_mode != "off" and settings.history_similarity_enabled:
+        embedding = embed_bft_text(request.text)
+        similar = _find_similar_history(request, embedding)
+        record_cache("similar", similar is not None)
+        if similar is not None:
+            entry, similarity = similar
+            if similar_mode == "return":
+                return BFTResponse(
+                    bft_id=request.bft_id,
+                    structured_output=entry.structured_output,
+                    artifacts=entry.artifacts,
+                    history_id=entry.id,
+                    created_at=entry.created_at,
+                    reused=True,
+                    similar_history_id=entry.id,
+                    similarity=similarity,
+                )
+            prior = {
+                "request_text": crud.get_history_text(entry, "request_text") or "",
+                "structured_output": entry.structured_output,
+            }
+
+    # одинаковые запросы, пришедшие одновременно, разделяют один прогон;
+    # delta-анализ от конкретного прошлого результата — отдельный прогон
+    flight_key = (analysis_key, similar[0].id if prior is not None else None)
+    response, shared = get_analysis_flight().do(
+        flight_key,
+        lambda: _run_analysis(request, analysis_key, prior, embedding, bounded=bounded),
+    )
+    record_cache("single_flight", shared)
+    if prior is not None:
+        response = response.model_copy(
+            update={"similar_history_id": similar[0].id, "similarity": similar[1]}
         )
+    return response
+
+
+@app.post(f"{settings.api_prefix}/analyze", response_model=BFTResponse)
+def analyze_bft(request: BFTRequest):
+    try:
+        return _analyze(request)
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=429,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
     except Exception as exc:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
-    
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+def _analyze_batch_item(request: dict) -> tuple[int, bool]:
+    # пакетные задачи не отклоняются по очереди, а ждут свободного слота анализа
+    while True:
+        try:
+            response = _analyze(BFTRequest(**request), bounded=False)
+        except AdmissionRejected:
+            # присоединились к интерактивному прогону, которому отказали в слоте:
+            # повторный вызов сам станет ведущим и дождётся слота
+            logger.info("Shared analysis was rejected, retrying batch item")
+            continue
+        return response.history_id, response.reused
+
+
+batch_runner = BatchRunner(_analyze_batch_item, workers=settings.batch_workers)
+compaction_job = CompactionJob()
+
+
+def _batch_job_response(job, with_items: bool = True) -> BatchJobResponse:
+    items = crud.list_batch_items(job.id) if with_items else []
+    return BatchJobResponse(
+        job_id=job.id,
+        status=job.status,
+        total=job.total,
+        completed=job.completed,
+        failed=job.failed,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        items=[
+            {
+                "position": item.position,
+                "bft_id": item.bft_id,
+                "status": item.status,
+                "history_id": item.history_id,
+                "reused": item.reused,
+                "error": item.error,
+            }
+            for item in items
+        ],
+    )
+
+
+@app.post(f"{settings.api_prefix}/batch", response_model=BatchJobResponse, status_code=202)
+def create_batch(request: BatchRequest):
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch is limited to {settings.batch_max_items} items",
+        )
+    job = crud.create_batch_job(
+        uuid4().hex, [item.model_dump() for item in request.items]
+    )
+    batch_runner.submit(crud.list_batch_items(job.id))
+    return _batch_job_response(job)
+
+
+@app.get(f"{settings.api_prefix}/batch/{{job_id}}", response_model=BatchJobResponse)
+def get_batch(job_id: str):
+    job = crud.get_batch_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return _batch_job_response(job)
+
+
+@app.get(f"{settings.api_prefix}/batch/{{job_id}}/events")
+def stream_batch_events(job_id: str):
+    """Прогресс задачи в формате Server-Sent Events; поток закрывается по завершении."""
+    if not crud.get_batch_job(job_id):
+        raise HTTPException(status_code=404, detail="Batch job not found")
+
+    async def events():
+        version = batch_runner.version
+        last = None
+        while True:
+            # короткий запрос к БД — в пуле потоков; ожидание — в event loop
+            job = await run_in_threadpool(crud.get_batch_job, job_id)
+            snapshot = _batch_job_response(job, with_items=False).model_dump(
+                mode="json", exclude={"items"}
+            )
+            if snapshot != last:
+                last = snapshot
+                event = "done" if job.status == "done" else "progress"
+                yield f"event: {event}\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+            if job.status == "done":
+                return
+            new_version = await batch_runner.wait_for_update(version, timeout=15.0)
+            if new_version == version:
+                yield ": keep-alive\n\n"
+            version = new_version
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _writable_retrieval_manager(namespace: str | None = None):
+    try:
+        manager = get_hybrid_retrieval_manager(namespace or None)
+    except InvalidNamespaceError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if manager.read_only:
+        raise HTTPException(
+            status_code=409,
+            detail="This worker serves a read-only index; send documents to the writer process",
+        )
+    return manager
+
+
 @app.post(f"{settings.api_prefix}/rag/documents/ingest", response_model=RAGDocumentResponse)
 def ingest_rag_document(request: RAGDocumentRequest):
+    manager = _writable_retrieval_manager(request.namespace)
     try:
-        manager = get_hybrid_retrieval_manager()
         docs = build_generic_documents(
             doc_id_base=request.doc_id,
             source=request.source,
@@ -78,90 +390,123 @@ def ingest_rag_document(request: RAGDocumentRequest):
             doc_id=request.doc_id,
             source=request.source,
             chunks_added=len(docs),
+            namespace=manager.namespace,
         )
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc    
     
 @app.get(f"{settings.api_prefix}/history", response_model=HistoryListResponse)
-def get_history(limit: int = Query(20, ge=1, le=100), bft_id: str | None = None):
-    items = crud.list_history(limit=limit, bft_id=bft_id)
-    result = []
-    for item in items:
-        preview = item.request_text[:160].replace("\n", " ")
-        if len(item.request_text) > 160:
-            preview += "..."
-        result.append(
-            {
-                "id": item.id,
-                "bft_id": item.bft_id,
-                "created_at": item.created_at,
-                "preview": preview,
-            }
-        )
-    return HistoryListResponse(items=result)
+def get_history(
+    limit: int = Query(20, ge=1, le=100),
+    bft_id: str | None = None,
+    cursor: str | None = None,
+):
+    try:
+        items, next_cursor = crud.list_history_previews(limit=limit, bft_id=bft_id, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    result = [
+        {
+            "id": item.id,
+            "bft_id": item.bft_id,
+            "created_at": item.created_at,
+            "preview": item.preview,
+        }
+        for item in items
+    ]
+    return HistoryListResponse(items=result, next_cursor=next_cursor)
 
 
-@app.get(f"{settings.api_prefix}/history/latest", response_model=HistoryDetailResponse | None)
-def get_latest(bft_id: str | None = None):
-    entry = crud.get_latest_history(bft_id=bft_id)
-    if not entry:
-        return None
+@app.get(f"{settings.api_prefix}/history/search", response_model=HistorySearchResponse)
+def search_history(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    if not history_search_available():
+        raise HTTPException(status_code=503, detail="Full-text search is not available")
+    items = crud.search_history_entries(q, limit=limit + 1, offset=offset)
+    next_offset = offset + limit if len(items) > limit else None
+    return HistorySearchResponse(items=items[:limit], next_offset=next_offset)
+
+
+def _history_detail(entry) -> HistoryDetailResponse:
+    # тексты хранятся в сжатых блобах и читаются только для детального просмотра
     return HistoryDetailResponse(
         id=entry.id,
         bft_id=entry.bft_id,
-        request_text=entry.request_text,
+        request_text=crud.get_history_text(entry, "request_text") or "",
         structured_output=entry.structured_output,
         artifacts=entry.artifacts,
-        raw_llm_output=entry.raw_llm_output,
-        retrieved_context=entry.retrieved_context,
+        raw_llm_output=crud.get_history_text(entry, "raw_llm_output"),
+        retrieved_context=crud.get_history_text(entry, "retrieved_context"),
         created_at=entry.created_at,
     )
 
 
+@app.get(f"{settings.api_prefix}/history/latest", response_model=HistoryDetailResponse | None)
+def get_latest(bft_id: str | None = None):
+    entry = crud.get_latest_history(bft_id=bft_id)
+    if not entry:
+        return None
+    return _history_detail(entry)
+
+
 @app.get(f"{settings.api_prefix}/history/{{history_id}}", response_model=HistoryDetailResponse)
 def get_history_detail(history_id: int):
     entry = crud.get_history_by_id(history_id)
     if not entry:
         raise HTTPException(status_code=404, detail="History entry not found")
-    return HistoryDetailResponse(
-        id=entry.id,
-        bft_id=entry.bft_id,
-        request_text=entry.request_text,
-        structured_output=entry.structured_output,
-        artifacts=entry.artifacts,
-        raw_llm_output=entry.raw_llm_output,
-        retrieved_context=entry.retrieved_context,
-        created_at=entry.created_at,
-    )
+    return _history_detail(entry)
     
+@app.get(f"{settings.api_prefix}/systems/autocomplete", response_model=SystemAutocompleteResponse)
+def autocomplete_systems(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+):
+    matches = get_system_search_index().search(q, limit=limit)
+    return SystemAutocompleteResponse(
+        items=[
+            {
+                "system_id": entry.system_id,
+                "name": entry.name,
+                "aliases": entry.aliases,
+                "score": score,
+            }
+            for entry, score in matches
+        ]
+    )
+
+
 @app.post(f"{settings.api_prefix}/rag/documents", response_model=RagUploadResponse)
 async def upload_rag_documents(
     files: list[UploadFile] = File(default_factory=list),
     text: str = Form(default=""),
     auto_process: bool = Form(default=True),
+    namespace: str | None = Form(default=None),
 ):
     if not files and not text.strip():
         raise HTTPException(status_code=400, detail="Нужно передать файл или текст.")
 
-    retrieval_manager = get_hybrid_retrieval_manager()
+    # загрузка корпуса и индексация синхронны — выполняются вне event loop
+    retrieval_manager = await run_in_threadpool(_writable_retrieval_manager, namespace)
+    documents: list[Document] = []
     ingested: list[dict[str, Any]] = []
 
     for upload in files:
         content = await upload.read()
         doc_id = f"doc-{uuid4().hex}"
 
-        retrieval_manager.add_documents(
-            [
-                Document(
-                    page_content=content.decode("utf-8", errors="ignore"),
-                    metadata={
-                        "doc_id": doc_id,
-                        "filename": upload.filename,
-                        "ingested_at": datetime.utcnow().isoformat(),
-                        "source": "file_upload",
-                    },
-                )
-            ]
+        documents.append(
+            Document(
+                page_content=content.decode("utf-8", errors="ignore"),
+                metadata={
+                    "doc_id": doc_id,
+                    "filename": upload.filename,
+                    "ingested_at": datetime.utcnow().isoformat(),
+                    "source": "file_upload",
+                },
+            )
         )
 
         ingested.append(
@@ -176,18 +521,16 @@ async def upload_rag_documents(
 
     if text.strip():
         doc_id = f"text-{uuid4().hex}"
-        retrieval_manager.add_documents(
-            [
-                Document(
-                    page_content=text,
-                    metadata={
-                        "doc_id": doc_id,
-                        "filename": "manual_text.md",
-                        "ingested_at": datetime.utcnow().isoformat(),
-                        "source": "manual_text",
-                    },
-                )
-            ]
+        documents.append(
+            Document(
+                page_content=text,
+                metadata={
+                    "doc_id": doc_id,
+                    "filename": "manual_text.md",
+                    "ingested_at": datetime.utcnow().isoformat(),
+                    "source": "manual_text",
+                },
+            )
         )
         ingested.append(
             {
@@ -199,15 +542,19 @@ async def upload_rag_documents(
             }
         )
 
+    # все файлы запроса — одним пакетом: одна пересборка BM25 и одно поколение
+    await run_in_threadpool(retrieval_manager.add_documents, documents)
+
     return RagUploadResponse(documents=ingested)    
     
 
 @app.post(f"{settings.api_prefix}/rag/documents/text", response_model=RagUploadResponse)
-async def upload_rag_documents(
+def upload_rag_text_document(
     text: str = Form(default=""),
     auto_process: bool = Form(default=True),
+    namespace: str | None = Form(default=None),
 ):
-    retrieval_manager = get_hybrid_retrieval_manager()
+    retrieval_manager = _writable_retrieval_manager(namespace)
     ingested: list[dict[str, Any]] = []
 
     if text.strip():
@@ -235,5 +582,71 @@ async def upload_rag_documents(
             }
         )
 
-    return RagUploadResponse(documents=ingested)    
-    
+    return RagUploadResponse(documents=ingested)
+
+
+@app.get(f"{settings.api_prefix}/rag/snapshot")
+def export_rag_snapshot(namespace: str | None = None):
+    """Согласованный снимок корпуса (tar.gz) для запуска новой реплики."""
+    manager = _writable_retrieval_manager(namespace)
+    path = settings.snapshot_tmp_path / f"export-{uuid4().hex}.tar.gz"
+    try:
+        manifest = export_snapshot(path, manager.namespace)
+    except SnapshotError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return FileResponse(
+        path,
+        media_type="application/gzip",
+        filename=f"snapshot-{manifest['namespace']}-{manifest['corpus_generation']}.tar.gz",
+        background=BackgroundTask(path.unlink, missing_ok=True),
+    )
+
+
+@app.post(f"{settings.api_prefix}/rag/snapshot", response_model=SnapshotImportResponse)
+def import_rag_snapshot(
+    file: UploadFile = File(...),
+    namespace: str | None = Form(default=None),
+):
+    if settings.index_role == "reader":
+        raise HTTPException(
+            status_code=409,
+            detail="Snapshots are imported into the writer process",
+        )
+    settings.snapshot_tmp_path.mkdir(parents=True, exist_ok=True)
+    path = settings.snapshot_tmp_path / f"import-{uuid4().hex}.tar.gz"
+    try:
+        with open(path, "wb") as fh:
+            shutil.copyfileobj(file.file, fh)
+        manifest = import_snapshot(path, namespace or None)
+    except (SnapshotError, InvalidNamespaceError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    finally:
+        path.unlink(missing_ok=True)
+    return SnapshotImportResponse(
+        namespace=manifest["namespace"],
+        documents=manifest["count"],
+        model=manifest["model"],
+        corpus_generation=manifest["corpus_generation"],
+        elapsed_seconds=manifest["elapsed_seconds"],
+    )
+
+
+@app.post(f"{settings.api_prefix}/admin/compaction")
+def run_compaction():
+    """Сжатие корпуса и БД; возвращает отчёт (освобождённое место, задержка поиска)."""
+    if settings.index_role == "reader":
+        raise HTTPException(
+            status_code=409,
+            detail="Compaction runs in the writer process",
+        )
+    try:
+        return compaction_job.run()
+    except CompactionInProgress as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+
+@app.get(f"{settings.api_prefix}/admin/compaction")
+def get_last_compaction():
+    if compaction_job.last_report is None:
+        raise HTTPException(status_code=404, detail="Compaction has not run in this process")
+    return compaction_job.last_report
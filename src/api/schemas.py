@@ -1,11 +1,29 @@
 from typing import Optional, Dict, Any, Literal
-from pydantic import BaseModel
-from typing import Literal
+from pydantic import BaseModel, Field
+from typing import Annotated, Literal
 from datetime import datetime
 
+from src.retrieval.namespaces import NAMESPACE_PATTERN
+
+Namespace = Annotated[str, Field(pattern=NAMESPACE_PATTERN)]
+
 class BFTRequest(BaseModel):
     bft_id: str
     text: str
+    # True — выполнить анализ заново, даже если есть сохранённый или похожий
+    # результат (similar_mode="return" при этом не срабатывает)
+    force: bool = False
+    # похожие прошлые анализы: "return" — вернуть найденный результат,
+    # "delta" — дообновить его по изменениям вместо полного анализа
+    similar_mode: Literal["off", "return", "delta"] = "off"
+    similarity_threshold: Optional[float] = None
+    # переопределения RAG-стадии (None — значение из настроек)
+    retrieval_enabled: Optional[bool] = None
+    retrieval_top_k: Optional[int] = Field(default=None, ge=0, le=50)
+    retrieval_budget_seconds: Optional[float] = Field(default=None, ge=0, le=30)
+    # корпус команды (None — по умолчанию) и дополнительные корпуса для поиска
+    namespace: Optional[Namespace] = None
+    fanout_namespaces: list[Namespace] = Field(default_factory=list, max_length=8)
 
 class BFTResponse(BaseModel):
     bft_id: str
@@ -13,18 +31,44 @@ class BFTResponse(BaseModel):
     artifacts: Dict[str, Any]
     history_id: int
     created_at: datetime
+    reused: bool = False
+    similar_history_id: Optional[int] = None
+    similarity: Optional[float] = None
+
+class BatchRequest(BaseModel):
+    items: list[BFTRequest]
+
+class BatchItemStatus(BaseModel):
+    position: int
+    bft_id: str
+    status: Literal["pending", "running", "done", "failed"]
+    history_id: Optional[int] = None
+    reused: bool = False
+    error: Optional[str] = None
+
+class BatchJobResponse(BaseModel):
+    job_id: str
+    status: Literal["pending", "running", "done"]
+    total: int
+    completed: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    items: list[BatchItemStatus] = []
     
 class RAGDocumentRequest(BaseModel):
     doc_id: str
     source: str = "external"
     text: str
     metadata: Dict[str, Any] | None = None
+    namespace: Optional[Namespace] = None
 
 class RAGDocumentResponse(BaseModel):
     status: Literal["ok"] = "ok"
     doc_id: str
     source: str
     chunks_added: int
+    namespace: str
     
 class HistoryItem(BaseModel):
     id: int
@@ -34,6 +78,18 @@ class HistoryItem(BaseModel):
 
 class HistoryListResponse(BaseModel):
     items: list[HistoryItem]
+    next_cursor: Optional[str] = None
+
+class HistorySearchItem(BaseModel):
+    id: int
+    bft_id: str
+    created_at: datetime
+    snippet: str
+    score: float
+
+class HistorySearchResponse(BaseModel):
+    items: list[HistorySearchItem]
+    next_offset: Optional[int] = None
 
 class HistoryDetailResponse(BaseModel):
     id: int
@@ -45,6 +101,15 @@ class HistoryDetailResponse(BaseModel):
     retrieved_context: Optional[str]
     created_at: datetime    
     
+class SystemSuggestion(BaseModel):
+    system_id: str
+    name: str
+    aliases: list[str] = []
+    score: float
+
+class SystemAutocompleteResponse(BaseModel):
+    items: list[SystemSuggestion]
+
 class RagUploadedDocument(BaseModel):
     doc_id: str
     filename: str
@@ -54,4 +119,13 @@ class RagUploadedDocument(BaseModel):
 
 
 class RagUploadResponse(BaseModel):
-    documents: list[RagUploadedDocument]    
\ No newline at end of file
+    documents: list[RagUploadedDocument]
+
+
+class SnapshotImportResponse(BaseModel):
+    status: Literal["ok"] = "ok"
+    namespace: str
+    documents: int
+    model: str
+    corpus_generation: str
+    elapsed_seconds: float    
\ No newline at end of file
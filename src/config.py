@@ -1,9 +1,18 @@
 from functools import lru_cache
 from pathlib import Path
-from pydantic import Field
+from typing import Literal
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
 
 
+class LLMBackendSettings(BaseModel):
+    name: str
+    provider: str = "ollama"  # или "openai" (любой OpenAI-совместимый endpoint)
+    model: str
+    base_url: str | None = None
+    api_key: str | None = None
+
+
 class Settings(BaseSettings):
     app_name: str = "BFT Semantic Analyzer"
     api_prefix: str = "/api/v1"
@@ -12,15 +21,100 @@ class Settings(BaseSettings):
     sqlite_path: Path = Field(default=Path("data/sqlite.db"))
     chroma_path: Path = Field(default=Path("data/chroma"))
     bm25_index_path: Path = Field(default=Path("data/bm25_index.json"))
+    # корпуса команд (пространства имён) лежат в rag_namespaces_path/<имя>;
+    # в памяти держится не больше rag_max_loaded_namespaces, остальные вытесняются
+    rag_default_namespace: str = "default"
+    rag_namespaces_path: Path = Field(default=Path("data/namespaces"))
+    rag_max_loaded_namespaces: int = Field(default=8)
+
+    # несколько воркеров: один writer публикует неизменяемые поколения индекса,
+    # reader-ы отображают их в память только для чтения
+    index_role: Literal["standalone", "writer", "reader"] = "standalone"
+    index_generations_path: Path = Field(default=Path("data/index_generations"))
+    index_generation_poll_seconds: float = Field(default=2.0)
+    # загрузки документов подряд сливаются в одну публикацию поколения
+    index_generation_publish_delay_seconds: float = Field(default=2.0)
+    index_generations_keep: int = Field(default=3)
+    # временные файлы снимков корпуса (экспорт/импорт через API)
+    snapshot_tmp_path: Path = Field(default=Path("tmp/snapshots"))
+
+    # логирование: JSON-записи пишутся в файл фоновым потоком
+    log_path: Path = Field(default=Path("tmp/app.log"))
+    log_level: str = "INFO"
+    # большие payload-ы (контекст, сообщения и ответ LLM): обрезать, хешировать,
+    # писать целиком или не писать; доля запросов, логируемых целиком
+    log_payload_mode: Literal["truncate", "hash", "full", "off"] = "truncate"
+    log_payload_max_chars: int = Field(default=2000)
+    log_payload_sample_rate: float = Field(default=0.0)
 
     llm_provider: str = "ollama"  # или "openai"
     ollama_model: str = "gpt-oss:120b"
     openai_model: str = "gpt-4.1-mini"
     openai_api_url: str = "http://localhost:1143" 
     openai_api_key: str | None = None
+    llm_json_mode: bool = True
+    llm_continuation_attempts: int = Field(default=1)
+
+    # маршрутизация по нескольким бэкендам (пустой список — используется llm_provider)
+    llm_backends: list[LLMBackendSettings] = []
+    llm_hedge_enabled: bool = False
+    llm_hedge_percentile: float = Field(default=0.9)
+    llm_hedge_initial_delay_seconds: float = Field(default=15.0)
+    llm_backend_failure_threshold: int = Field(default=3)
+    llm_backend_cooldown_seconds: float = Field(default=30.0)
 
     embedding_model_name: str = Field(default="sentence-transformers/all-MiniLM-L6-v2")
+    # "local" — модель в каждом процессе, "socket" — общий сервер src.embeddings.server
+    embedding_backend: Literal["local", "socket"] = "local"
+    embedding_socket_path: Path = Field(default=Path("tmp/embeddings.sock"))
+    embedding_socket_timeout_seconds: float = Field(default=60.0)
+    embedding_server_max_batch: int = Field(default=64)
+    embedding_server_batch_wait_ms: float = Field(default=5.0)
+    # уменьшение размерности векторов в поколениях индекса: "pca" (подбирается
+    # по корпусу) или "truncate" (Matryoshka-модели). Уменьшаются только
+    # поколения читателей; Chroma писателя/standalone хранит полные float32.
+    # При rescore_factor > 1 поколение хранит и полные векторы (vectors_full.npy),
+    # по ним пересчитываются лучшие k * rescore_factor кандидатов: память
+    # читателей меньше, а диск поколения больше. 0 — полные не хранятся
+    embedding_reduction: Literal["none", "pca", "truncate"] = "none"
+    embedding_reduced_dim: int = Field(default=128)
+    embedding_rescore_factor: int = Field(default=4)
     retrieval_top_k: int = Field(default=6)
+    # размер дочернего фрагмента (окна) в предложениях; 0 — индексировать целые чанки
+    retrieval_sentence_window: int = Field(default=2)
+    # RAG-стадия анализа: общий бюджет и дедлайны ветвей; не успевшие ветви
+    # отбрасываются, и контекст строится из того, что готово
+    retrieval_enabled: bool = True
+    retrieval_budget_seconds: float = Field(default=2.0)
+    retrieval_lexical_deadline_seconds: float = Field(default=1.0)
+    retrieval_dense_deadline_seconds: float = Field(default=2.0)
+    retrieval_max_workers: int = Field(default=8)
+
+    # поиск почти-дубликатов среди прошлых анализов
+    history_similarity_enabled: bool = True
+    history_similarity_threshold: float = Field(default=0.92)
+
+    # map-reduce для больших БФТ (размер в словах, как в chunk_text)
+    map_reduce_token_threshold: int = Field(default=3000)
+    map_reduce_section_tokens: int = Field(default=1200)
+    map_reduce_parallelism: int = Field(default=4)
+
+    # admission control для /analyze
+    analyze_max_concurrency: int = Field(default=2)
+    analyze_max_queue: int = Field(default=8)
+    analyze_queue_timeout_seconds: float = Field(default=300.0)
+    analyze_retry_after_seconds: int = Field(default=30)
+
+    # обслуживание корпуса (src.core.compaction): кеш разделов старше срока
+    # удаляется, коллекция Chroma сверяется с корпусом, BM25 пересобирается,
+    # поколение публикуется, SQLite и Chroma возвращают место через
+    # incremental_vacuum; интервал 0 — только по запросу POST /admin/compaction
+    compaction_interval_hours: float = Field(default=0.0)
+    compaction_section_max_age_days: float = Field(default=30.0)
+
+    # пакетный анализ: воркеры делят слоты анализа с /analyze
+    batch_workers: int = Field(default=2)
+    batch_max_items: int = Field(default=500)
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from src.db import crud
+from src.utils.logging_utils import request_context
+
+logger = logging.getLogger(__name__)
+
+# handler(request) -> (history_id, reused); request — BFTRequest в виде dict
+BatchHandler = Callable[[Dict[str, Any]], Tuple[int, bool]]
+
+
+class BatchRunner:
+    """
+    Пул воркеров пакетного анализа. Состояние элементов хранится в БД, поэтому
+    прогресс виден из любого процесса, а незавершённые задачи возобновляются
+    после перезапуска (resume).
+    """
+
+    def __init__(self, handler: BatchHandler, workers: int) -> None:
+        self._handler = handler
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="batch"
+        )
+        self._lock = threading.Lock()
+        self._version = 0
+
+    def submit(self, items: Iterable) -> int:
+        count = 0
+        for item in items:
+            self._executor.submit(self._run, item.id, item.request)
+            count += 1
+        return count
+
+    def resume(self) -> int:
+        count = self.submit(crud.list_unfinished_batch_items())
+        if count:
+            logger.info("Resumed %s unfinished batch items", count)
+        return count
+
+    async def wait_for_update(
+        self, version: int, timeout: float, poll_interval: float = 0.25
+    ) -> int:
+        """
+        Ждёт завершения любого элемента после version; возвращает текущую версию.
+        Опрашивает счётчик в event loop, поток из пула не занимается.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._version == version:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(poll_interval, remaining))
+        return self._version
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, item_id: int, request: Dict[str, Any]) -> None:
+        with request_context(f"batch-item-{item_id}"):
+            crud.start_batch_item(item_id)
+            try:
+                history_id, reused = self._handler(request)
+            except Exception as exc:
+                logger.exception("Batch item %s failed", item_id)
+                crud.finish_batch_item(item_id, error=str(exc))
+            else:
+                crud.finish_batch_item(item_id, history_id=history_id, reused=reused)
+            finally:
+                with self._lock:
+                    self._version += 1
@@ -0,0 +1,275 @@
+"""
+Обслуживание корпуса и БД.
+
+Удаления и повторные загрузки (replace=True) оставляют в Chroma удалённые
+записи и фрагментацию, а кеш разделов и блобы истории со временем
+устаревают. Задача сжатия:
+
+- удаляет результаты map-шага старше compaction_section_max_age_days;
+- сверяет хранилище чанков с Chroma и, если есть осиротевшие или
+  недостающие векторы, пересобирает коллекцию начисто (поиски ждут
+  только саму подмену коллекции);
+- пересобирает BM25 и bm25_index.json, writer публикует поколение, если
+  читатели отстают от корпуса, и удаляет старые поколения;
+- удаляет блобы истории без ссылок и возвращает свободные страницы SQLite
+  и Chroma через PRAGMA incremental_vacuum — короткими шагами, между
+  которыми проходят записи (полный VACUUM живой базы блокировал бы их);
+- сообщает освобождённое место и задержку поиска до и после.
+
+incremental_vacuum работает только в режиме auto_vacuum=INCREMENTAL:
+enable_incremental_vacuum включает его при старте writer/standalone
+(для существующего файла — однократным VACUUM до начала работы).
+
+Запускается по расписанию (compaction_interval_hours) и через
+POST /admin/compaction; одновременно выполняется не больше одного прогона.
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.config import get_settings
+from src.db import crud
+from src.retrieval.hybrid import borrow_retrieval_manager
+from src.retrieval.namespaces import InvalidNamespaceError, namespace_paths, validate_namespace
+from src.utils.logging_utils import request_context
+from src.utils.metrics import COMPACTION_RECLAIMED_BYTES
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# запросы для замера задержки: начала случайных чанков корпуса
+LATENCY_PROBE_QUERIES = 20
+LATENCY_PROBE_WORDS = 12
+
+CHROMA_SQLITE = "chroma.sqlite3"
+
+AUTO_VACUUM_INCREMENTAL = 2
+# страниц за шаг incremental_vacuum: запись в БД ждёт не дольше одного шага
+VACUUM_STEP_PAGES = 1000
+# сколько шаг ждёт занятую базу, прежде чем сжатие её пропустит
+VACUUM_BUSY_TIMEOUT_SECONDS = 30.0
+
+
+class CompactionInProgress(RuntimeError):
+    pass
+
+
+def _path_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return 0
+
+
+def _namespaces() -> List[str]:
+    names = [settings.rag_default_namespace]
+    if settings.rag_namespaces_path.is_dir():
+        for path in sorted(settings.rag_namespaces_path.iterdir()):
+            try:
+                name = validate_namespace(path.name)
+            except InvalidNamespaceError:
+                continue
+            if path.is_dir() and name not in names:
+                names.append(name)
+    return names
+
+
+def _storage_sizes(namespaces: List[str]) -> Dict[str, int]:
+    sizes = {
+        "sqlite": sum(
+            _path_size(settings.sqlite_path.with_name(settings.sqlite_path.name + suffix))
+            for suffix in ("", "-wal")
+        ),
+        "chroma": _path_size(settings.chroma_path),
+        "bm25": 0,
+        "generations": 0,
+    }
+    for namespace in namespaces:
+        paths = namespace_paths(namespace)
+        sizes["bm25"] += _path_size(paths.bm25_index_path)
+        sizes["generations"] += _path_size(paths.generations_path)
+    return sizes
+
+
+def _probe_queries(manager) -> List[str]:
+    documents = manager.documents
+    step = max(1, len(documents) // LATENCY_PROBE_QUERIES)
+    return [
+        " ".join(doc.page_content.split()[:LATENCY_PROBE_WORDS])
+        for doc in documents[::step][:LATENCY_PROBE_QUERIES]
+    ]
+
+
+def _search_latency_ms(manager, queries: List[str]) -> float | None:
+    """Медиана времени лексического и плотного поиска на запрос, мс."""
+    if not queries:
+        return None
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        manager.lexical_search(query, settings.retrieval_top_k)
+        manager.dense_search(query, settings.retrieval_top_k)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _sqlite_files() -> Dict[str, Path]:
+    return {"sqlite": settings.sqlite_path, "chroma": settings.chroma_path / CHROMA_SQLITE}
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    # autocommit: каждый PRAGMA — своя короткая транзакция
+    return sqlite3.connect(path, timeout=VACUUM_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+
+
+def enable_incremental_vacuum() -> None:
+    """
+    Переводит файлы SQLite сервиса в auto_vacuum=INCREMENTAL. У существующего
+    файла режим вступает в силу после VACUUM, поэтому вызывается один раз при
+    старте writer/standalone, до обслуживания запросов.
+    """
+    for path in _sqlite_files().values():
+        if not path.exists():
+            continue
+        conn = _connect(path)
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+                continue
+            logger.info("Enabling incremental auto-vacuum for %s", path)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError as exc:
+            logger.warning("Could not enable incremental auto-vacuum for %s: %s", path, exc)
+        finally:
+            conn.close()
+
+
+def _incremental_vacuum(path: Path) -> int:
+    """Возвращает свободные страницы файла шагами; число освобождённых страниц."""
+    if not path.exists():
+        return 0
+    conn = _connect(path)
+    freed = 0
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            # без INCREMENTAL свободные страницы переиспользуются, но файл не уменьшается
+            logger.info("Skipped vacuum of %s: auto_vacuum is not INCREMENTAL", path)
+            return 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free:
+            # каждая страница освобождается отдельным шагом: выбираем все строки
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break
+            freed += free - remaining
+            free = remaining
+    except sqlite3.OperationalError as exc:
+        # база занята дольше тайм-аута — остаток вернётся при следующем прогоне
+        logger.warning("Stopped vacuum of %s: %s", path, exc)
+    finally:
+        conn.close()
+    return freed
+
+
+class CompactionJob:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.last_report: Dict[str, Any] | None = None
+
+    def run(self) -> Dict[str, Any]:
+        """Один прогон; CompactionInProgress, если прогон уже идёт."""
+        if not self._lock.acquire(blocking=False):
+            raise CompactionInProgress("Compaction is already running")
+        try:
+            with request_context(f"compaction-{int(time.time())}"):
+                report = self._run()
+        finally:
+            self._lock.release()
+        self.last_report = report
+        return report
+
+    def start(self, interval_hours: float) -> None:
+        if interval_hours <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._loop, args=(interval_hours * 3600,), name="compaction", daemon=True
+        )
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+
+    def _loop(self, interval_seconds: float) -> None:
+        while not self._stop.wait(interval_seconds):
+            try:
+                self.run()
+            except CompactionInProgress:
+                continue
+            except Exception:
+                logger.exception("Scheduled compaction failed")
+
+    def _run(self) -> Dict[str, Any]:
+        started_at = datetime.utcnow()
+        started = time.monotonic()
+        max_age = timedelta(days=settings.compaction_section_max_age_days)
+        namespaces = _namespaces()
+        before = _storage_sizes(namespaces)
+
+        corpora: Dict[str, Any] = {}
+        for namespace in namespaces:
+            # без продвижения в LRU: обход всех пространств не вытесняет рабочие
+            with borrow_retrieval_manager(namespace) as manager:
+                if manager.read_only:
+                    continue
+                queries = _probe_queries(manager)
+                latency_before = _search_latency_ms(manager, queries)
+                stats = manager.compact()
+                latency_after = _search_latency_ms(manager, queries)
+            stats["search_latency_ms"] = {
+                "before": latency_before,
+                "after": latency_after,
+                "gain": (
+                    latency_before - latency_after
+                    if latency_before is not None and latency_after is not None
+                    else None
+                ),
+            }
+            corpora[namespace] = stats
+
+        expired_sections = crud.delete_section_results_before(datetime.utcnow() - max_age)
+        purged_blobs = crud.purge_unreferenced_blobs()
+        vacuumed_pages = {
+            target: _incremental_vacuum(path) for target, path in _sqlite_files().items()
+        }
+
+        after = _storage_sizes(namespaces)
+        reclaimed = {target: before[target] - after[target] for target in before}
+        for target, value in reclaimed.items():
+            if value > 0:
+                COMPACTION_RECLAIMED_BYTES.inc(value, target=target)
+
+        report = {
+            "started_at": started_at.isoformat(),
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "namespaces": corpora,
+            "expired_section_results": expired_sections,
+            "purged_history_blobs": purged_blobs,
+            "vacuumed_pages": vacuumed_pages,
+            "bytes_before": before,
+            "bytes_after": after,
+            "bytes_reclaimed": reclaimed,
+        }
+        logger.info("Compaction finished", extra={"payload": report})
+        return report
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Iterator
+
+from src.config import get_settings
+
+settings = get_settings()
+
+
+class AdmissionRejected(RuntimeError):
+    """Бэкенд анализа перегружен: нет свободного слота и места в очереди ожидания."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Analysis capacity exhausted, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: BaseException | None = None
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Объединяет конкурентные вызовы с одинаковым ключом: функция выполняется
+    один раз, остальные вызывающие получают тот же результат (или исключение).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """Возвращает (результат, shared), где shared=True для присоединившихся вызовов."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AdmissionController:
+    """
+    Ограничивает число одновременных анализов и длину очереди ожидания.
+
+    Если все слоты заняты и очередь заполнена (или ожидание превысило
+    queue_timeout), выбрасывается AdmissionRejected с рекомендуемым Retry-After.
+
+    Фоновые задачи (bounded=False) ждут в отдельной очереди без ограничения:
+    они не занимают места в очереди интерактивных запросов и получают слот,
+    только когда интерактивных ожидающих нет.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float | None = None,
+        retry_after: int = 30,
+    ) -> None:
+        self._max_concurrency = max(1, max_concurrency)
+        self._max_queue = max(0, max_queue)
+        self._queue_timeout = queue_timeout
+        self._retry_after = retry_after
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._background_waiting = 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting + self._background_waiting
+
+    def acquire(self, bounded: bool = True) -> None:
+        """
+        Занимает слот. При bounded=False вызывающий ждёт без ограничения очереди
+        и таймаута, пропуская вперёд интерактивные запросы (внутренние фоновые
+        задачи, например пакетный анализ).
+        """
+        if not bounded:
+            self._acquire_background()
+            return
+
+        with self._cond:
+            if self._active < self._max_concurrency and self._waiting == 0:
+                self._active += 1
+                return
+
+            if self._waiting >= self._max_queue:
+                raise AdmissionRejected(self._retry_after)
+
+            self._waiting += 1
+            try:
+                deadline = (
+                    time.monotonic() + self._queue_timeout
+                    if self._queue_timeout is not None
+                    else None
+                )
+                while self._active >= self._max_concurrency:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise AdmissionRejected(self._retry_after)
+                    self._cond.wait(remaining)
+                self._active += 1
+            finally:
+                self._waiting -= 1
+                # освободившийся слот мог достаться фоновой задаче
+                self._cond.notify_all()
+
+    def _acquire_background(self) -> None:
+        with self._cond:
+            self._background_waiting += 1
+            try:
+                self._cond.wait_for(
+                    lambda: self._active < self._max_concurrency and self._waiting == 0
+                )
+                self._active += 1
+            finally:
+                self._background_waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            # будим всех: слот должен достаться интерактивному ожидающему, если он есть
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, bounded: bool = True) -> Iterator[None]:
+        self.acquire(bounded=bounded)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+@lru_cache()
+def get_analysis_flight() -> SingleFlight:
+    return SingleFlight()
+
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=settings.analyze_max_concurrency,
+        max_queue=settings.analyze_max_queue,
+        queue_timeout=settings.analyze_queue_timeout_seconds,
+        retry_after=settings.analyze_retry_after_seconds,
+    )
@@ -0,0 +1,40 @@
+import hashlib
+
+from src.ingestion.preprocessor import clean_text
+from src.llm.chains import PROMPT_VERSION, SOLUTION_SCHEMA
+from src.db.registry import get_registry_generation
+from src.retrieval.budget import RetrievalOptions
+from src.retrieval.hybrid import read_corpus_generation
+
+
+def compute_analysis_key(
+    bft_id: str,
+    text: str,
+    retrieval: RetrievalOptions | None = None,
+) -> str:
+    """
+    Ключ повторного использования анализа: одинаков для одного и того же
+    bft_id с тем же нормализованным текстом, пока не изменились промпты/схема,
+    реестр систем и RAG-корпус. Переопределённые в запросе параметры RAG
+    (включён ли, top_k, пространства имён) дают отдельный ключ; бюджет времени
+    в ключ не входит. Отпечатки корпусов учитываются, только если RAG включён.
+    """
+    defaults = RetrievalOptions.from_settings()
+    retrieval = retrieval or defaults
+    corpus = ""
+    if retrieval.enabled and retrieval.top_k > 0:
+        # без загрузки корпусов: ключ считается до допуска запроса и вне бюджета
+        corpus = "+".join(read_corpus_generation(ns) for ns in retrieval.namespaces)
+    parts = [
+        bft_id,
+        PROMPT_VERSION,
+        hashlib.sha256(SOLUTION_SCHEMA.encode("utf-8")).hexdigest(),
+        str(get_registry_generation()),
+        corpus,
+        clean_text(text),
+    ]
+    if retrieval.enabled != defaults.enabled or retrieval.top_k != defaults.top_k:
+        parts.append(f"rag:{int(retrieval.enabled)}:{retrieval.top_k}")
+    if retrieval.namespaces != defaults.namespaces:
+        parts.append("ns:" + ",".join(retrieval.namespaces))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
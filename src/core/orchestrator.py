@@ -1,21 +1,41 @@
+import contextvars
+import difflib
+import hashlib
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List
 
 from src.config import get_settings
-from src.ingestion.preprocessor import clean_text, chunk_text
-from src.llm.chains import run_architecture_chain
+from src.db import crud
+from src.db.registry import get_registry_generation
+from src.ingestion.preprocessor import (
+    chunk_text,
+    chunk_text_by_content,
+    clean_text,
+    split_sentences,
+)
+from src.llm.chains import (
+    PROMPT_VERSION,
+    run_architecture_chain,
+    run_delta_chain,
+    run_section_extraction_chain,
+    run_synthesis_chain,
+)
+from src.retrieval.budget import RetrievalOptions, retrieve_with_budget
 from src.retrieval.hybrid import (
     build_bft_documents,
     get_hybrid_retrieval_manager,
 )
+from src.retrieval.registry_matcher import get_registry_matcher
 from src.retrieval.utils import extract_known_systems, unwrap_document
+from src.utils.json_utils import extract_json_from_response, LLMJsonParseError
+from src.utils.metrics import record_cache, stage
 
 settings = get_settings()
 
 logger = logging.getLogger(__name__)
 
-should_retrieve = False
-
 def build_context(documents, known_systems):
     parts = []
 
@@ -38,44 +58,303 @@ def build_context(documents, known_systems):
 
     return "\n\n---\n\n".join(parts)
 
-def run_bft_analysis(bft_id: str, raw_text: str) -> Dict[str, Any]:
-    cleaned = clean_text(raw_text)
-    chunks = chunk_text(cleaned)
+def merge_known_systems(*groups: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Объединяет списки известных систем, сохраняя первое вхождение каждого system_id."""
+    merged: Dict[str, Dict[str, str]] = {}
+    for group in groups:
+        for system in group:
+            merged.setdefault(system["system_id"].lower(), system)
+    return list(merged.values())
 
-    documents = build_bft_documents(bft_id, chunks)
-    hybrid_manager = get_hybrid_retrieval_manager()
-    hybrid_manager.add_documents(documents, replace=True)
 
-    retrieved_docs = [];
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка размера текста в тех же «токенах», что и chunk_text (слова)."""
+    return len(text.split())
 
-    if should_retrieve:
-        retrieved_docs = hybrid_manager.retrieve(
-            cleaned,
-            k=settings.retrieval_top_k,
-        )
+
+def _key(value: Any) -> str:
+    return str(value or "").strip().lower()
+
+
+def _confidence(value: Any) -> float:
+    # LLM иногда пишет уверенность словами ("high") — такие значения считаются 0
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _append_unique(target: List[Any], values: Any) -> None:
+    if not isinstance(values, list):
+        values = [values] if values else []
+    for value in values:
+        if value and value not in target:
+            target.append(value)
+
+
+def merge_section_results(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Детерминированно сливает результаты map-шага в порядке разделов.
+
+    Системы дедуплицируются по system_id, топики — по имени топика,
+    шаги sequence-диаграммы — по (from, to, message).
+    """
+    systems: Dict[str, Dict[str, Any]] = {}
+    topics: Dict[str, Dict[str, Any]] = {}
+    components: Dict[str, Dict[str, Any]] = {}
+    steps: List[Dict[str, Any]] = []
+    seen_steps: set[tuple[str, str, str]] = set()
+
+    for partial in partials:
+        for system in partial.get("involved_systems") or []:
+            if not isinstance(system, dict) or not _key(system.get("system_id")):
+                continue
+            key = _key(system.get("system_id"))
+            if key not in systems:
+                systems[key] = dict(system)
+                continue
+            merged = systems[key]
+            merged["existing"] = bool(merged.get("existing")) or bool(system.get("existing"))
+            merged["confidence"] = max(
+                _confidence(merged.get("confidence")),
+                _confidence(system.get("confidence")),
+            )
+            notes = [n for n in (merged.get("notes"), system.get("notes")) if n]
+            if len(notes) == 2 and notes[1] not in notes[0]:
+                merged["notes"] = f"{notes[0]}; {notes[1]}"
+            elif notes:
+                merged["notes"] = notes[0]
+            if not merged.get("role") and system.get("role"):
+                merged["role"] = system["role"]
+
+        for topic in partial.get("integration_topics") or []:
+            if not isinstance(topic, dict) or not _key(topic.get("topic")):
+                continue
+            key = _key(topic.get("topic"))
+            if key not in topics:
+                merged = dict(topic)
+                merged["subscriber"] = []
+                merged["actions"] = []
+                topics[key] = merged
+            merged = topics[key]
+            _append_unique(merged["subscriber"], topic.get("subscriber"))
+            _append_unique(merged["actions"], topic.get("actions"))
+            if topic.get("status") == "existing":
+                merged["status"] = "existing"
+            for field in ("publisher", "payload_schema_ref"):
+                if not merged.get(field) and topic.get(field):
+                    merged[field] = topic[field]
+
+        for step in partial.get("sequence_steps") or []:
+            if not isinstance(step, dict):
+                continue
+            step_key = (_key(step.get("from")), _key(step.get("to")), _key(step.get("message")))
+            if not step_key[0] or not step_key[1] or step_key in seen_steps:
+                continue
+            seen_steps.add(step_key)
+            steps.append(step)
+
+        for component in partial.get("component_systems") or []:
+            if not isinstance(component, dict) or not _key(component.get("system_id")):
+                continue
+            key = _key(component.get("system_id"))
+            if key not in components:
+                merged = dict(component)
+                merged["integrations"] = []
+                components[key] = merged
+            merged = components[key]
+            known = {(_key(i.get("target")), _key(i.get("label"))) for i in merged["integrations"]}
+            for integration in component.get("integrations") or []:
+                if not isinstance(integration, dict):
+                    continue
+                integration_key = (_key(integration.get("target")), _key(integration.get("label")))
+                if integration_key[0] and integration_key not in known:
+                    known.add(integration_key)
+                    merged["integrations"].append(integration)
+
+    diagrams: List[Dict[str, Any]] = []
+    if steps:
+        diagrams.append({"type": "sequence", "description": "", "actors": [], "steps": steps})
+    if components:
+        diagrams.append({"type": "component", "systems": list(components.values())})
+
+    return {
+        "involved_systems": list(systems.values()),
+        "integration_topics": list(topics.values()),
+        "uml_diagrams": diagrams,
+    }
+
+
+def section_result_key(section: str, context: str) -> str:
+    # контекст входит в ключ: разделы с RAG-контекстом другой команды (или
+    # другой редакции корпуса) не делят результат map-шага
+    context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    parts = [PROMPT_VERSION, str(get_registry_generation()), context_hash, section]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def run_map_reduce_analysis(cleaned: str, context: str, force: bool = False) -> str:
+    """
+    Анализ больших БФТ: разделы обрабатываются параллельно (map), результаты
+    сливаются детерминированно (reduce), architecture_analysis заполняется
+    отдельным коротким запросом.
+
+    Границы разделов зависят от содержимого, поэтому после правки БФТ
+    неизменные разделы совпадают с прежними, и их результаты map-шага берутся
+    из кеша, если RAG-контекст тот же. force=True пересчитывает все разделы.
+    """
+    sections = chunk_text_by_content(
+        cleaned, max_tokens=settings.map_reduce_section_tokens, overlap=1
+    )
+    keys = [section_result_key(section, context) for section in sections]
+    cached = {} if force else crud.get_section_results(keys)
+    for key in keys:
+        record_cache("map_section", key in cached)
+    logger.info(
+        "Map-reduce analysis: %s sections, %s reused",
+        len(sections),
+        sum(key in cached for key in keys),
+    )
+
+    def extract(indexed_section: tuple[int, str]) -> Dict[str, Any]:
+        idx, section = indexed_section
+        if keys[idx] in cached:
+            return cached[keys[idx]]
+        raw = run_section_extraction_chain(section, context, idx, len(sections))
+        try:
+            partial = extract_json_from_response(raw)
+        except LLMJsonParseError as exc:
+            logger.warning("Section %s returned invalid JSON, skipped: %s", idx, exc)
+            return {}
+        crud.save_section_result(keys[idx], partial)
+        return partial
+
+    parallelism = max(1, min(settings.map_reduce_parallelism, len(sections) - len(cached)))
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        # копия контекста на задачу: request id попадает в логи воркеров
+        futures = [
+            executor.submit(contextvars.copy_context().run, extract, indexed_section)
+            for indexed_section in enumerate(sections)
+        ]
+        partials = [future.result() for future in futures]
+
+    merged = merge_section_results(partials)
+
+    summaries = "\n".join(
+        f"{idx + 1}. {partial.get('section_summary') or '—'}"
+        for idx, partial in enumerate(partials)
+    )
+    outline = json.dumps(
+        {
+            "involved_systems": merged["involved_systems"],
+            "integration_topics": merged["integration_topics"],
+        },
+        ensure_ascii=False,
+    )
+
+    try:
+        synthesis = extract_json_from_response(run_synthesis_chain(summaries, outline))
+        architecture_analysis = synthesis.get("architecture_analysis") or synthesis
+    except LLMJsonParseError as exc:
+        logger.warning("Synthesis step returned invalid JSON: %s", exc)
+        architecture_analysis = {"business_context": summaries}
+
+    return json.dumps(
+        {"architecture_analysis": architecture_analysis, **merged},
+        ensure_ascii=False,
+    )
+
+
+def describe_bft_changes(previous_text: str, cleaned: str) -> str:
+    """Список добавленных/изменённых и удалённых предложений между редакциями БФТ."""
+    previous = split_sentences(clean_text(previous_text))
+    current = split_sentences(cleaned)
+    added: List[str] = []
+    removed: List[str] = []
+
+    matcher = difflib.SequenceMatcher(a=previous, b=current, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "delete"):
+            removed.extend(previous[i1:i2])
+        if tag in ("replace", "insert"):
+            added.extend(current[j1:j2])
+
+    if not added and not removed:
+        return "Изменений нет."
+    parts = []
+    if added:
+        parts.append("Добавлено или изменено:\n" + "\n".join(f"- {s}" for s in added))
+    if removed:
+        parts.append("Удалено:\n" + "\n".join(f"- {s}" for s in removed))
+    return "\n\n".join(parts)
+
+
+def run_bft_analysis(
+    bft_id: str,
+    raw_text: str,
+    prior: Dict[str, Any] | None = None,
+    retrieval: RetrievalOptions | None = None,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """
+    prior — похожий прошлый анализ ({"request_text", "structured_output"}):
+    вместо полного анализа LLM получает только изменения и прошлый результат.
+    retrieval — параметры RAG-стадии (по умолчанию из настроек).
+    force — не брать результаты разделов из кеша.
+    """
+    with stage("chunk"):
+        cleaned = clean_text(raw_text)
+        chunks = chunk_text(cleaned)
+
+    # чанки БФТ — рабочий набор только этого запроса: общий корпус при анализе
+    # лишь читается (без записи в Chroma, пересборки BM25 и JSON)
+    documents = build_bft_documents(bft_id, chunks)
+    retrieval = retrieval or RetrievalOptions.from_settings()
+
+    with stage("retrieve"):
+        outcome = retrieve_with_budget(get_hybrid_retrieval_manager, cleaned, retrieval)
+    retrieved_docs = outcome.documents
 
     context_blocks = []
     for doc in retrieved_docs:
         doc_id = doc.metadata.get("doc_id", "unknown")
         source = doc.metadata.get("source", "unknown")
+        namespace = doc.metadata.get("namespace")
+        if namespace:
+            source = f"{namespace}/{source}"
         context_blocks.append(f"[source={source} id={doc_id}]\n{doc.page_content}")
 
-    known_systems = extract_known_systems(documents)
+    with stage("registry_match"):
+        known_systems = merge_known_systems(
+            get_registry_matcher().match(cleaned),
+            extract_known_systems(documents),
+        )
     
-    logger.info(f"Known system : {known_systems}")
+    logger.info("Known systems: %s", len(known_systems), extra={"payload": known_systems})
     
     context = build_context(context_blocks, known_systems)#"\n\n".join(context_blocks)
 
-    logger.info(f"Context : {context}")
+    logger.info("Context built", extra={"payload": context})
 
-    llm_result = run_architecture_chain(cleaned, context)
+    if prior is not None:
+        llm_result = run_delta_chain(
+            describe_bft_changes(prior["request_text"], cleaned),
+            json.dumps(prior["structured_output"], ensure_ascii=False),
+            context,
+        )
+    elif estimate_tokens(cleaned) > settings.map_reduce_token_threshold:
+        llm_result = run_map_reduce_analysis(cleaned, context, force=force)
+    else:
+        llm_result = run_architecture_chain(cleaned, context)
 
-    logger.info(f"LLM result : {llm_result}")
+    logger.info("LLM result", extra={"payload": llm_result})
 
     return {
         "bft_id": bft_id,
         "llm_result": llm_result,
         "retrieved_context": context,
+        # контекст неполный (ветви поиска не уложились в бюджет или упали)
+        "retrieval_degraded": outcome.degraded,
         "retrieved_documents": [
             {
                 "doc_id": doc.metadata.get("doc_id"),
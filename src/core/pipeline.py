@@ -1,8 +1,24 @@
+import logging
 from dataclasses import dataclass
 from typing import Dict, Any
-from src.utils.json_utils import extract_json_from_response, LLMJsonParseError
+from src.config import get_settings
+from src.utils.json_utils import (
+    extract_json_from_response,
+    is_truncated_json,
+    strip_code_fences,
+    LLMJsonParseError,
+)
 from src.core.orchestrator import run_bft_analysis
+from src.retrieval.budget import RetrievalOptions
+from src.llm.chains import run_continuation_chain
 from src.outputs.builder import build_outputs
+from src.utils.metrics import LLM_RETRIES, stage
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_KEYS = ("architecture_analysis", "involved_systems", "uml_diagrams", "integration_topics")
 
 @dataclass
 class PipelineResult:
@@ -11,16 +27,46 @@ class PipelineResult:
     artifacts: Dict[str, Any]
     retrieved_context: str | None
     retrieved_documents: Any
+    retrieval_degraded: bool = False
+
+def parse_llm_output(raw_json: str) -> tuple[Dict[str, Any], str]:
+    """
+    Разбирает ответ LLM: строгий парсинг, затем repair_json, и только если
+    ответ оборван и не содержит всех секций схемы — запрос недостающего хвоста.
+    Возвращает (structured_output, итоговый сырой ответ).
+    """
+    attempts = settings.llm_continuation_attempts
+
+    while True:
+        try:
+            with stage("json_extract"):
+                structured_output = extract_json_from_response(raw_json)
+            complete = all(key in structured_output for key in REQUIRED_KEYS)
+            if complete or attempts <= 0 or not is_truncated_json(raw_json):
+                return structured_output, raw_json
+        except LLMJsonParseError as exc:
+            if attempts <= 0 or not is_truncated_json(raw_json):
+                raise ValueError(f"LLM returned invalid JSON: {exc}") from exc
+
+        attempts -= 1
+        logger.info("LLM output is truncated, requesting continuation")
+        LLM_RETRIES.inc(reason="continuation")
+        raw_json = strip_code_fences(raw_json) + strip_code_fences(run_continuation_chain(raw_json))
 
-def process_bft(bft_id: str, text: str) -> PipelineResult:
-    orchestrator_result = run_bft_analysis(bft_id, text)
-    raw_json = orchestrator_result["llm_result"]
 
-    try:
-        structured_output = extract_json_from_response(raw_json)
-    except LLMJsonParseError as exc:
-        raise ValueError(f"LLM returned invalid JSON: {exc}") from exc
-    artifacts = build_outputs(structured_output)
+def process_bft(
+    bft_id: str,
+    text: str,
+    prior: Dict[str, Any] | None = None,
+    retrieval: RetrievalOptions | None = None,
+    force: bool = False,
+) -> PipelineResult:
+    orchestrator_result = run_bft_analysis(
+        bft_id, text, prior=prior, retrieval=retrieval, force=force
+    )
+    structured_output, raw_json = parse_llm_output(orchestrator_result["llm_result"])
+    with stage("build_outputs"):
+        artifacts = build_outputs(structured_output)
     
     return PipelineResult(
         raw_llm_output=raw_json,
@@ -28,4 +74,5 @@ def process_bft(bft_id: str, text: str) -> PipelineResult:
         artifacts=artifacts,
         retrieved_context=orchestrator_result.get("retrieved_context"),
         retrieved_documents=orchestrator_result.get("retrieved_documents"),
+        retrieval_degraded=orchestrator_result.get("retrieval_degraded", False),
     )
\ No newline at end of file
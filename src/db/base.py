@@ -1,3 +1,4 @@
+import json
 from contextlib import contextmanager
 from sqlmodel import SQLModel, create_engine, Session
 from src.config import get_settings
@@ -7,10 +8,49 @@ engine = create_engine(
     f"sqlite:///{settings.sqlite_path}",
     echo=False,
     connect_args={"check_same_thread": False},
+    # кириллица в JSON-колонках хранится как есть: компактнее и доступна FTS-индексам
+    json_serializer=lambda obj: json.dumps(obj, ensure_ascii=False),
 )
 
+# Колонки, добавленные в модели после появления БД: create_all не меняет
+# существующие таблицы, поэтому досоздаём их вручную (таблица, колонка, DDL).
+_ADDED_COLUMNS = [
+    ("bftanalysishistory", "preview", "VARCHAR NOT NULL DEFAULT ''"),
+    ("bftanalysishistory", "request_text_ref", "VARCHAR"),
+    ("bftanalysishistory", "raw_llm_output_ref", "VARCHAR"),
+    ("bftanalysishistory", "retrieved_context_ref", "VARCHAR"),
+    ("bftanalysishistory", "analysis_key", "VARCHAR"),
+    ("system", "aliases", "JSON"),
+]
+
+# Заполнение новых колонок для старых строк
+_BACKFILLS = [
+    """
+    UPDATE bftanalysishistory
+    SET preview = substr(replace(request_text, char(10), ' '), 1, 160)
+        || CASE WHEN length(request_text) > 160 THEN '...' ELSE '' END
+    WHERE preview = '' AND request_text != ''
+    """,
+]
+
+
+def _migrate() -> None:
+    with engine.begin() as conn:
+        for table, column, ddl in _ADDED_COLUMNS:
+            existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        for statement in _BACKFILLS:
+            conn.exec_driver_sql(statement)
+
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
 def init_db() -> None:
     SQLModel.metadata.create_all(engine)
+    _migrate()
 
 @contextmanager
 def get_session() -> Session:
@@ -0,0 +1,34 @@
+import hashlib
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstandard — опциональная зависимость, zlib есть всегда
+    zstandard = None
+
+CODEC_ZSTD = "zstd"
+CODEC_ZLIB = "zlib"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_text(text: str) -> tuple[str, bytes]:
+    """Сжимает текст лучшим доступным кодеком, возвращает (codec, data)."""
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=10).compress(raw)
+    return CODEC_ZLIB, zlib.compress(raw, 6)
+
+
+def decompress_text(codec: str, data: bytes) -> str:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but 'zstandard' is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == CODEC_ZLIB:
+        raw = zlib.decompress(data)
+    else:
+        raise ValueError(f"Unknown blob codec: {codec}")
+    return raw.decode("utf-8")
@@ -1,10 +1,31 @@
+import base64
 from collections.abc import Sequence
+from sqlalchemy import DateTime, delete, literal, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import selectinload
 from datetime import datetime
 from collections.abc import Sequence
 from sqlmodel import select
 from src.db.base import get_session
-from src.db.models import System, BftAnalysisHistory
+from src.db.blobs import compress_text, content_hash, decompress_text
+from src.db.models import (
+    BatchJob,
+    BatchJobItem,
+    BftAnalysisHistory,
+    HistoryBlob,
+    HistoryEmbedding,
+    SectionResult,
+    System,
+)
+from src.db.search import (
+    build_snippet,
+    index_history_entry,
+    last_indexed_history_id,
+    reindex_history,
+    search_history,
+    search_system_ids,
+    unindex_history_entry,
+)
 
 def get_system_by_id(system_id: str) -> System | None:
     with get_session() as session:
@@ -12,10 +33,21 @@ def get_system_by_id(system_id: str) -> System | None:
         return session.exec(stmt).first()
 
 def search_systems_by_keyword(keyword: str, limit: int = 10) -> Sequence[System]:
-    pattern = f"%{keyword.lower()}%"
+    ids = search_system_ids(keyword, limit=limit)
     with get_session() as session:
-        stmt = select(System).where(System.name.ilike(pattern))
-        return session.exec(stmt).fetchmany(limit)
+        if ids is None:
+            # короткий запрос или нет FTS5: сканируем, как раньше
+            pattern = f"%{keyword.lower()}%"
+            stmt = select(System).where(System.name.ilike(pattern))
+            return session.exec(stmt).fetchmany(limit)
+        if not ids:
+            return []
+        systems = {s.id: s for s in session.exec(select(System).where(System.id.in_(ids))).all()}
+        return [systems[system_id] for system_id in ids if system_id in systems]
+
+def list_systems() -> Sequence[System]:
+    with get_session() as session:
+        return session.exec(select(System)).all()
 
 def list_systems_full() -> Sequence[System]:
     with get_session() as session:
@@ -28,6 +60,88 @@ def list_systems_full() -> Sequence[System]:
         )
         return session.exec(stmt).all()
     
+HISTORY_PREVIEW_LENGTH = 160
+
+
+def make_history_preview(text: str) -> str:
+    preview = text[:HISTORY_PREVIEW_LENGTH].replace("\n", " ")
+    if len(text) > HISTORY_PREVIEW_LENGTH:
+        preview += "..."
+    return preview
+
+
+def encode_history_cursor(created_at: datetime, history_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{history_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, history_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(history_id)
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError(f"Invalid history cursor: {cursor}") from exc
+
+
+HISTORY_BLOB_FIELDS = ("request_text", "raw_llm_output", "retrieved_context")
+
+
+def _acquire_blob(session, text: str | None) -> str | None:
+    """Сохраняет текст в HistoryBlob (или увеличивает refcount), возвращает hash."""
+    if text is None:
+        return None
+    digest = content_hash(text)
+    updated = session.exec(
+        update(HistoryBlob)
+        .where(HistoryBlob.hash == digest)
+        .values(refcount=HistoryBlob.refcount + 1)
+    )
+    if updated.rowcount:
+        return digest
+
+    codec, data = compress_text(text)
+    session.exec(
+        sqlite_insert(HistoryBlob)
+        .values(hash=digest, codec=codec, size=len(text), data=data, refcount=1)
+        .on_conflict_do_update(
+            index_elements=[HistoryBlob.hash],
+            set_={"refcount": HistoryBlob.refcount + 1},
+        )
+    )
+    return digest
+
+
+def _release_blob(session, digest: str | None) -> None:
+    if not digest:
+        return
+    session.exec(
+        update(HistoryBlob)
+        .where(HistoryBlob.hash == digest)
+        .values(refcount=HistoryBlob.refcount - 1)
+    )
+
+
+def _read_blob(session, digest: str) -> str | None:
+    blob = session.get(HistoryBlob, digest)
+    if blob is None:
+        return None
+    return decompress_text(blob.codec, blob.data)
+
+
+def read_blob(digest: str) -> str | None:
+    with get_session() as session:
+        return _read_blob(session, digest)
+
+
+def get_history_text(entry: BftAnalysisHistory, field: str) -> str | None:
+    """Текст поля истории: из блоба, если он вынесен, иначе из самой строки."""
+    digest = getattr(entry, f"{field}_ref")
+    if digest:
+        return read_blob(digest)
+    return getattr(entry, field)
+
+
 def create_history_entry(
     bft_id: str,
     request_text: str,
@@ -35,17 +149,23 @@ def create_history_entry(
     artifacts: dict,
     raw_llm_output: str | None,
     retrieved_context: str | None,
+    analysis_key: str | None = None,
 ) -> BftAnalysisHistory:
     entry = BftAnalysisHistory(
         bft_id=bft_id,
-        request_text=request_text,
+        request_text="",
+        preview=make_history_preview(request_text),
+        analysis_key=analysis_key,
         structured_output=structured_output,
         artifacts=artifacts,
-        raw_llm_output=raw_llm_output,
-        retrieved_context=retrieved_context,
     )
     with get_session() as session:
+        entry.request_text_ref = _acquire_blob(session, request_text)
+        entry.raw_llm_output_ref = _acquire_blob(session, raw_llm_output)
+        entry.retrieved_context_ref = _acquire_blob(session, retrieved_context)
         session.add(entry)
+        session.flush()
+        index_history_entry(session.connection(), entry.id, request_text, structured_output)
         session.commit()
         session.refresh(entry)
         return entry
@@ -61,15 +181,266 @@ def list_history(
         stmt = stmt.limit(limit)
         return session.exec(stmt).all()
 
+def list_history_previews(
+    limit: int = 20,
+    bft_id: str | None = None,
+    cursor: str | None = None,
+) -> tuple[list, str | None]:
+    """
+    Страница истории без тяжёлых колонок: (id, bft_id, created_at, preview).
+
+    Keyset-пагинация по (created_at, id): cursor — значение next_cursor
+    предыдущей страницы. Возвращает (строки, next_cursor | None).
+    """
+    columns = (
+        BftAnalysisHistory.id,
+        BftAnalysisHistory.bft_id,
+        BftAnalysisHistory.created_at,
+        BftAnalysisHistory.preview,
+    )
+    with get_session() as session:
+        stmt = select(*columns).order_by(
+            BftAnalysisHistory.created_at.desc(),
+            BftAnalysisHistory.id.desc(),
+        )
+        if bft_id:
+            stmt = stmt.where(BftAnalysisHistory.bft_id == bft_id)
+        if cursor:
+            created_at, history_id = decode_history_cursor(cursor)
+            stmt = stmt.where(
+                tuple_(BftAnalysisHistory.created_at, BftAnalysisHistory.id)
+                < tuple_(literal(created_at, type_=DateTime()), literal(history_id))
+            )
+        rows = session.exec(stmt.limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1].created_at, rows[-1].id)
+    return list(rows), next_cursor
+
+def delete_history_entry(history_id: int) -> bool:
+    with get_session() as session:
+        entry = session.get(BftAnalysisHistory, history_id)
+        if entry is None:
+            return False
+        # contentless FTS-индексу нужен исходный текст, пока блоб ещё не освобождён
+        if entry.request_text_ref:
+            request_text = _read_blob(session, entry.request_text_ref) or ""
+        else:
+            request_text = entry.request_text
+        unindex_history_entry(
+            session.connection(), history_id, request_text, entry.structured_output
+        )
+        for field in HISTORY_BLOB_FIELDS:
+            _release_blob(session, getattr(entry, f"{field}_ref"))
+        session.exec(delete(HistoryEmbedding).where(HistoryEmbedding.history_id == history_id))
+        session.delete(entry)
+        session.commit()
+        return True
+
+
+def purge_unreferenced_blobs() -> int:
+    """Удаляет блобы, на которые больше не ссылается ни одна запись истории."""
+    with get_session() as session:
+        result = session.exec(delete(HistoryBlob).where(HistoryBlob.refcount <= 0))
+        session.commit()
+        return result.rowcount
+
+def sync_history_search_index(batch_size: int = 500) -> int:
+    """Догружает в FTS-индекс записи истории, созданные до его появления."""
+    indexed = 0
+    last_id = last_indexed_history_id()
+    while True:
+        with get_session() as session:
+            stmt = (
+                select(BftAnalysisHistory)
+                .where(BftAnalysisHistory.id > last_id)
+                .order_by(BftAnalysisHistory.id)
+                .limit(batch_size)
+            )
+            entries = session.exec(stmt).all()
+        if not entries:
+            return indexed
+        indexed += reindex_history(
+            (entry.id, get_history_text(entry, "request_text") or "", entry.structured_output)
+            for entry in entries
+        )
+        last_id = entries[-1].id
+
+
+def search_history_entries(query: str, limit: int = 20, offset: int = 0) -> list[dict]:
+    rows = search_history(
+        query,
+        limit=limit,
+        offset=offset,
+        history_table=BftAnalysisHistory.__tablename__,
+    )
+    # индекс contentless: сниппеты строятся по тексту из блобов найденной страницы
+    digests = {row["request_text_ref"] for row in rows if row["request_text_ref"]}
+    texts: dict[str, str] = {}
+    if digests:
+        with get_session() as session:
+            blobs = session.exec(select(HistoryBlob).where(HistoryBlob.hash.in_(digests)))
+            texts = {blob.hash: decompress_text(blob.codec, blob.data) for blob in blobs}
+    items = []
+    for row in rows:
+        ref = row.pop("request_text_ref")
+        request_text = row.pop("request_text")
+        if ref:
+            request_text = texts.get(ref, "")
+        items.append({**row, "snippet": build_snippet(request_text or "", query)})
+    return items
+
 def get_history_by_id(history_id: int) -> BftAnalysisHistory | None:
     with get_session() as session:
         return session.get(BftAnalysisHistory, history_id)
 
+def get_history_by_analysis_key(analysis_key: str) -> BftAnalysisHistory | None:
+    with get_session() as session:
+        stmt = (
+            select(BftAnalysisHistory)
+            .where(BftAnalysisHistory.analysis_key == analysis_key)
+            .order_by(BftAnalysisHistory.created_at.desc())
+            .limit(1)
+        )
+        return session.exec(stmt).first()
+
+def save_history_embedding(history_id: int, model: str, vector: bytes) -> None:
+    with get_session() as session:
+        session.merge(HistoryEmbedding(history_id=history_id, model=model, vector=vector))
+        session.commit()
+
+def list_history_embeddings(model: str) -> Sequence[tuple[int, bytes]]:
+    with get_session() as session:
+        stmt = (
+            select(HistoryEmbedding.history_id, HistoryEmbedding.vector)
+            .where(HistoryEmbedding.model == model)
+            .order_by(HistoryEmbedding.history_id)
+        )
+        return session.exec(stmt).all()
+
+def get_section_results(keys: Sequence[str]) -> dict[str, dict]:
+    if not keys:
+        return {}
+    with get_session() as session:
+        stmt = select(SectionResult).where(SectionResult.key.in_(list(set(keys))))
+        return {row.key: row.result for row in session.exec(stmt)}
+
+def save_section_result(key: str, result: dict) -> None:
+    with get_session() as session:
+        session.merge(SectionResult(key=key, result=result))
+        session.commit()
+
+def delete_section_results_before(cutoff: datetime) -> int:
+    with get_session() as session:
+        result = session.exec(delete(SectionResult).where(SectionResult.created_at < cutoff))
+        session.commit()
+        return result.rowcount
+
+def list_history_without_embedding(model: str, limit: int = 100) -> Sequence[BftAnalysisHistory]:
+    with get_session() as session:
+        embedded = select(HistoryEmbedding.history_id).where(HistoryEmbedding.model == model)
+        stmt = (
+            select(BftAnalysisHistory)
+            .where(BftAnalysisHistory.id.not_in(embedded))
+            .order_by(BftAnalysisHistory.id)
+            .limit(limit)
+        )
+        return session.exec(stmt).all()
+
 def get_latest_history(bft_id: str | None = None) -> BftAnalysisHistory | None:
     with get_session() as session:
         stmt = select(BftAnalysisHistory).order_by(BftAnalysisHistory.created_at.desc())
         if bft_id:
             stmt = stmt.where(BftAnalysisHistory.bft_id == bft_id)
         stmt = stmt.limit(1)
-        return session.exec(stmt).first()    
-    
\ No newline at end of file
+        return session.exec(stmt).first()
+
+
+def create_batch_job(job_id: str, requests: list[dict]) -> BatchJob:
+    job = BatchJob(id=job_id, total=len(requests))
+    with get_session() as session:
+        session.add(job)
+        session.flush()
+        for position, request in enumerate(requests):
+            session.add(
+                BatchJobItem(
+                    job_id=job_id,
+                    position=position,
+                    bft_id=request["bft_id"],
+                    request=request,
+                )
+            )
+        session.commit()
+        session.refresh(job)
+        return job
+
+def get_batch_job(job_id: str) -> BatchJob | None:
+    with get_session() as session:
+        return session.get(BatchJob, job_id)
+
+def list_batch_items(job_id: str) -> Sequence[BatchJobItem]:
+    with get_session() as session:
+        stmt = (
+            select(BatchJobItem)
+            .where(BatchJobItem.job_id == job_id)
+            .order_by(BatchJobItem.position)
+        )
+        return session.exec(stmt).all()
+
+def list_unfinished_batch_items() -> Sequence[BatchJobItem]:
+    """Элементы, не завершённые к моменту остановки сервиса (для возобновления)."""
+    with get_session() as session:
+        stmt = (
+            select(BatchJobItem)
+            .where(BatchJobItem.status.in_(("pending", "running")))
+            .order_by(BatchJobItem.job_id, BatchJobItem.position)
+        )
+        return session.exec(stmt).all()
+
+def start_batch_item(item_id: int) -> None:
+    with get_session() as session:
+        item = session.get(BatchJobItem, item_id)
+        item.status = "running"
+        item.started_at = datetime.utcnow()
+        session.exec(
+            update(BatchJob)
+            .where(BatchJob.id == item.job_id, BatchJob.status == "pending")
+            .values(status="running")
+        )
+        session.add(item)
+        session.commit()
+
+def finish_batch_item(
+    item_id: int,
+    history_id: int | None = None,
+    reused: bool = False,
+    error: str | None = None,
+) -> None:
+    """Фиксирует результат элемента и счётчики задачи в одной транзакции."""
+    with get_session() as session:
+        item = session.get(BatchJobItem, item_id)
+        item.status = "failed" if error else "done"
+        item.history_id = history_id
+        item.reused = reused
+        item.error = error
+        item.finished_at = datetime.utcnow()
+        session.add(item)
+
+        counter = BatchJob.failed if error else BatchJob.completed
+        session.exec(
+            update(BatchJob)
+            .where(BatchJob.id == item.job_id)
+            .values({counter.key: counter + 1})
+        )
+        session.exec(
+            update(BatchJob)
+            .where(
+                BatchJob.id == item.job_id,
+                BatchJob.completed + BatchJob.failed >= BatchJob.total,
+            )
+            .values(status="done", finished_at=item.finished_at)
+        )
+        session.commit()
+
@@ -1,7 +1,7 @@
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Relationship
 from datetime import datetime
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, Index, JSON, LargeBinary
 
 class System(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -10,6 +10,7 @@ class System(SQLModel, table=True):
     description: Optional[str] = None
     domain: Optional[str] = None
     owner: Optional[str] = None
+    aliases: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
 
     interfaces: List["SystemInterface"] = Relationship(back_populates="system")
     topics: List["IntegrationTopic"] = Relationship(back_populates="system")
@@ -34,11 +35,78 @@ class IntegrationTopic(SQLModel, table=True):
     system: System = Relationship(back_populates="topics")
     
 class BftAnalysisHistory(SQLModel, table=True):
+    __table_args__ = (
+        # keyset-пагинация истории: ORDER BY created_at DESC, id DESC
+        Index("ix_history_created_at_id", "created_at", "id"),
+        Index("ix_history_bft_id_created_at_id", "bft_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     bft_id: str = Field(index=True)
     request_text: str
+    preview: str = ""
+    # ключ повторного использования (см. src.core.idempotency)
+    analysis_key: Optional[str] = Field(default=None, index=True)
     structured_output: dict = Field(sa_column=Column(JSON))
     artifacts: dict = Field(sa_column=Column(JSON))
     raw_llm_output: Optional[str] = None
     retrieved_context: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
\ No newline at end of file
+    # ссылки на HistoryBlob; у новых записей тексты хранятся только там
+    request_text_ref: Optional[str] = None
+    raw_llm_output_ref: Optional[str] = None
+    retrieved_context_ref: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class HistoryBlob(SQLModel, table=True):
+    """Сжатый текст истории, адресуемый sha256 содержимого, со счётчиком ссылок."""
+
+    hash: str = Field(primary_key=True)
+    codec: str
+    size: int  # длина исходного текста в символах
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    refcount: int = 0
+
+
+class HistoryEmbedding(SQLModel, table=True):
+    """Эмбеддинг текста БФТ из истории для поиска почти-дубликатов."""
+
+    history_id: int = Field(primary_key=True, foreign_key="bftanalysishistory.id")
+    model: str = Field(index=True)
+    vector: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # float32
+
+
+class SectionResult(SQLModel, table=True):
+    """Результат map-шага по разделу БФТ; ключ — хеш раздела, промпта и реестра."""
+
+    key: str = Field(primary_key=True)
+    result: dict = Field(sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class BatchJob(SQLModel, table=True):
+    """Пакетный анализ нескольких БФТ; счётчики обновляются по мере обработки."""
+
+    id: str = Field(primary_key=True)
+    status: str = "pending"  # pending/running/done
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    finished_at: Optional[datetime] = None
+
+
+class BatchJobItem(SQLModel, table=True):
+    __table_args__ = (Index("ix_batchjobitem_job_id_position", "job_id", "position"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: str = Field(foreign_key="batchjob.id")
+    position: int
+    bft_id: str
+    request: dict = Field(sa_column=Column(JSON))  # BFTRequest
+    status: str = Field(default="pending", index=True)  # pending/running/done/failed
+    history_id: Optional[int] = None
+    reused: bool = False
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
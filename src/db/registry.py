@@ -0,0 +1,41 @@
+from src.db.base import engine
+
+# Таблицы реестра систем: любое изменение в них увеличивает поколение реестра.
+REGISTRY_TABLES = ("system", "systeminterface", "integrationtopic")
+
+_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS registry_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL
+)
+"""
+
+
+def init_registry_tracking() -> None:
+    """
+    Создаёт счётчик поколения реестра и триггеры, которые увеличивают его
+    при любой записи в таблицы реестра — в том числе из внешних скриптов,
+    пишущих напрямую в SQLite.
+    """
+    with engine.begin() as conn:
+        conn.exec_driver_sql(_STATE_DDL)
+        conn.exec_driver_sql("INSERT OR IGNORE INTO registry_state (id, generation) VALUES (1, 0)")
+        for table in REGISTRY_TABLES:
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                conn.exec_driver_sql(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS registry_gen_{table}_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE registry_state SET generation = generation + 1 WHERE id = 1;
+                    END
+                    """
+                )
+
+
+def get_registry_generation() -> int:
+    with engine.connect() as conn:
+        value = conn.exec_driver_sql(
+            "SELECT generation FROM registry_state WHERE id = 1"
+        ).scalar()
+    return value or 0
@@ -0,0 +1,307 @@
+import logging
+import re
+from typing import Any, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from src.db.base import engine
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FTS_TABLE = "bft_history_fts"
+
+# contentless-таблица: хранится только инвертированный индекс, сам текст
+# запроса живёт в сжатом блобе истории и для сниппетов читается оттуда
+_HISTORY_FTS_DDL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {HISTORY_FTS_TABLE} USING fts5(
+    request_text,
+    systems,
+    topics,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+_HISTORY_FTS_COLUMNS = "request_text, systems, topics"
+
+# длина сниппета в словах
+SNIPPET_TOKENS = 16
+
+# веса колонок для bm25: совпадение по системе/топику важнее совпадения в тексте
+_HISTORY_RANK = "bm25(1.0, 4.0, 3.0)"
+
+SYSTEM_FTS_TABLE = "system_search_fts"
+
+# external-content таблица поверх system: текст не дублируется, индекс
+# синхронизируется триггерами; trigram даёт поиск по подстроке
+_SYSTEM_FTS_DDL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {SYSTEM_FTS_TABLE} USING fts5(
+    system_id,
+    name,
+    description,
+    aliases,
+    content = 'system',
+    content_rowid = 'id',
+    tokenize = 'trigram'
+)
+"""
+
+_SYSTEM_FTS_COLUMNS = "system_id, name, description, aliases"
+
+_SYSTEM_FTS_TRIGGERS = {
+    "system_fts_ai": f"""
+        AFTER INSERT ON system BEGIN
+            INSERT INTO {SYSTEM_FTS_TABLE} (rowid, {_SYSTEM_FTS_COLUMNS})
+            VALUES (new.id, new.system_id, new.name, new.description, new.aliases);
+        END
+    """,
+    "system_fts_ad": f"""
+        AFTER DELETE ON system BEGIN
+            INSERT INTO {SYSTEM_FTS_TABLE} ({SYSTEM_FTS_TABLE}, rowid, {_SYSTEM_FTS_COLUMNS})
+            VALUES ('delete', old.id, old.system_id, old.name, old.description, old.aliases);
+        END
+    """,
+    "system_fts_au": f"""
+        AFTER UPDATE ON system BEGIN
+            INSERT INTO {SYSTEM_FTS_TABLE} ({SYSTEM_FTS_TABLE}, rowid, {_SYSTEM_FTS_COLUMNS})
+            VALUES ('delete', old.id, old.system_id, old.name, old.description, old.aliases);
+            INSERT INTO {SYSTEM_FTS_TABLE} (rowid, {_SYSTEM_FTS_COLUMNS})
+            VALUES (new.id, new.system_id, new.name, new.description, new.aliases);
+        END
+    """,
+}
+
+# trigram-токенизатор не находит подстроки короче трёх символов
+MIN_TRIGRAM_QUERY = 3
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+_history_search_available = False
+_system_search_available = False
+
+
+def history_search_available() -> bool:
+    return _history_search_available
+
+
+def init_history_search() -> None:
+    """Создаёт FTS5-таблицу истории; без поддержки FTS5 поиск просто отключается."""
+    global _history_search_available
+    try:
+        with engine.begin() as conn:
+            ddl = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (HISTORY_FTS_TABLE,),
+            ).scalar()
+            if ddl is not None and "content" not in ddl:
+                # таблица старого формата хранила копию текста: пересоздаём,
+                # sync_history_search_index переиндексирует историю из блобов
+                logger.info("Rebuilding %s as a contentless index", HISTORY_FTS_TABLE)
+                conn.exec_driver_sql(f"DROP TABLE {HISTORY_FTS_TABLE}")
+            conn.exec_driver_sql(_HISTORY_FTS_DDL)
+    except OperationalError as exc:
+        logger.warning("SQLite FTS5 is unavailable, history search disabled: %s", exc)
+        _history_search_available = False
+        return
+    _history_search_available = True
+
+
+def system_search_available() -> bool:
+    return _system_search_available
+
+
+def init_system_search() -> None:
+    """Создаёт trigram-индекс реестра систем и триггеры синхронизации."""
+    global _system_search_available
+    try:
+        with engine.begin() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (SYSTEM_FTS_TABLE,),
+            ).scalar()
+            conn.exec_driver_sql(_SYSTEM_FTS_DDL)
+            for name, body in _SYSTEM_FTS_TRIGGERS.items():
+                conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+            if not exists:
+                conn.exec_driver_sql(
+                    f"INSERT INTO {SYSTEM_FTS_TABLE} ({SYSTEM_FTS_TABLE}) VALUES ('rebuild')"
+                )
+    except OperationalError as exc:
+        logger.warning("SQLite FTS5 trigram tokenizer is unavailable: %s", exc)
+        _system_search_available = False
+        return
+    _system_search_available = True
+
+
+def search_system_ids(keyword: str, limit: int = 10) -> list[int] | None:
+    """
+    Id систем (System.id), ранжированные bm25 по trigram-индексу.
+    None — индекс неприменим (нет FTS5 или запрос короче трёх символов).
+    """
+    keyword = keyword.strip()
+    if not _system_search_available or len(keyword) < MIN_TRIGRAM_QUERY:
+        return None
+    match = '"' + keyword.replace('"', '""') + '"'
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                f"SELECT rowid FROM {SYSTEM_FTS_TABLE} WHERE {SYSTEM_FTS_TABLE} MATCH :match "
+                "ORDER BY rank LIMIT :limit"
+            ),
+            {"match": match, "limit": limit},
+        )
+        return [row[0] for row in rows]
+
+
+def last_indexed_history_id() -> int:
+    with engine.connect() as conn:
+        value = conn.exec_driver_sql(f"SELECT max(rowid) FROM {HISTORY_FTS_TABLE}").scalar()
+    return value or 0
+
+
+def history_search_fields(structured_output: dict | None) -> tuple[str, str]:
+    """Строки (systems, topics) для индекса из структурированного результата анализа."""
+    structured_output = structured_output or {}
+    systems = [
+        str(system.get("system_id"))
+        for system in structured_output.get("involved_systems") or []
+        if isinstance(system, dict) and system.get("system_id")
+    ]
+    topics = [
+        str(topic.get("topic"))
+        for topic in structured_output.get("integration_topics") or []
+        if isinstance(topic, dict) and topic.get("topic")
+    ]
+    return " ".join(systems), " ".join(topics)
+
+
+def index_history_entry(
+    connection,
+    history_id: int,
+    request_text: str,
+    structured_output: dict | None,
+) -> None:
+    """Добавляет запись в FTS-индекс в рамках транзакции вызывающего."""
+    if not _history_search_available:
+        return
+    systems, topics = history_search_fields(structured_output)
+    connection.execute(
+        text(
+            f"INSERT INTO {HISTORY_FTS_TABLE} (rowid, {_HISTORY_FTS_COLUMNS}) "
+            "VALUES (:rowid, :request_text, :systems, :topics)"
+        ),
+        {"rowid": history_id, "request_text": request_text, "systems": systems, "topics": topics},
+    )
+
+
+def unindex_history_entry(
+    connection,
+    history_id: int,
+    request_text: str,
+    structured_output: dict | None,
+) -> None:
+    """
+    Удаляет запись из индекса. Contentless-таблица не хранит текст, поэтому
+    команде 'delete' передаются те же значения, что были проиндексированы.
+    """
+    if not _history_search_available:
+        return
+    systems, topics = history_search_fields(structured_output)
+    connection.execute(
+        text(
+            f"INSERT INTO {HISTORY_FTS_TABLE} ({HISTORY_FTS_TABLE}, rowid, {_HISTORY_FTS_COLUMNS}) "
+            "VALUES ('delete', :rowid, :request_text, :systems, :topics)"
+        ),
+        {"rowid": history_id, "request_text": request_text, "systems": systems, "topics": topics},
+    )
+
+
+def build_match_query(query: str) -> str | None:
+    """
+    Превращает пользовательский ввод в безопасный запрос FTS5: каждое слово
+    берётся в кавычки (без операторов), последнее ищется по префиксу.
+    """
+    tokens = _TOKEN_PATTERN.findall(query)
+    if not tokens:
+        return None
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def build_snippet(request_text: str, query: str, size: int = SNIPPET_TOKENS) -> str:
+    """
+    Сниппет в формате FTS5 snippet(): окно из size слов вокруг первого
+    совпадения, совпавшие слова в [скобках], обрезанные края — «…».
+    """
+    terms = [token.lower() for token in _TOKEN_PATTERN.findall(query)]
+    words = list(_TOKEN_PATTERN.finditer(request_text))
+    if not words:
+        return ""
+
+    def matches(word: str) -> bool:
+        word = word.lower()
+        return any(word == term for term in terms[:-1]) or word.startswith(terms[-1])
+
+    hits = [i for i, word in enumerate(words) if matches(word.group())]
+    first = hits[0] if hits else 0
+    start = max(0, min(first - size // 4, len(words) - size))
+    end = min(len(words), start + size)
+
+    parts = []
+    cursor = words[start].start()
+    for word in words[start:end]:
+        parts.append(request_text[cursor:word.start()])
+        parts.append(f"[{word.group()}]" if matches(word.group()) else word.group())
+        cursor = word.end()
+    snippet = " ".join("".join(parts).split())
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(words):
+        snippet += "…"
+    return snippet
+
+
+def search_history(
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    history_table: str = "bftanalysishistory",
+) -> list[dict[str, Any]]:
+    """
+    Найденные записи истории по рангу bm25. Сниппет индекс не вернёт
+    (таблица contentless): строки содержат request_text_ref/request_text,
+    из которых вызывающий строит сниппет через build_snippet.
+    """
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    sql = text(
+        f"""
+        SELECT h.id, h.bft_id, h.created_at, h.request_text, h.request_text_ref,
+               {HISTORY_FTS_TABLE}.rank AS score
+        FROM {HISTORY_FTS_TABLE}
+        JOIN {history_table} AS h ON h.id = {HISTORY_FTS_TABLE}.rowid
+        WHERE {HISTORY_FTS_TABLE} MATCH :match AND {HISTORY_FTS_TABLE}.rank MATCH :rank
+        ORDER BY {HISTORY_FTS_TABLE}.rank
+        LIMIT :limit OFFSET :offset
+        """
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(
+            sql,
+            {"match": match, "rank": _HISTORY_RANK, "limit": limit, "offset": offset},
+        ).mappings()
+        return [dict(row) for row in rows]
+
+
+def reindex_history(entries: Iterable[tuple[int, str, dict | None]]) -> int:
+    """Индексирует пачку (id, request_text, structured_output) — для догрузки старых записей."""
+    count = 0
+    with engine.begin() as conn:
+        for history_id, request_text, structured_output in entries:
+            index_history_entry(conn, history_id, request_text, structured_output)
+            count += 1
+    return count
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import socket
+import threading
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.embeddings.protocol import (
+    MAX_TEXTS,
+    OP_DOCUMENTS,
+    OP_QUERY,
+    EmbeddingServerError,
+    encode_request,
+    read_response,
+)
+
+
+class SocketEmbeddings(Embeddings):
+    """
+    Клиент сервера эмбеддингов (src.embeddings.server). У каждого потока своё
+    соединение; при обрыве запрос повторяется один раз на новом соединении.
+    Больше MAX_TEXTS текстов протокол за раз не принимает, поэтому длинные
+    списки отправляются несколькими запросами.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float = 60.0) -> None:
+        self._socket_path = str(socket_path)
+        self._timeout = timeout
+        self._local = threading.local()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [
+            self._request(OP_DOCUMENTS, texts[start : start + MAX_TEXTS])
+            for start in range(0, len(texts), MAX_TEXTS)
+        ]
+        return np.concatenate(batches).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._request(OP_QUERY, [text])[0].tolist()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self._timeout)
+        sock.connect(self._socket_path)
+        return sock
+
+    def _request(self, op: int, texts: List[str]):
+        payload = encode_request(op, texts)
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                sock.sendall(payload)
+                return read_response(sock)
+            except EmbeddingServerError:
+                # ответ-ошибка прочитан целиком, соединение остаётся пригодным
+                raise
+            except socket.timeout:
+                # состояние потока после таймаута неизвестно, повтор удвоил бы ожидание
+                self._close()
+                raise
+            except OSError:
+                self._close()
+                if attempt:
+                    raise
+            except Exception:
+                # битый кадр (ProtocolError) и т.п.: позиция в потоке неизвестна,
+                # следующий запрос на этом соединении прочитал бы мусор
+                self._close()
+                raise
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
@@ -0,0 +1,106 @@
+"""
+Бинарный протокол сервера эмбеддингов (все целые — big-endian).
+
+Запрос:  magic "EMB1" | op u8 | count u32 | count × (len u32 | текст utf-8)
+Ответ:   magic "EMB1" | status u8 | count u32 | dim u32 | count × dim × float32 (little-endian)
+Ошибка:  magic "EMB1" | status=1 u8 | len u32 | сообщение utf-8
+"""
+from __future__ import annotations
+
+import struct
+from typing import List, Sequence
+
+import numpy as np
+
+MAGIC = b"EMB1"
+
+OP_DOCUMENTS = 1
+OP_QUERY = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# защита от мусора в сокете: больше не принимаем за один запрос
+MAX_TEXTS = 10_000
+MAX_TEXT_BYTES = 4 * 1024 * 1024
+
+_REQUEST_HEADER = struct.Struct("!4sBI")
+_RESPONSE_HEADER = struct.Struct("!4sBII")
+_ERROR_HEADER = struct.Struct("!4sBI")
+_LENGTH = struct.Struct("!I")
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class EmbeddingServerError(RuntimeError):
+    """Сервер эмбеддингов вернул ошибку."""
+
+
+def encode_request(op: int, texts: Sequence[str]) -> bytes:
+    parts = [_REQUEST_HEADER.pack(MAGIC, op, len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def encode_response(vectors: np.ndarray) -> bytes:
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    count, dim = vectors.shape
+    return _RESPONSE_HEADER.pack(MAGIC, STATUS_OK, count, dim) + vectors.tobytes()
+
+
+def encode_error(message: str) -> bytes:
+    data = message.encode("utf-8")
+    return _ERROR_HEADER.pack(MAGIC, STATUS_ERROR, len(data)) + data
+
+
+def _check_magic(magic: bytes) -> None:
+    if magic != MAGIC:
+        raise ProtocolError(f"Unexpected frame magic: {magic!r}")
+
+
+# --- синхронное чтение (клиент) ---
+
+def _recv_exact(sock, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if not n:
+            raise ConnectionError("Embedding server closed the connection")
+        received += n
+    return bytes(buf)
+
+
+def read_response(sock) -> np.ndarray:
+    magic, status = struct.unpack("!4sB", _recv_exact(sock, 5))
+    _check_magic(magic)
+    if status == STATUS_ERROR:
+        (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+        raise EmbeddingServerError(_recv_exact(sock, length).decode("utf-8", errors="replace"))
+    count, dim = struct.unpack("!II", _recv_exact(sock, 8))
+    data = _recv_exact(sock, count * dim * 4)
+    return np.frombuffer(data, dtype="<f4").reshape(count, dim)
+
+
+# --- асинхронное чтение (сервер) ---
+
+async def read_request(reader) -> tuple[int, List[str]]:
+    magic, op, count = _REQUEST_HEADER.unpack(await reader.readexactly(_REQUEST_HEADER.size))
+    _check_magic(magic)
+    if op not in (OP_DOCUMENTS, OP_QUERY):
+        raise ProtocolError(f"Unknown operation: {op}")
+    if count > MAX_TEXTS:
+        raise ProtocolError(f"Too many texts in one request: {count}")
+    texts: List[str] = []
+    for _ in range(count):
+        (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+        if length > MAX_TEXT_BYTES:
+            raise ProtocolError(f"Text is too large: {length} bytes")
+        texts.append((await reader.readexactly(length)).decode("utf-8"))
+    return op, texts
@@ -0,0 +1,167 @@
+"""
+Локальный сервер эмбеддингов: модель загружается один раз, запросы всех
+процессов (API-воркеры, скрипты) обслуживаются через Unix-сокет.
+
+Запросы, пришедшие почти одновременно, объединяются в один вызов модели
+(micro-batching): батч закрывается по размеру или по таймауту ожидания.
+
+Запуск: python -m src.embeddings.server
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from src.config import get_settings
+from src.embeddings.protocol import (
+    ProtocolError,
+    encode_error,
+    encode_response,
+    read_request,
+)
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+@dataclass
+class _Pending:
+    texts: List[str]
+    future: asyncio.Future
+
+
+class EmbeddingServer:
+    def __init__(
+        self,
+        model_name: str,
+        socket_path: Path,
+        max_batch: int = 64,
+        batch_wait: float = 0.005,
+    ) -> None:
+        self._model_name = model_name
+        self._socket_path = socket_path
+        self._max_batch = max(1, max_batch)
+        self._batch_wait = batch_wait
+        self._model = None
+        self._queue: asyncio.Queue[_Pending] | None = None
+        # модель вызывается из одного потока: батчи и так идут последовательно
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+    def _load_model(self) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        logger.info("Loading embedding model %s", self._model_name)
+        self._model = SentenceTransformer(self._model_name)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # та же нормализация, что у HuggingFaceEmbeddings: векторы не должны
+        # зависеть от того, считались они в процессе или через сервер
+        texts = [text.replace("\n", " ") for text in texts]
+        return np.asarray(self._model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+
+    async def serve_forever(self) -> None:
+        self._load_model()
+        self._queue = asyncio.Queue()
+        self._socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._socket_path.exists():
+            self._socket_path.unlink()
+
+        server = await asyncio.start_unix_server(self._handle, path=str(self._socket_path))
+        os.chmod(self._socket_path, 0o660)
+        batcher = asyncio.create_task(self._batch_loop())
+        logger.info("Embedding server listening on %s", self._socket_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown(wait=False)
+            if self._socket_path.exists():
+                self._socket_path.unlink()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # соединение живёт, пока клиент шлёт запросы (один запрос — один ответ)
+        try:
+            while True:
+                try:
+                    _, texts = await read_request(reader)
+                except asyncio.IncompleteReadError:
+                    return
+                try:
+                    vectors = await self._embed(texts)
+                except Exception as exc:
+                    logger.exception("Embedding request failed")
+                    writer.write(encode_error(str(exc)))
+                else:
+                    writer.write(encode_response(vectors))
+                await writer.drain()
+        except ProtocolError as exc:
+            writer.write(encode_error(str(exc)))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        pending = _Pending(texts=texts, future=asyncio.get_running_loop().create_future())
+        await self._queue.put(pending)
+        return await pending.future
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = loop.time() + self._batch_wait
+            while size < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item.texts)
+
+            texts = [text for item in batch for text in item.texts]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._encode, texts)
+            except Exception as exc:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(exc)
+                continue
+
+            offset = 0
+            for item in batch:
+                count = len(item.texts)
+                if not item.future.done():
+                    item.future.set_result(vectors[offset : offset + count])
+                offset += count
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    server = EmbeddingServer(
+        settings.embedding_model_name,
+        settings.embedding_socket_path,
+        max_batch=settings.embedding_server_max_batch,
+        batch_wait=settings.embedding_server_batch_wait_ms / 1000,
+    )
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
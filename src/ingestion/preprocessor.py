@@ -1,4 +1,5 @@
 from typing import Iterable, List
+import hashlib
 import re
 import nltk
 from nltk.tokenize import sent_tokenize
@@ -10,8 +11,11 @@ def clean_text(text: str) -> str:
     text = text.replace("\u00a0", " ").strip()
     return text
 
+def split_sentences(text: str) -> List[str]:
+    return sent_tokenize(text, language="russian")
+
 def chunk_text(text: str, max_tokens: int = 400, overlap: int = 50) -> List[str]:
-    sentences = sent_tokenize(text, language="russian")
+    sentences = split_sentences(text)
     chunks, current_chunk = [], []
     token_count = 0
 
@@ -27,4 +31,41 @@ def chunk_text(text: str, max_tokens: int = 400, overlap: int = 50) -> List[str]
 
     if current_chunk:
         chunks.append(" ".join(current_chunk))
+    return chunks
+
+def _is_content_boundary(sentence: str, every: int) -> bool:
+    digest = hashlib.sha1(sentence.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % every == 0
+
+def chunk_text_by_content(text: str, max_tokens: int = 400, overlap: int = 0) -> List[str]:
+    """
+    Как chunk_text, но границы зависят от содержимого (content-defined chunking):
+    чанк закрывается после «граничного» предложения (по хешу), как только набрано
+    max_tokens // 2 слов, и принудительно — перед превышением max_tokens.
+    Правка в одном месте БФТ меняет только соседние чанки, дальше границы
+    совпадают с прежними, поэтому результаты по неизменным чанкам переиспользуются.
+    """
+    sentences = split_sentences(text)
+    min_tokens = max_tokens // 2
+    # граница в среднем раз в every предложений (~15 слов) после min_tokens
+    every = max(2, max_tokens // 60)
+    chunks, current_chunk = [], []
+    token_count = 0
+
+    for sentence in sentences:
+        sentence_tokens = len(sentence.split())
+        if current_chunk and token_count + sentence_tokens > max_tokens:
+            chunks.append(" ".join(current_chunk))
+            current_chunk = current_chunk[-overlap:] if 0 < overlap < len(current_chunk) else []
+            token_count = sum(len(s.split()) for s in current_chunk)
+
+        current_chunk.append(sentence)
+        token_count += sentence_tokens
+        if token_count >= min_tokens and _is_content_boundary(sentence, every):
+            chunks.append(" ".join(current_chunk))
+            current_chunk = current_chunk[-overlap:] if 0 < overlap < len(current_chunk) else []
+            token_count = sum(len(s.split()) for s in current_chunk)
+
+    if current_chunk and (not chunks or len(current_chunk) > overlap):
+        chunks.append(" ".join(current_chunk))
     return chunks
\ No newline at end of file
@@ -2,6 +2,10 @@ from textwrap import dedent
 from langchain.prompts import ChatPromptTemplate
 from src.llm.client import call_llm
 
+# увеличивать при любом изменении промптов или схем, влияющем на результат:
+# от версии зависит ключ повторного использования сохранённых анализов
+PROMPT_VERSION = "2"
+
 SOLUTION_SCHEMA = dedent(
     """
     {
@@ -81,4 +85,175 @@ def run_architecture_chain(bft_text: str, context: str) -> str:
         context=context,
         schema=SOLUTION_SCHEMA,
     )
-    return call_llm(messages)
\ No newline at end of file
+    return call_llm(messages, json_mode=True)
+
+SECTION_SCHEMA = dedent(
+    """
+    {
+      "section_summary": "string",
+      "involved_systems": [
+        {
+          "system_id": "string",
+          "role": "string",
+          "existing": true,
+          "confidence": 0.0,
+          "notes": "string"
+        }
+      ],
+      "integration_topics": [
+        {
+          "topic": "string",
+          "status": "existing",
+          "publisher": "string",
+          "subscriber": ["string"],
+          "payload_schema_ref": "string",
+          "actions": ["string"]
+        }
+      ],
+      "sequence_steps": [
+        {"from": "string", "to": "string", "message": "string"}
+      ],
+      "component_systems": [
+        {
+          "system_id": "string",
+          "label": "string",
+          "existing": true,
+          "integrations": [
+            {"target": "string", "label": "string"}
+          ]
+        }
+      ]
+    }
+    """
+).strip()
+
+SYNTHESIS_SCHEMA = dedent(
+    """
+    {
+      "architecture_analysis": {
+        "business_context": "...",
+        "functional_blocks": [],
+        "non_functional": {},
+        "solution_options": [],
+        "selected_option": null,
+        "risks": [],
+        "dependencies": []
+      }
+    }
+    """
+).strip()
+
+
+def run_section_extraction_chain(
+    section_text: str,
+    context: str,
+    section_index: int,
+    section_count: int,
+) -> str:
+    """Map-шаг: извлекает системы, топики и шаги диаграмм из одного раздела БФТ."""
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+            "Ты — корпоративный архитектор. Отвечай строго в JSON без лишнего текста. "
+            "Тебе передан только один раздел большого БФТ: "
+            "извлекай лишь то, что явно следует из него. "
+            "Если в секции KNOWN SYSTEMS указан system_id/name, используй их ровно в таком виде. "
+            "Если нужна новая система, явным образом укажи её как existing=false.",
+            ),
+            (
+                "human",
+                "Раздел БФТ {index} из {count}:\n{section}\n\nКонтекст (RAG):\n{context}\n\n"
+                "Верни JSON по схеме:\n{schema}"
+            )
+        ]
+    )
+
+    messages = prompt.format_messages(
+        index=section_index + 1,
+        count=section_count,
+        section=section_text,
+        context=context,
+        schema=SECTION_SCHEMA,
+    )
+    return call_llm(messages, json_mode=True)
+
+
+def run_synthesis_chain(section_summaries: str, merged_outline: str) -> str:
+    """Reduce-шаг: формирует architecture_analysis по сводкам разделов и слитым результатам."""
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+            "Ты — корпоративный архитектор. Отвечай строго в JSON без лишнего текста. "
+            "Системы и интеграционные топики уже определены — "
+            "не переименовывай их и не добавляй новые.",
+            ),
+            (
+                "human",
+                "Краткое содержание разделов БФТ:\n{summaries}\n\n"
+                "Задействованные системы и топики:\n{outline}\n\n"
+                "Верни JSON по схеме:\n{schema}"
+            )
+        ]
+    )
+
+    messages = prompt.format_messages(
+        summaries=section_summaries,
+        outline=merged_outline,
+        schema=SYNTHESIS_SCHEMA,
+    )
+    return call_llm(messages, json_mode=True)
+
+
+def run_delta_chain(changes: str, prior_output: str, context: str) -> str:
+    """Обновляет прошлый анализ по списку изменений в новой редакции БФТ."""
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+            "Ты — корпоративный архитектор. Отвечай строго в JSON без лишнего текста. "
+            "Тебе дан анализ предыдущей редакции БФТ и изменения в новой редакции. "
+            "Обнови анализ так, чтобы он соответствовал новой редакции; то, что не затронуто "
+            "изменениями, оставь без изменений. "
+            "Если в секции KNOWN SYSTEMS указан system_id/name, используй их ровно в таком виде.",
+            ),
+            (
+                "human",
+                "Анализ предыдущей редакции:\n{prior}\n\nИзменения в БФТ:\n{changes}\n\n"
+                "Контекст (RAG):\n{context}\n\nВерни полный обновлённый JSON по схеме:\n{schema}"
+            )
+        ]
+    )
+
+    messages = prompt.format_messages(
+        prior=prior_output,
+        changes=changes,
+        context=context,
+        schema=SOLUTION_SCHEMA,
+    )
+    return call_llm(messages, json_mode=True)
+
+
+def run_continuation_chain(partial_output: str) -> str:
+    """Запрашивает только недостающий хвост оборванного JSON-ответа."""
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+            "Ты продолжаешь оборванный JSON-ответ. Не повторяй уже выданный текст, "
+            "не добавляй пояснений и Markdown — верни только недостающее продолжение, "
+            "которое при дописывании в конец делает JSON валидным.",
+            ),
+            (
+                "human",
+                "Ожидаемая схема:\n{schema}\n\nНачало ответа (обрывается):\n{partial}"
+            )
+        ]
+    )
+
+    messages = prompt.format_messages(
+        schema=SOLUTION_SCHEMA,
+        partial=partial_output,
+    )
+    return call_llm(messages)
@@ -7,36 +7,80 @@ from langchain_community.chat_models import ChatOllama
 from langchain_openai import ChatOpenAI
 
 from src.config import get_settings
+from src.utils.metrics import LLM_TOKENS, stage
 
 logger = logging.getLogger(__name__)
 
 
 settings = get_settings()
 
-def get_llm():
-    if settings.llm_provider == "ollama":
-        return ChatOllama(model=settings.ollama_model, temperature=0.2)
-    if settings.llm_provider == "openai":
-        if not settings.openai_api_key:
+def build_chat_model(
+    provider: str,
+    model: str,
+    base_url: str | None = None,
+    api_key: str | None = None,
+    json_mode: bool = False,
+):
+    # JSON-режим провайдера: модель не может вернуть ничего, кроме JSON-объекта
+    json_mode = json_mode and settings.llm_json_mode
+    if provider == "ollama":
+        kwargs = {"base_url": base_url} if base_url else {}
+        return ChatOllama(
+            model=model,
+            temperature=0.2,
+            format="json" if json_mode else None,
+            **kwargs,
+        )
+    if provider == "openai":
+        if not api_key:
             raise ValueError("OPENAI_API_KEY not configured")
         return ChatOpenAI(
-            base_url=settings.openai_api_url,
-            model=settings.openai_model,
+            base_url=base_url,
+            model=model,
             temperature=0.2,
+            api_key=api_key,
+            model_kwargs={"response_format": {"type": "json_object"}} if json_mode else {},
+        )
+    raise ValueError(f"Unsupported LLM provider: {provider}")
+
+
+def get_llm(json_mode: bool = False):
+    if settings.llm_provider == "openai":
+        return build_chat_model(
+            "openai",
+            settings.openai_model,
+            base_url=settings.openai_api_url,
             api_key=settings.openai_api_key,
+            json_mode=json_mode,
         )
-    raise ValueError(f"Unsupported LLM provider: {settings.llm_provider}")
+    return build_chat_model(settings.llm_provider, settings.ollama_model, json_mode=json_mode)
 
-def call_llm(messages: List[BaseMessage]) -> str:
-    llm = get_llm()
-    
-    logger.info("Messages")
-    logger.info(messages)
-    
-    response = llm.invoke(messages)
+def record_token_usage(message) -> None:
+    """Учитывает токены из ответа провайдера (OpenAI — usage_metadata, Ollama — eval_count)."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), direction="in")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), direction="out")
+        return
+    metadata = getattr(message, "response_metadata", None) or {}
+    if "eval_count" in metadata or "prompt_eval_count" in metadata:
+        LLM_TOKENS.inc(metadata.get("prompt_eval_count") or 0, direction="in")
+        LLM_TOKENS.inc(metadata.get("eval_count") or 0, direction="out")
+
+
+def call_llm(messages: List[BaseMessage], json_mode: bool = False) -> str:
+    logger.info("LLM request: %s messages", len(messages), extra={"payload": messages})
+
+    with stage("llm"):
+        if settings.llm_backends:
+            from src.llm.router import get_llm_router
+
+            response = get_llm_router().invoke(messages, json_mode=json_mode)
+        else:
+            response = get_llm(json_mode=json_mode).invoke(messages)
+            record_token_usage(response)
     
-    logger.info("Response")
-    logger.info(response)
+    logger.info("LLM response", extra={"payload": response})
 
     #with open("./data/tmp_resp.json", 'r', encoding='utf-8') as file:
     #    response = file.read()
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from src.config import LLMBackendSettings, get_settings
+from src.llm.client import build_chat_model, record_token_usage
+from src.utils.metrics import LLM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# сколько замеров time-to-first-token нужно, прежде чем доверять перцентилю
+MIN_TTFT_SAMPLES = 10
+
+
+class NoHealthyBackendError(RuntimeError):
+    """Все бэкенды LLM перепробованы, ни один не вернул ответ."""
+
+
+@dataclass
+class BackendState:
+    config: LLMBackendSettings
+    outstanding: int = 0
+    consecutive_failures: int = 0
+    unhealthy_until: float = 0.0
+    ttft_samples: Deque[float] = field(default_factory=lambda: deque(maxlen=200))
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    def ttft_percentile(self, q: float) -> float | None:
+        if len(self.ttft_samples) < MIN_TTFT_SAMPLES:
+            return None
+        ordered = sorted(self.ttft_samples)
+        idx = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[idx]
+
+
+class LLMRouter:
+    """
+    Маршрутизатор запросов по нескольким бэкендам LLM.
+
+    - выбирает здоровый бэкенд с наименьшим числом запросов в работе;
+    - после llm_backend_failure_threshold ошибок подряд выводит бэкенд из
+      ротации на llm_backend_cooldown_seconds;
+    - при включённом хеджировании, если первый токен не пришёл за заданный
+      перцентиль TTFT, дублирует запрос на другой бэкенд; победителем
+      считается тот, кто первым начал отдавать токены, второй отменяется;
+    - при ошибке переходит к следующему бэкенду.
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[LLMBackendSettings],
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 0.9,
+        hedge_initial_delay: float = 15.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+    ) -> None:
+        if not backends:
+            raise ValueError("LLMRouter requires at least one backend")
+        self._backends = [BackendState(config) for config in backends]
+        self._hedge_enabled = hedge_enabled and len(self._backends) > 1
+        self._hedge_percentile = hedge_percentile
+        self._hedge_initial_delay = hedge_initial_delay
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        # состояние общее для всех потоков; запросы выполняются в одном
+        # фоновом event loop, поэтому клиенты (и их пулы соединений) переиспользуются
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, bool], Any] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def backends(self) -> List[BackendState]:
+        return list(self._backends)
+
+    def invoke(self, messages: List[BaseMessage], json_mode: bool = False) -> str:
+        """Синхронная точка входа; вызывается из рабочих потоков, а не из event loop."""
+        # run_coroutine_threadsafe переносит contextvars вызывающего потока (request id)
+        future = asyncio.run_coroutine_threadsafe(
+            self.ainvoke(messages, json_mode=json_mode), self._event_loop()
+        )
+        return future.result()
+
+    async def ainvoke(self, messages: List[BaseMessage], json_mode: bool = False) -> str:
+        tried: set[str] = set()
+        last_error: BaseException | None = None
+
+        while True:
+            primary = self._pick(tried)
+            if primary is None:
+                raise NoHealthyBackendError(
+                    f"All LLM backends failed: {last_error}"
+                ) from last_error
+            if tried:
+                LLM_RETRIES.inc(reason="fallback")
+            tried.add(primary.name)
+            try:
+                return await self._race(primary, messages, json_mode, tried)
+            except Exception as exc:
+                last_error = exc
+                logger.warning("LLM backend '%s' failed: %s", primary.name, exc)
+
+    # --- внутренние методы ---
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="llm-router", daemon=True
+                ).start()
+                self._loop = loop
+            return self._loop
+
+    def _client(self, backend: BackendState, json_mode: bool):
+        """Чат-модель бэкенда; создаётся один раз на бэкенд и режим JSON."""
+        key = (backend.name, json_mode)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                config = backend.config
+                client = build_chat_model(
+                    config.provider,
+                    config.model,
+                    base_url=config.base_url,
+                    api_key=config.api_key,
+                    json_mode=json_mode,
+                )
+                self._clients[key] = client
+            return client
+
+    def _pick(self, exclude: set[str], healthy_only: bool = False) -> BackendState | None:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [b for b in self._backends if b.name not in exclude]
+            healthy = [b for b in candidates if b.unhealthy_until <= now]
+            pool = healthy if healthy_only else healthy or candidates
+            if not pool:
+                return None
+            return min(pool, key=lambda b: (b.outstanding, b.consecutive_failures))
+
+    def _hedge_delay(self, backend: BackendState) -> float:
+        with self._lock:
+            percentile = backend.ttft_percentile(self._hedge_percentile)
+        return percentile if percentile is not None else self._hedge_initial_delay
+
+    async def _race(
+        self,
+        primary: BackendState,
+        messages: List[BaseMessage],
+        json_mode: bool,
+        tried: set[str],
+    ) -> str:
+        tasks: List[asyncio.Task] = []
+        winner: List[asyncio.Task] = []
+        first_token = asyncio.Event()
+
+        def claim(task: asyncio.Task) -> bool:
+            if winner:
+                return winner[0] is task
+            winner.append(task)
+            first_token.set()
+            for other in tasks:
+                if other is not task:
+                    other.cancel()
+            return True
+
+        def start(backend: BackendState) -> None:
+            tasks.append(asyncio.create_task(self._stream(backend, messages, json_mode, claim)))
+
+        start(primary)
+
+        if self._hedge_enabled:
+            token_waiter = asyncio.create_task(first_token.wait())
+            await asyncio.wait(
+                [tasks[0], token_waiter],
+                timeout=self._hedge_delay(primary),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            token_waiter.cancel()
+            if not first_token.is_set() and not tasks[0].done():
+                # хедж только на здоровый бэкенд: остывающий лишь добавит нагрузки
+                secondary = self._pick(tried, healthy_only=True)
+                if secondary is not None:
+                    tried.add(secondary.name)
+                    logger.info(
+                        "Hedging LLM request: '%s' is slow, also sending to '%s'",
+                        primary.name,
+                        secondary.name,
+                    )
+                    LLM_RETRIES.inc(reason="hedge")
+                    start(secondary)
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors: List[BaseException] = []
+        for result in results:
+            if isinstance(result, str):
+                return result
+            if isinstance(result, BaseException) and not isinstance(
+                result, asyncio.CancelledError
+            ):
+                errors.append(result)
+        raise errors[0] if errors else NoHealthyBackendError("LLM request was cancelled")
+
+    async def _stream(
+        self,
+        backend: BackendState,
+        messages: List[BaseMessage],
+        json_mode: bool,
+        claim: Callable[[asyncio.Task], bool],
+    ) -> str | None:
+        llm = self._client(backend, json_mode)
+        me = asyncio.current_task()
+        started = time.monotonic()
+        parts: List[str] = []
+        claimed = False
+
+        with self._lock:
+            backend.outstanding += 1
+        try:
+            async for chunk in llm.astream(messages):
+                content = chunk.content if hasattr(chunk, "content") else str(chunk)
+                if not claimed and content:
+                    with self._lock:
+                        backend.ttft_samples.append(time.monotonic() - started)
+                    if not claim(me):
+                        return None
+                    claimed = True
+                parts.append(content)
+                # usage приходит в последнем чанке потока
+                record_token_usage(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._record_failure(backend)
+            raise
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+        self._record_success(backend)
+        return "".join(parts)
+
+    def _record_success(self, backend: BackendState) -> None:
+        with self._lock:
+            backend.consecutive_failures = 0
+            backend.unhealthy_until = 0.0
+
+    def _record_failure(self, backend: BackendState) -> None:
+        with self._lock:
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self._failure_threshold:
+                backend.unhealthy_until = time.monotonic() + self._cooldown
+                logger.warning(
+                    "LLM backend '%s' marked unhealthy for %.0fs",
+                    backend.name,
+                    self._cooldown,
+                )
+
+
+@lru_cache()
+def get_llm_router() -> LLMRouter:
+    return LLMRouter(
+        settings.llm_backends,
+        hedge_enabled=settings.llm_hedge_enabled,
+        hedge_percentile=settings.llm_hedge_percentile,
+        hedge_initial_delay=settings.llm_hedge_initial_delay_seconds,
+        failure_threshold=settings.llm_backend_failure_threshold,
+        cooldown=settings.llm_backend_cooldown_seconds,
+    )
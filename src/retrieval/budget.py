@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import get_settings
+from src.retrieval.generations import reciprocal_rank_fusion
+from src.retrieval.passages import CHILD_FANOUT, assemble_parent_spans
+from src.utils.metrics import RETRIEVAL_DEGRADED, stage
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# веса ветвей при слиянии, как в HybridRetrievalManager.retrieve
+LEG_WEIGHTS = {"lexical": 0.4, "dense": 0.6}
+
+# общий пул для ветвей поиска: зависшая ветвь не блокирует анализ, а лишь
+# занимает поток; при исчерпании пула новые ветви уходят в таймаут
+_executor = ThreadPoolExecutor(
+    max_workers=max(2, settings.retrieval_max_workers),
+    thread_name_prefix="retrieval",
+)
+
+
+@dataclass(frozen=True)
+class RetrievalOptions:
+    enabled: bool
+    top_k: int
+    budget_seconds: float
+    lexical_deadline_seconds: float
+    dense_deadline_seconds: float
+    # пространства имён корпуса; несколько — поиск во всех с общим слиянием
+    namespaces: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_settings(cls, **overrides) -> "RetrievalOptions":
+        """Настройки сервиса с переопределениями запроса (None — не переопределять)."""
+        options = cls(
+            enabled=settings.retrieval_enabled,
+            top_k=settings.retrieval_top_k,
+            budget_seconds=settings.retrieval_budget_seconds,
+            lexical_deadline_seconds=settings.retrieval_lexical_deadline_seconds,
+            dense_deadline_seconds=settings.retrieval_dense_deadline_seconds,
+            namespaces=(settings.rag_default_namespace,),
+        )
+        return replace(options, **{k: v for k, v in overrides.items() if v is not None})
+
+    def deadline(self, leg: str) -> float:
+        leg_deadline = (
+            self.lexical_deadline_seconds if leg == "lexical" else self.dense_deadline_seconds
+        )
+        return min(leg_deadline, self.budget_seconds)
+
+
+@dataclass
+class RetrievalOutcome:
+    documents: List[Document] = field(default_factory=list)
+    completed: List[str] = field(default_factory=list)
+    timed_out: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.timed_out or self.failed)
+
+
+def retrieve_with_budget(
+    get_manager: Callable[[str], Any], query: str, options: RetrievalOptions
+) -> RetrievalOutcome:
+    """
+    Запускает лексическую и плотную ветви каждого пространства имён
+    параллельно. Каждая ждётся не дольше своего дедлайна (и общего бюджета);
+    результаты успевших ветвей сливаются RRF. Если не успела ни одна — пустой
+    результат, и контекст строится только по реестру систем.
+
+    get_manager(namespace) вызывается внутри ветви: загрузка ещё не
+    загруженного пространства тоже укладывается в бюджет.
+    """
+    outcome = RetrievalOutcome()
+    if not options.enabled or options.top_k <= 0:
+        return outcome
+
+    def run(namespace: str, leg: str) -> List[Document]:
+        with stage(f"retrieve_{leg}"):
+            manager = get_manager(namespace)
+            search = manager.lexical_search if leg == "lexical" else manager.dense_search
+            return search(query, options.top_k * CHILD_FANOUT)
+
+    started = time.monotonic()
+    futures = {
+        (namespace, leg): _executor.submit(contextvars.copy_context().run, run, namespace, leg)
+        for namespace in options.namespaces
+        for leg in ("lexical", "dense")
+    }
+
+    results: Dict[Tuple[str, str], List[Document]] = {}
+    for (namespace, leg), future in futures.items():
+        name = f"{namespace}/{leg}"
+        remaining = started + options.deadline(leg) - time.monotonic()
+        try:
+            results[(namespace, leg)] = future.result(timeout=max(0.0, remaining))
+            outcome.completed.append(name)
+        except FuturesTimeout:
+            future.cancel()
+            outcome.timed_out.append(name)
+            RETRIEVAL_DEGRADED.inc(leg=leg, reason="timeout")
+        except Exception as exc:
+            logger.warning("Retrieval leg '%s' failed: %s", name, exc)
+            outcome.failed.append(name)
+            RETRIEVAL_DEGRADED.inc(leg=leg, reason="error")
+
+    if outcome.degraded:
+        logger.warning(
+            "Retrieval degraded: completed=%s timed_out=%s failed=%s",
+            outcome.completed,
+            outcome.timed_out,
+            outcome.failed,
+        )
+
+    # ветви возвращают окна предложений; в контекст идут склеенные участки родителей
+    outcome.documents = assemble_parent_spans(fuse_documents(results), options.top_k)
+    return outcome
+
+
+def fuse_documents(results: Dict[Tuple[str, str], List[Document]]) -> List[Document]:
+    """
+    RRF по всем ветвям всех пространств: оценки BM25 и косинусы разных
+    корпусов несравнимы, а ранги — сравнимы. Документы отождествляются по
+    тексту. При поиске в нескольких пространствах документы помечаются полем
+    namespace (первого пространства, где встретился текст).
+    """
+    fan_out = len({namespace for namespace, _ in results}) > 1
+    by_key: Dict[str, Document] = {}
+    rankings: List[List[str]] = []
+    weights: List[float] = []
+    for (namespace, leg), docs in results.items():
+        ranking = []
+        seen: set[str] = set()
+        for doc in docs:
+            # окна с одинаковым текстом (повтор в другом документе или
+            # пространстве) сливаются в одно ещё до ранжирования
+            key = doc.page_content
+            if key in seen:
+                continue
+            seen.add(key)
+            if key not in by_key:
+                if fan_out:
+                    # копия: документы ветвей — объекты самого индекса
+                    doc = Document(
+                        page_content=doc.page_content,
+                        metadata={**doc.metadata, "namespace": namespace},
+                    )
+                by_key[key] = doc
+            ranking.append(key)
+        rankings.append(ranking)
+        weights.append(LEG_WEIGHTS.get(leg, 1.0))
+    return [by_key[key] for key in reciprocal_rank_fusion(rankings, weights)]
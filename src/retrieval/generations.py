@@ -0,0 +1,324 @@
+"""
+Неизменяемые поколения поискового индекса для многопроцессного режима.
+
+Процесс-писатель (index_role="writer") после каждого изменения корпуса
+публикует новое поколение — каталог с файлами, которые читатели отображают
+в память только для чтения (страницы общие для всех процессов):
+
+    manifest.json          число документов, размерность, модель, поколение корпуса
+    docs.bin, docs.idx.npy документы (orjson) и смещения int64
+    vectors.npy            нормированные эмбеддинги float32 (n, dim); при
+                           embedding_reduction — уменьшенные (см. reduction.py)
+    vectors_full.npy       полные векторы для пересчёта кандидатов (при rescore_factor > 1:
+                           память читателя меньше, но поколение на диске больше)
+    pca_*.npy              среднее и компоненты PCA (при reduction="pca")
+    vocab.bin, vocab.idx.npy  отсортированный словарь BM25 и смещения
+    idf.npy                idf термов (как в rank_bm25.BM25Okapi)
+    postings_ptr.npy       CSR: начало списка документов терма
+    postings_doc.npy       номера документов int32
+    postings_tf.npy        частоты терма в документе int32
+    doc_len.npy            длины документов в токенах
+
+Текущее поколение задаёт файл CURRENT с именем каталога; он заменяется
+атомарно (os.replace), поэтому читатель видит либо старое, либо новое
+поколение целиком.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Hashable, List, Sequence
+
+import numpy as np
+import orjson
+from langchain_core.documents import Document
+
+from src.retrieval.reduction import VectorReducer, normalize
+
+logger = logging.getLogger(__name__)
+
+CURRENT_POINTER = "CURRENT"
+MANIFEST = "manifest.json"
+FULL_VECTORS = "vectors_full.npy"
+
+# параметры BM25Okapi по умолчанию (rank_bm25), чтобы ранжирование совпадало
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+
+def tokenize(text: str) -> List[str]:
+    # та же предобработка, что у BM25Retriever по умолчанию
+    return text.split()
+
+
+def _write_strings(path: Path, index_path: Path, values: Sequence[bytes]) -> None:
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    with open(path, "wb") as fh:
+        for idx, value in enumerate(values):
+            fh.write(value)
+            offsets[idx + 1] = offsets[idx] + len(value)
+    np.save(index_path, offsets)
+
+
+def _bm25_postings(texts: Sequence[str]):
+    doc_terms = [Counter(tokenize(text)) for text in texts]
+    vocab = sorted({term for terms in doc_terms for term in terms})
+    term_ids = {term: idx for idx, term in enumerate(vocab)}
+
+    per_term: List[List[tuple[int, int]]] = [[] for _ in vocab]
+    for doc_idx, terms in enumerate(doc_terms):
+        for term, tf in terms.items():
+            per_term[term_ids[term]].append((doc_idx, tf))
+
+    ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    for idx, postings in enumerate(per_term):
+        ptr[idx + 1] = ptr[idx] + len(postings)
+    docs = np.fromiter((d for postings in per_term for d, _ in postings), dtype=np.int32)
+    tfs = np.fromiter((tf for postings in per_term for _, tf in postings), dtype=np.int32)
+
+    n_docs = len(texts)
+    df = np.diff(ptr).astype(np.float64)
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    if len(idf):
+        eps = BM25_EPSILON * float(idf.mean())
+        idf[idf < 0] = eps
+    doc_len = np.array([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+    return vocab, idf.astype(np.float32), ptr, docs, tfs, doc_len
+
+
+def publish_generation(
+    root: Path,
+    documents: Sequence[Document],
+    vectors: np.ndarray,
+    corpus_generation: str,
+    model: str,
+    reduction: str = "none",
+    reduced_dim: int = 0,
+    keep_full: bool = False,
+) -> str:
+    """
+    Записывает новое поколение и атомарно делает его текущим; возвращает имя.
+    reduction — "none", "pca" или "truncate" до reduced_dim; keep_full —
+    хранить и полные векторы для пересчёта лучших кандидатов.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    name = f"{int(time.time() * 1000)}-{corpus_generation}"
+    staging = root / f".{name}.tmp"
+    staging.mkdir()
+
+    _write_strings(
+        staging / "docs.bin",
+        staging / "docs.idx.npy",
+        [
+            orjson.dumps({"page_content": doc.page_content, "metadata": doc.metadata})
+            for doc in documents
+        ],
+    )
+
+    vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1))
+    full_dim = int(vectors.shape[1]) if vectors.size else 0
+    if reduction != "none" and full_dim and 0 < reduced_dim < full_dim:
+        reducer = VectorReducer.fit(reduction, vectors, reduced_dim)
+        reducer.save(staging)
+        if keep_full:
+            np.save(staging / FULL_VECTORS, vectors)
+        vectors = reducer.transform(vectors)
+    else:
+        reduction = "none"
+    np.save(staging / "vectors.npy", vectors)
+
+    vocab, idf, ptr, docs, tfs, doc_len = _bm25_postings([doc.page_content for doc in documents])
+    _write_strings(
+        staging / "vocab.bin",
+        staging / "vocab.idx.npy",
+        [term.encode("utf-8") for term in vocab],
+    )
+    np.save(staging / "idf.npy", idf)
+    np.save(staging / "postings_ptr.npy", ptr)
+    np.save(staging / "postings_doc.npy", docs)
+    np.save(staging / "postings_tf.npy", tfs)
+    np.save(staging / "doc_len.npy", doc_len)
+
+    manifest = {
+        "name": name,
+        "corpus_generation": corpus_generation,
+        "model": model,
+        "count": len(documents),
+        "dim": int(vectors.shape[1]) if vectors.size else 0,
+        "full_dim": full_dim,
+        "reduction": reduction,
+        "avgdl": float(doc_len.mean()) if len(doc_len) else 0.0,
+        "created_at": time.time(),
+    }
+    (staging / MANIFEST).write_text(json.dumps(manifest), encoding="utf-8")
+
+    os.replace(staging, root / name)
+    pointer_tmp = root / f".{CURRENT_POINTER}.tmp"
+    pointer_tmp.write_text(name, encoding="utf-8")
+    os.replace(pointer_tmp, root / CURRENT_POINTER)
+    logger.info("Published index generation %s (%s documents)", name, len(documents))
+    return name
+
+
+def read_current(root: Path) -> str | None:
+    try:
+        return (root / CURRENT_POINTER).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def prune_generations(root: Path, keep: int) -> None:
+    """
+    Удаляет старые поколения, кроме текущего и keep последних. Читатели,
+    ещё держащие удалённое поколение, продолжают работать: отображённые
+    файлы освобождаются только после закрытия.
+    """
+    current = read_current(root)
+    names = sorted(
+        (p.name for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda name: int(name.split("-", 1)[0]),
+    )
+    stale = [name for name in names[: max(0, len(names) - keep)] if name != current]
+    for name in stale:
+        shutil.rmtree(root / name, ignore_errors=True)
+
+
+class _StringTable:
+    """Массив строк в отображённом файле: значения декодируются по запросу."""
+
+    def __init__(self, data_path: Path, index_path: Path) -> None:
+        self._offsets = np.load(index_path, mmap_mode="r")
+        self._file = open(data_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def raw(self, idx: int) -> bytes:
+        return self._data[int(self._offsets[idx]) : int(self._offsets[idx + 1])]
+
+    def __getitem__(self, idx: int) -> str:
+        return self.raw(idx).decode("utf-8")
+
+    def find(self, value: str) -> int | None:
+        """Бинарный поиск в отсортированной таблице."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self[lo] == value else None
+
+
+class IndexGeneration:
+    """Поколение индекса, отображённое в память только для чтения."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.manifest = json.loads((path / MANIFEST).read_text(encoding="utf-8"))
+        self._docs = _StringTable(path / "docs.bin", path / "docs.idx.npy")
+        self._vocab = _StringTable(path / "vocab.bin", path / "vocab.idx.npy")
+        self._vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self._reducer: VectorReducer | None = None
+        self._full = None
+        reduction = self.manifest.get("reduction", "none")
+        if reduction != "none":
+            self._reducer = VectorReducer.load(path, reduction, self.manifest["dim"])
+            if (path / FULL_VECTORS).exists():
+                self._full = np.load(path / FULL_VECTORS, mmap_mode="r")
+        self._idf = np.load(path / "idf.npy", mmap_mode="r")
+        self._ptr = np.load(path / "postings_ptr.npy", mmap_mode="r")
+        self._post_docs = np.load(path / "postings_doc.npy", mmap_mode="r")
+        self._post_tfs = np.load(path / "postings_tf.npy", mmap_mode="r")
+        self._doc_len = np.load(path / "doc_len.npy", mmap_mode="r")
+
+    @property
+    def name(self) -> str:
+        return self.manifest["name"]
+
+    @property
+    def corpus_generation(self) -> str:
+        return self.manifest["corpus_generation"]
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def document(self, idx: int) -> Document:
+        item = orjson.loads(self._docs.raw(idx))
+        return Document(page_content=item["page_content"], metadata=item.get("metadata", {}))
+
+    def full_vectors(self) -> np.ndarray | None:
+        """Полные нормированные векторы, если поколение их хранит."""
+        return self._vectors if self._reducer is None else self._full
+
+    def dense_search(
+        self, query_vector: Sequence[float], k: int, rescore_factor: int = 0
+    ) -> List[int]:
+        """
+        Косинусный поиск. В уменьшенном поколении с полными векторами
+        k * rescore_factor лучших кандидатов пересчитываются в полной размерности.
+        """
+        if not len(self) or not k:
+            return []
+        query = normalize(query_vector)
+        if self._reducer is None:
+            return _top_k(self._vectors @ query, k)
+
+        scores = self._vectors @ self._reducer.transform(query)
+        if self._full is None or rescore_factor <= 1:
+            return _top_k(scores, k)
+        # строки читаются по возрастанию номера: меньше случайных чтений с диска
+        candidates = np.sort(np.asarray(_top_k(scores, k * rescore_factor)))
+        full_scores = self._full[candidates] @ query
+        order = np.argsort(-full_scores, kind="stable")[:k]
+        return [int(idx) for idx in candidates[order]]
+
+    def bm25_search(self, query: str, k: int) -> List[int]:
+        if not len(self) or not k:
+            return []
+        scores = np.zeros(len(self), dtype=np.float32)
+        avgdl = self.manifest["avgdl"] or 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(self._doc_len) / avgdl)
+        matched = False
+        for term in tokenize(query):
+            term_id = self._vocab.find(term)
+            if term_id is None:
+                continue
+            matched = True
+            start, end = int(self._ptr[term_id]), int(self._ptr[term_id + 1])
+            docs = self._post_docs[start:end]
+            tfs = self._post_tfs[start:end].astype(np.float32)
+            scores[docs] += self._idf[term_id] * tfs * (BM25_K1 + 1) / (tfs + norm[docs])
+        if not matched:
+            return []
+        return [idx for idx in _top_k(scores, k) if scores[idx] > 0]
+
+
+def _top_k(scores: np.ndarray, k: int) -> List[int]:
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return [int(idx) for idx in top[np.argsort(-scores[top], kind="stable")]]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]],
+    weights: Sequence[float],
+    c: int = 60,
+) -> List[Hashable]:
+    """Взвешенный RRF, как в EnsembleRetriever."""
+    scores: Dict[Hashable, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, idx in enumerate(ranking, start=1):
+            scores[idx] = scores.get(idx, 0.0) + weight / (rank + c)
+    return sorted(scores, key=lambda idx: scores[idx], reverse=True)
+
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import logging
+import threading
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+from src.config import get_settings
+from src.db import crud
+from src.ingestion.preprocessor import chunk_text, clean_text
+from src.retrieval.hybrid import _get_embeddings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# окно чанка для эмбеддинга — в пределах длины входа sentence-transformers
+EMBEDDING_CHUNK_TOKENS = 200
+
+
+def embed_bft_text(text: str) -> np.ndarray:
+    """Эмбеддинг всего БФТ: нормированное среднее эмбеддингов его чанков."""
+    chunks = chunk_text(clean_text(text), max_tokens=EMBEDDING_CHUNK_TOKENS, overlap=1)
+    chunks = [chunk for chunk in chunks if chunk.strip()] or [" "]
+    vectors = np.asarray(_get_embeddings().embed_documents(chunks), dtype=np.float32)
+    mean = vectors.mean(axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm else mean
+
+
+class HistorySimilarityIndex:
+    """
+    Индекс эмбеддингов прошлых БФТ в памяти (косинусная близость полным
+    перебором по матрице). Векторы хранятся в SQLite и загружаются лениво.
+    """
+
+    def __init__(self, model: str) -> None:
+        self._model = model
+        self._lock = threading.Lock()
+        self._ids: List[int] = []
+        self._matrix: np.ndarray | None = None
+        self._pending: List[np.ndarray] = []
+        self._loaded = False
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._ids)
+
+    def add(self, history_id: int, vector: np.ndarray) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        crud.save_history_embedding(history_id, self._model, vector.tobytes())
+        with self._lock:
+            if self._loaded:
+                self._ids.append(history_id)
+                self._pending.append(vector)
+
+    def most_similar(self, vector: np.ndarray) -> tuple[int, float] | None:
+        """(history_id, косинусная близость) ближайшего прошлого БФТ."""
+        with self._lock:
+            self._ensure_loaded()
+            if self._pending:
+                rows = [self._matrix] if self._matrix is not None else []
+                self._matrix = np.vstack(rows + self._pending)
+                self._pending = []
+            if self._matrix is None or not len(self._ids):
+                return None
+            scores = self._matrix @ np.asarray(vector, dtype=np.float32)
+            best = int(np.argmax(scores))
+            return self._ids[best], float(scores[best])
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        rows = crud.list_history_embeddings(self._model)
+        self._ids = [history_id for history_id, _ in rows]
+        if rows:
+            self._matrix = np.vstack(
+                [np.frombuffer(vector, dtype=np.float32) for _, vector in rows]
+            )
+        self._loaded = True
+
+
+def backfill_history_embeddings(batch_size: int = 50) -> int:
+    """Считает эмбеддинги для записей истории, у которых их ещё нет."""
+    index = get_history_similarity_index()
+    indexed = 0
+    while True:
+        entries = crud.list_history_without_embedding(settings.embedding_model_name, batch_size)
+        if not entries:
+            return indexed
+        for entry in entries:
+            text = crud.get_history_text(entry, "request_text") or ""
+            index.add(entry.id, embed_bft_text(text))
+            indexed += 1
+        logger.info("Backfilled %s history embeddings", indexed)
+
+
+@lru_cache()
+def get_history_similarity_index() -> HistorySimilarityIndex:
+    return HistorySimilarityIndex(settings.embedding_model_name)
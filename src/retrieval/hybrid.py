@@ -1,30 +1,85 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, List, Sequence
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence
 
-from langchain.retrievers import EnsembleRetriever
+import numpy as np
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.retrievers import BM25Retriever
 from langchain_community.vectorstores import Chroma
 
 from src.config import get_settings
 from src.db import crud
+from src.embeddings.client import SocketEmbeddings
 from src.ingestion.preprocessor import clean_text, chunk_text
+from src.retrieval.generations import (
+    IndexGeneration,
+    prune_generations,
+    publish_generation,
+    read_current,
+)
+from src.retrieval.namespaces import (
+    DEFAULT_COLLECTION,
+    NamespaceManagers,
+    namespace_paths,
+    validate_namespace,
+)
+from src.retrieval.passages import build_child_passages, is_window, restore_parent_chunks
+from src.utils.metrics import CORPUS_DOCUMENTS, stage
 
 settings = get_settings()
 
+logger = logging.getLogger(__name__)
 
-@lru_cache()
-def _get_embeddings() -> HuggingFaceEmbeddings:
-    return HuggingFaceEmbeddings(model_name=settings.embedding_model_name)
+# размер пакета при загрузке готовых векторов в Chroma
+CHROMA_BATCH = 1000
+
+
+class ReadOnlyIndexError(RuntimeError):
+    """Процесс-читатель не может менять корпус: загрузка идёт через процесс-писатель."""
+
+
+class TimedEmbeddings(Embeddings):
+    """Обёртка над моделью эмбеддингов, замеряющая стадию "embed"."""
+
+    def __init__(self, inner: Embeddings) -> None:
+        self._inner = inner
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with stage("embed"):
+            return self._inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with stage("embed"):
+            return self._inner.embed_query(text)
 
 
 @lru_cache()
-def _get_vectorstore(collection_name: str = "rag_corpus") -> Chroma:
+def _get_embeddings() -> Embeddings:
+    if settings.embedding_backend == "socket":
+        inner: Embeddings = SocketEmbeddings(
+            settings.embedding_socket_path,
+            timeout=settings.embedding_socket_timeout_seconds,
+        )
+    else:
+        inner = HuggingFaceEmbeddings(model_name=settings.embedding_model_name)
+    return TimedEmbeddings(inner)
+
+
+def _get_vectorstore(collection_name: str) -> Chroma:
+    # без кеша: коллекция живёт, пока жив менеджер её пространства имён
     settings.chroma_path.mkdir(parents=True, exist_ok=True)
     return Chroma(
         collection_name=collection_name,
@@ -33,12 +88,114 @@ def _get_vectorstore(collection_name: str = "rag_corpus") -> Chroma:
     )
 
 
+def chunk_doc_id(doc_base_id: str, chunk: str) -> str:
+    """
+    Id чанка по его содержимому: при повторной загрузке документа неизменные
+    чанки сохраняют id, и add_documents(replace=True) не пересчитывает их эмбеддинги.
+    """
+    digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+    return f"{doc_base_id}::{digest}"
+
+
+def _chroma_metadata(metadata: dict) -> dict:
+    # Chroma хранит только скалярные значения метаданных
+    return {
+        key: value
+        for key, value in metadata.items()
+        if isinstance(value, (str, int, float, bool))
+    }
+
+
+def _stage_collection(documents: Sequence[Document], vectors: np.ndarray) -> Chroma:
+    """Временная коллекция с готовыми векторами (без пересчёта эмбеддингов)."""
+    staging = _get_vectorstore(f"{DEFAULT_COLLECTION}_staging_{uuid.uuid4().hex[:8]}")
+    # langchain-обёртка не принимает готовые векторы — пишем в коллекцию напрямую
+    collection = staging._collection
+    try:
+        for start in range(0, len(documents), CHROMA_BATCH):
+            batch = documents[start : start + CHROMA_BATCH]
+            collection.add(
+                ids=[
+                    doc.metadata.get("doc_id", f"idx::{start + offset}")
+                    for offset, doc in enumerate(batch)
+                ],
+                embeddings=np.asarray(vectors[start : start + CHROMA_BATCH]).tolist(),
+                documents=[doc.page_content for doc in batch],
+                metadatas=[_chroma_metadata(doc.metadata) for doc in batch],
+            )
+    except Exception:
+        staging.delete_collection()
+        raise
+    return staging
+
+
+def _swap_collection(staging: Chroma, collection_name: str) -> Chroma:
+    """Подменяет collection_name заполненной временной коллекцией."""
+    try:
+        staging._client.delete_collection(collection_name)
+    except ValueError:
+        pass  # рабочей коллекции ещё нет
+    staging._collection.modify(name=collection_name)
+    return _get_vectorstore(collection_name)
+
+
+def _write_documents(path: Path, documents: Sequence[Document]) -> None:
+    payload = [
+        {"page_content": doc.page_content, "metadata": doc.metadata}
+        for doc in documents
+    ]
+    # через временный файл: читатель bm25_index.json не видит его наполовину записанным
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(
+        json.dumps(payload, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    os.replace(tmp_path, path)
+
+
+class _SearchGate:
+    """
+    Поиски по коллекции идут параллельно и без блокировки корпуса; подмена
+    коллекции ждёт завершения начатых поисков, а новые поиски ждут подмены.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._active = 0
+        self._swapping = False
+
+    @contextmanager
+    def search(self) -> Iterator[None]:
+        with self._cond:
+            self._cond.wait_for(lambda: not self._swapping)
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def swap(self) -> Iterator[None]:
+        with self._cond:
+            self._cond.wait_for(lambda: not self._swapping)
+            self._swapping = True
+            self._cond.wait_for(lambda: self._active == 0)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._swapping = False
+                self._cond.notify_all()
+
+
 def build_bft_documents(bft_id: str, chunks: Sequence[str]) -> List[Document]:
     doc_base_id = f"bft::{bft_id}"
 
     docs: List[Document] = []
     for idx, chunk in enumerate(chunks):
-        doc_id = f"{doc_base_id}::{idx}"
+        doc_id = chunk_doc_id(doc_base_id, chunk)
         docs.append(
             Document(
                 page_content=chunk,
@@ -73,7 +230,8 @@ def build_system_documents() -> List[Document]:
             lines.append("Interfaces:")
             for iface in system.interfaces:
                 lines.append(
-                    f"- {iface.interface_type}: {iface.endpoint or '—'} ({iface.description or '—'})"
+                    f"- {iface.interface_type}: {iface.endpoint or '—'} "
+                    f"({iface.description or '—'})"
                 )
 
         if system.topics:
@@ -87,7 +245,7 @@ def build_system_documents() -> List[Document]:
         content = clean_text("\n".join(lines))
         chunks = chunk_text(content, max_tokens=400, overlap=40)
         for idx, chunk in enumerate(chunks):
-            doc_id = f"{doc_base_id}::{idx}"
+            doc_id = chunk_doc_id(doc_base_id, chunk)
             docs.append(
                 Document(
                     page_content=chunk,
@@ -117,7 +275,7 @@ def build_generic_documents(
     reserved_keys = {"doc_id", "doc_base_id", "chunk_index", "source"}
 
     for idx, chunk in enumerate(chunks):
-        doc_id = f"{doc_base_id}::{idx}"
+        doc_id = chunk_doc_id(doc_base_id, chunk)
         metadata = {
             "doc_id": doc_id,
             "doc_base_id": doc_base_id,
@@ -139,50 +297,213 @@ def build_generic_documents(
     return docs
 
 
+@dataclass
+class _CorpusLocks:
+    # изменения корпуса и снимки не пересекаются
+    corpus: threading.RLock = field(default_factory=threading.RLock)
+    # поколения публикуются по очереди
+    publish: threading.Lock = field(default_factory=threading.Lock)
+    # поиски по коллекции и её подмена (сжатие, импорт снимка)
+    search: _SearchGate = field(default_factory=_SearchGate)
+
+
+_corpus_locks: Dict[str, _CorpusLocks] = {}
+_corpus_locks_guard = threading.Lock()
+
+
+def _get_corpus_locks(namespace: str) -> _CorpusLocks:
+    """
+    Блокировки пространства живут дольше его менеджера: вытесненный из LRU
+    менеджер и загруженный ему на смену работают с одними и теми же файлами.
+    """
+    with _corpus_locks_guard:
+        return _corpus_locks.setdefault(namespace, _CorpusLocks())
+
+
 class HybridRetrievalManager:
-    def __init__(self) -> None:
-        self._vectorstore = _get_vectorstore()
-        self._bm25_index_path: Path = settings.bm25_index_path
+    read_only = False
+
+    def __init__(self, namespace: str | None = None) -> None:
+        self.namespace = validate_namespace(namespace)
+        self._paths = namespace_paths(self.namespace)
+        self._bm25_index_path: Path = self._paths.bm25_index_path
+        locks = _get_corpus_locks(self.namespace)
+        self._lock = locks.corpus
+        self._publish_lock = locks.publish
+        self._search_gate = locks.search
+        # вытесненный менеджер передаёт записи актуальному (см. retire)
+        self._retired = False
+        # отложенная публикация поколения (writer): см. _schedule_publish
+        self._publish_state = threading.Lock()
+        self._publish_due = 0.0
+        self._publisher: threading.Thread | None = None
         self._bm25_index_path.parent.mkdir(parents=True, exist_ok=True)
 
-        self._documents: List[Document] = self._load_documents()
-        self._doc_index: dict[str, int] = {}
-        self._rebuild_doc_index()
+        # загрузка под блокировкой: запись вытесненного менеджера успеет сохраниться
+        with self._lock:
+            self._vectorstore = _get_vectorstore(self._paths.collection)
+            self._documents: List[Document] = self._load_documents()
+            self._doc_index: dict[str, int] = {}
+            self._generation = ""
+            self._rebuild_doc_index()
+
+            self._bm25: BM25Retriever | None = None
+            self._rebuild_bm25()
+            CORPUS_DOCUMENTS.set_function(
+                lambda: len(self._documents), namespace=self.namespace
+            )
 
-        self._bm25: BM25Retriever | None = None
-        self._rebuild_bm25()
+            # чанки БФТ раньше попадали в общий корпус; теперь они живут только
+            # в рамках запроса анализа, старые удаляются при первом запуске
+            self._remove_documents(lambda doc: doc.metadata.get("source") == "bft")
+            self._ensure_child_passages()
+
+            # реестр систем общий для всех команд и живёт в пространстве по умолчанию
+            if self.namespace == settings.rag_default_namespace:
+                self.ensure_system_documents()
+            # корпус, сохранённый до появления маркера
+            self._save_generation_marker()
+
+        # вне блокировки корпуса: публикация берёт её после своей
+        self._publish_generation()
 
-        # начальная синхронизация реестра систем
-        self.ensure_system_documents()
+    def retire(self) -> None:
+        """
+        Менеджер вытеснен из LRU. Потоки, получившие его раньше,
+        могут ещё писать: такие записи уходят в актуальный менеджер
+        пространства, иначе два менеджера перезаписывали бы корпус друг друга.
+        """
+        self._retired = True
 
     def add_documents(self, docs: Iterable[Document], replace: bool = False) -> None:
-        docs = list(docs)
+        with self._lock:
+            if not self._retired:
+                self._add_documents(docs, replace)
+                return
+        get_hybrid_retrieval_manager(self.namespace).add_documents(docs, replace)
+
+    def export_state(self) -> tuple[List[Document], np.ndarray, str]:
+        """Согласованный срез корпуса: документы, их векторы из Chroma и поколение."""
+        with self._lock:
+            if not self._retired:
+                documents = list(self._documents)
+                return documents, self._document_vectors(documents), self._generation
+        return get_hybrid_retrieval_manager(self.namespace).export_state()
+
+    def install_corpus(self, documents: Sequence[Document], vectors: np.ndarray) -> None:
+        """
+        Заменяет корпус целиком готовыми векторами (импорт снимка): новая
+        коллекция Chroma подменяет рабочую, затем BM25 и bm25_index.json.
+        Всё под блокировкой корпуса, поэтому параллельная загрузка или сжатие
+        не пишут в удалённую коллекцию и не затирают установленный корпус.
+        """
+        with self._lock:
+            if not self._retired:
+                self._replace_collection(documents, vectors)
+                self._documents = list(documents)
+                self._rebuild_doc_index()
+                self._rebuild_bm25()
+                self._save_documents()
+                self._schedule_publish()
+                return
+        get_hybrid_retrieval_manager(self.namespace).install_corpus(documents, vectors)
+
+    def compact(self) -> dict:
+        """
+        Сверяет хранилище чанков с Chroma. Если в коллекции есть осиротевшие
+        векторы или у чанков не хватает векторов, коллекция пересобирается
+        начисто: удалённые записи и сироты не переносятся, недостающие
+        векторы считаются заново, остальные берутся из Chroma. Затем BM25 и
+        bm25_index.json пересобираются из сверенного корпуса, а writer
+        публикует поколение (если CURRENT отстаёт от корпуса) и удаляет старые.
+        """
+        stats = None
+        with self._lock:
+            if not self._retired:
+                stats = self._compact()
+        if stats is None:
+            return get_hybrid_retrieval_manager(self.namespace).compact()
+        # вне блокировки корпуса: публикация берёт её после своей
+        stats["published_generation"] = self._publish_generation()
+        if settings.index_role == "writer":
+            with self._publish_lock:
+                prune_generations(
+                    self._paths.generations_path, keep=settings.index_generations_keep
+                )
+        return stats
+
+    def _compact(self) -> dict:
+        stored_ids = set(self._vectorstore.get(include=[])["ids"])
+        known_ids = set(self._doc_index)
+        orphaned_vectors = len(stored_ids - known_ids)
+        missing_vectors = len(known_ids - stored_ids)
+
+        rebuilt = bool(orphaned_vectors or missing_vectors)
+        if rebuilt:
+            self._replace_collection(
+                self._documents, self._document_vectors(self._documents)
+            )
+        self._rebuild_bm25()
+        self._save_documents()
+        return {
+            "documents": len(self._documents),
+            "orphaned_vectors": orphaned_vectors,
+            "missing_vectors": missing_vectors,
+            "rebuilt": rebuilt,
+        }
+
+    def _replace_collection(self, documents: Sequence[Document], vectors: np.ndarray) -> None:
+        # вызывается под блокировкой корпуса; поиски ждут только саму подмену
+        staging = _stage_collection(documents, vectors)
+        with self._search_gate.swap():
+            self._vectorstore = _swap_collection(staging, self._paths.collection)
+
+    def _add_documents(self, docs: Iterable[Document], replace: bool) -> None:
+        # в индекс попадают окна предложений, связанные с родительским чанком
+        docs = build_child_passages(list(docs), settings.retrieval_sentence_window)
         if not docs:
             return
 
+        removed = False
         if replace:
+            # id чанков зависят от содержимого: удаляются только исчезнувшие
+            # или изменённые чанки, неизменные остаются со своими эмбеддингами
             base_ids = {
                 doc.metadata.get("doc_base_id")
                 for doc in docs
                 if doc.metadata.get("doc_base_id")
             }
-            for base_id in base_ids:
-                self._remove_documents_by_base(base_id)
+            keep_ids = {doc.metadata.get("doc_id") for doc in docs}
+            removed = self._remove_documents(
+                lambda doc: doc.metadata.get("doc_base_id") in base_ids
+                and doc.metadata.get("doc_id") not in keep_ids
+            )
 
         new_docs: List[Document] = []
         new_ids: List[str] = []
+        seen_ids: set[str] = set()
 
         for doc in docs:
             doc_id = doc.metadata.get("doc_id")
             if not doc_id:
                 continue
-            if doc_id in self._doc_index:
-                # уже существует — пропускаем
+            if doc_id in self._doc_index or doc_id in seen_ids:
+                # уже существует (или повторяется в этой загрузке) — пропускаем
                 continue
+            seen_ids.add(doc_id)
             new_docs.append(doc)
             new_ids.append(doc_id)
 
+        if replace:
+            logger.info(
+                "Replaced documents: %s added, %s unchanged",
+                len(new_docs),
+                len(docs) - len(new_docs),
+            )
+
         if not new_docs:
+            if removed:
+                self._schedule_publish()
             return
 
         self._documents.extend(new_docs)
@@ -191,68 +512,71 @@ class HybridRetrievalManager:
         self._vectorstore.persist()
         self._rebuild_bm25()
         self._save_documents()
+        self._schedule_publish()
+
+    @property
+    def generation(self) -> str:
+        """Отпечаток содержимого корпуса (без чанков самих БФТ)."""
+        return self._generation
+
+    @property
+    def documents(self) -> List[Document]:
+        return list(self._documents)
 
     def ensure_system_documents(self) -> None:
         system_docs = build_system_documents()
         self.add_documents(system_docs, replace=True)
 
-    def retrieve(
-        self,
-        query: str,
-        k: int = 5,
-        weights: tuple[float, float] = (0.4, 0.6),
-    ) -> List[Document]:
-        retrievers = []
-        weights_list = []
-
-        if self._bm25 and self._documents:
-            self._bm25.k = k
-            retrievers.append(self._bm25)
-            weights_list.append(weights[0])
-
-        vector_retriever = self._vectorstore.as_retriever(search_kwargs={"k": k})
-        retrievers.append(vector_retriever)
-        weights_list.append(weights[-1])
-
-        if len(retrievers) == 1:
-            docs = retrievers[0].invoke(query)
-        else:
-            ensemble = EnsembleRetriever(retrievers=retrievers, weights=weights_list)
-            docs = ensemble.invoke(query)
-
-        unique_docs: List[Document] = []
-        seen_ids: set[str] = set()
-
-        for doc in docs:
-            doc_id = doc.metadata.get("doc_id")
-            if doc_id and doc_id in seen_ids:
-                continue
-            if doc_id:
-                seen_ids.add(doc_id)
-            unique_docs.append(doc)
+    def lexical_search(self, query: str, k: int) -> List[Document]:
+        bm25 = self._bm25
+        if bm25 is None:
+            return []
+        # без изменения bm25.k: метод вызывается из нескольких потоков
+        return bm25.vectorizer.get_top_n(bm25.preprocess_func(query), bm25.docs, n=k)
 
-        return unique_docs[:k]
+    def dense_search(self, query: str, k: int) -> List[Document]:
+        with self._search_gate.search():
+            if not self._retired:
+                return self._vectorstore.similarity_search(query, k=k)
+        # коллекцию могли подменить через менеджер, сменивший этот
+        return get_hybrid_retrieval_manager(self.namespace).dense_search(query, k)
 
     # --- внутренние методы ---
 
-    def _remove_documents_by_base(self, base_id: str | None) -> None:
-        if not base_id:
+    def _ensure_child_passages(self) -> None:
+        """
+        Однократно переводит корпус в окна предложений по документам: целые
+        чанки и окна прежнего формата (нарезанные внутри каждого чанка).
+        """
+        if settings.retrieval_sentence_window <= 0:
             return
+        legacy = [
+            doc
+            for doc in self._documents
+            if doc.metadata.get("doc_id") and not is_window(doc)
+        ]
+        if not legacy:
+            return
+        logger.info("Splitting %s corpus entries into document sentence windows", len(legacy))
+        legacy_ids = {id(doc) for doc in legacy}
+        self._remove_documents(lambda doc: id(doc) in legacy_ids)
+        self.add_documents(restore_parent_chunks(legacy))
 
+    def _remove_documents(self, predicate: Callable[[Document], bool]) -> bool:
         ids_to_remove = [
             doc.metadata.get("doc_id")
             for doc in self._documents
-            if doc.metadata.get("doc_base_id") == base_id
+            if predicate(doc)
         ]
         ids_to_remove = [doc_id for doc_id in ids_to_remove if doc_id]
 
         if not ids_to_remove:
-            return
+            return False
 
         self._documents = [
             doc
             for doc in self._documents
-            if doc.metadata.get("doc_base_id") != base_id
+            if not predicate(doc)
         ]
 
         self._vectorstore.delete(ids=ids_to_remove)
@@ -261,12 +585,106 @@ class HybridRetrievalManager:
         self._rebuild_doc_index()
         self._rebuild_bm25()
         self._save_documents()
+        return True
+
+    def _schedule_publish(self) -> None:
+        """
+        Публикация поколения выгружает все векторы и пересобирает индекс, то
+        есть стоит O(корпус). Поэтому она откладывается, пока загрузки не
+        затихнут на index_generation_publish_delay_seconds: серия загрузок
+        даёт одно поколение.
+        """
+        if settings.index_role != "writer":
+            return
+        with self._publish_state:
+            self._publish_due = (
+                time.monotonic() + settings.index_generation_publish_delay_seconds
+            )
+            if self._publisher is not None:
+                return
+            self._publisher = threading.Thread(
+                target=self._publish_when_idle,
+                name=f"publish-{self.namespace}",
+                daemon=True,
+            )
+            self._publisher.start()
+
+    def _publish_when_idle(self) -> None:
+        while True:
+            with self._publish_state:
+                wait = self._publish_due - time.monotonic()
+                if wait <= 0:
+                    self._publisher = None
+                    break
+            time.sleep(wait)
+        try:
+            self._publish_generation()
+        except Exception:
+            # при следующем запуске writer опубликует недостающее поколение
+            logger.exception("Failed to publish index generation of '%s'", self.namespace)
+
+    def _publish_generation(self) -> str | None:
+        """
+        Публикует корпус для процессов-читателей (только в роли writer);
+        возвращает имя нового поколения или None, если публиковать нечего.
+        """
+        if settings.index_role != "writer":
+            return None
+        root = self._paths.generations_path
+        # порядок блокировок: публикация, затем корпус — срезы публикуются по очереди
+        with self._publish_lock:
+            with self._lock:
+                if self._retired:
+                    return None  # корпус публикует сменивший его менеджер
+                current = read_current(root)
+                if current is not None and current.endswith(f"-{self._generation}"):
+                    return None
+                if not self._documents:
+                    return None  # пустое пространство: читателям нечего отображать
+                documents = list(self._documents)
+                vectors = self._document_vectors(documents)
+                corpus_generation = self._generation
+            name = publish_generation(
+                root,
+                documents,
+                vectors,
+                corpus_generation=corpus_generation,
+                model=settings.embedding_model_name,
+                reduction=settings.embedding_reduction,
+                reduced_dim=settings.embedding_reduced_dim,
+                keep_full=settings.embedding_rescore_factor > 1,
+            )
+            prune_generations(root, keep=settings.index_generations_keep)
+        return name
+
+    def _document_vectors(self, documents: Sequence[Document]) -> np.ndarray:
+        ids = [doc.metadata.get("doc_id", f"idx::{idx}") for idx, doc in enumerate(documents)]
+        stored = self._vectorstore.get(ids=ids, include=["embeddings"]) if ids else {"ids": []}
+        by_id = dict(zip(stored["ids"], stored.get("embeddings") or []))
+        missing = [idx for idx, doc_id in enumerate(ids) if doc_id not in by_id]
+        if missing:
+            # документы без эмбеддинга в Chroma (например, из старого bm25_index.json)
+            texts = [documents[idx].page_content for idx in missing]
+            for idx, vector in zip(missing, _get_embeddings().embed_documents(texts)):
+                by_id[ids[idx]] = vector
+        return np.array([by_id[doc_id] for doc_id in ids], dtype=np.float32)
 
     def _rebuild_doc_index(self) -> None:
         self._doc_index = {}
+        digest = hashlib.sha256()
         for idx, doc in enumerate(self._documents):
             doc_id = doc.metadata.get("doc_id", f"idx::{idx}")
             self._doc_index[doc_id] = idx
+        hashed = False
+        for doc_id in sorted(self._doc_index):
+            doc = self._documents[self._doc_index[doc_id]]
+            if doc.metadata.get("source") == "bft":
+                continue
+            digest.update(doc_id.encode("utf-8"))
+            digest.update(hashlib.sha256(doc.page_content.encode("utf-8")).digest())
+            hashed = True
+        # пустой корпус — пустой отпечаток, как у пространства без файлов
+        self._generation = digest.hexdigest()[:16] if hashed else ""
 
     def _rebuild_bm25(self) -> None:
         if not self._documents:
@@ -275,14 +693,20 @@ class HybridRetrievalManager:
         self._bm25 = BM25Retriever.from_documents(self._documents)
 
     def _save_documents(self) -> None:
-        payload = [
-            {"page_content": doc.page_content, "metadata": doc.metadata}
-            for doc in self._documents
-        ]
-        self._bm25_index_path.write_text(
-            json.dumps(payload, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
+        _write_documents(self._bm25_index_path, self._documents)
+        self._save_generation_marker()
+
+    def _save_generation_marker(self) -> None:
+        # ключ анализа читает отпечаток из файла, не загружая корпус (read_corpus_generation)
+        marker = self._paths.generation_marker
+        try:
+            if marker.read_text(encoding="utf-8").strip() == self._generation:
+                return
+        except FileNotFoundError:
+            pass
+        tmp_path = marker.with_name(marker.name + ".tmp")
+        tmp_path.write_text(self._generation, encoding="utf-8")
+        os.replace(tmp_path, marker)
 
     def _load_documents(self) -> List[Document]:
         if not self._bm25_index_path.exists():
@@ -294,6 +718,166 @@ class HybridRetrievalManager:
         ]
 
 
+class ReadOnlyRetrievalManager:
+    """
+    Поиск по опубликованным поколениям индекса (index_role="reader").
+
+    Файлы поколения отображаются в память, поэтому корпус, векторы и BM25
+    занимают общие страницы для всех воркеров. Новое поколение подхватывается
+    при очередном запросе, не чаще раза в index_generation_poll_seconds.
+    """
+
+    read_only = True
+
+    def __init__(self, namespace: str | None = None) -> None:
+        self.namespace = validate_namespace(namespace)
+        self._root = namespace_paths(self.namespace).generations_path
+        self._lock = threading.Lock()
+        self._current: IndexGeneration | None = None
+        self._checked_at = 0.0
+        self._refresh(force=True)
+        CORPUS_DOCUMENTS.set_function(
+            lambda: len(self._current) if self._current else 0,
+            namespace=self.namespace,
+        )
+
+    @property
+    def generation(self) -> str:
+        current = self._refresh()
+        return current.corpus_generation if current else ""
+
+    def add_documents(self, docs: Iterable[Document], replace: bool = False) -> None:
+        if list(docs):
+            raise ReadOnlyIndexError("Index is read-only in this process; ingest via the writer")
+
+    def ensure_system_documents(self) -> None:
+        # реестр систем индексирует процесс-писатель
+        return
+
+    def lexical_search(self, query: str, k: int) -> List[Document]:
+        current = self._refresh()
+        if current is None:
+            return []
+        return [current.document(idx) for idx in current.bm25_search(query, k)]
+
+    def dense_search(self, query: str, k: int) -> List[Document]:
+        current = self._refresh()
+        if current is None or not len(current):
+            return []
+        query_vector = _get_embeddings().embed_query(query)
+        ranked = current.dense_search(
+            query_vector, k, rescore_factor=settings.embedding_rescore_factor
+        )
+        return [current.document(idx) for idx in ranked]
+
+    def _refresh(self, force: bool = False) -> IndexGeneration | None:
+        now = time.monotonic()
+        if not force and now - self._checked_at < settings.index_generation_poll_seconds:
+            return self._current
+        with self._lock:
+            self._checked_at = now
+            name = read_current(self._root)
+            if name and (self._current is None or self._current.name != name):
+                try:
+                    generation = IndexGeneration(self._root / name)
+                except (OSError, ValueError) as exc:
+                    logger.warning("Failed to load index generation %s: %s", name, exc)
+                else:
+                    if generation.manifest["model"] != settings.embedding_model_name:
+                        logger.warning(
+                            "Index generation %s was built with %s, expected %s",
+                            name,
+                            generation.manifest["model"],
+                            settings.embedding_model_name,
+                        )
+                    self._current = generation
+                    logger.info("Switched to index generation %s", name)
+            return self._current
+
+
+RetrievalManager = HybridRetrievalManager | ReadOnlyRetrievalManager
+
+
+def _on_manager_evicted(namespace: str, manager: RetrievalManager) -> None:
+    if isinstance(manager, HybridRetrievalManager):
+        manager.retire()
+    CORPUS_DOCUMENTS.remove(namespace=namespace)
+
+
 @lru_cache()
-def get_hybrid_retrieval_manager() -> HybridRetrievalManager:
-    return HybridRetrievalManager()
\ No newline at end of file
+def _get_namespace_managers() -> NamespaceManagers[RetrievalManager]:
+    factory = (
+        ReadOnlyRetrievalManager if settings.index_role == "reader" else HybridRetrievalManager
+    )
+    return NamespaceManagers(
+        factory,
+        capacity=settings.rag_max_loaded_namespaces,
+        on_evict=_on_manager_evicted,
+    )
+
+
+def get_hybrid_retrieval_manager(namespace: str | None = None) -> RetrievalManager:
+    """Менеджер корпуса пространства имён (None — по умолчанию)."""
+    return _get_namespace_managers().get(namespace)
+
+
+def read_corpus_generation(namespace: str | None = None) -> str:
+    """
+    Отпечаток корпуса пространства (generation его менеджера) без загрузки
+    корпуса: берётся у уже загруженного менеджера, иначе из маркера рядом с
+    bm25_index.json, а у читателя — из имени текущего поколения.
+    """
+    namespace = validate_namespace(namespace)
+    manager = _get_namespace_managers().peek(namespace)
+    if manager is not None:
+        return manager.generation
+    paths = namespace_paths(namespace)
+    if settings.index_role == "reader":
+        # имя поколения: "<мс>-<corpus_generation>"
+        name = read_current(paths.generations_path)
+        return name.split("-", 1)[1] if name else ""
+    try:
+        return paths.generation_marker.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return ""
+
+
+def _install_corpus_files(
+    namespace: str, documents: Sequence[Document], vectors: np.ndarray
+) -> None:
+    paths = namespace_paths(namespace)
+    locks = _get_corpus_locks(namespace)
+    # вытесненный менеджер пространства может ещё писать: файлы меняются под его блокировкой
+    with locks.corpus:
+        staging = _stage_collection(documents, vectors)
+        with locks.search.swap():
+            _swap_collection(staging, paths.collection)
+        paths.bm25_index_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_documents(paths.bm25_index_path, documents)
+
+
+def install_corpus(
+    namespace: str, documents: Sequence[Document], vectors: np.ndarray
+) -> RetrievalManager:
+    """
+    Устанавливает корпус пространства готовыми векторами (импорт снимка).
+    Если пространство не загружено, коллекция и bm25_index.json пишутся до
+    создания менеджера: конструктор читает уже установленный корпус, и
+    синхронизация реестра систем сверяется с ним, ничего не эмбеддя заново.
+    """
+    manager, prepared = _get_namespace_managers().get_or_prepare(
+        namespace, lambda name: _install_corpus_files(name, documents, vectors)
+    )
+    if not prepared:
+        manager.install_corpus(documents, vectors)
+        if manager.namespace == settings.rag_default_namespace:
+            # реестр систем в снимке мог устареть: меняются только отличающиеся чанки
+            manager.ensure_system_documents()
+    return manager
+
+
+@contextmanager
+def borrow_retrieval_manager(namespace: str | None = None) -> Iterator[RetrievalManager]:
+    """Менеджер пространства для фоновых задач, не вытесняющий загруженные (см. borrow)."""
+    with _get_namespace_managers().borrow(namespace) as manager:
+        yield manager
@@ -0,0 +1,188 @@
+"""
+Пространства имён RAG-корпуса: у каждой команды своя коллекция Chroma,
+свой BM25-индекс и свои поколения индекса, поэтому стоимость запроса
+зависит только от её документов. Пространство по умолчанию хранится по
+прежним путям (bm25_index_path, index_generations_path, "rag_corpus").
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Generic, Iterator, List, TypeVar
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# имя входит в имя коллекции Chroma ("rag_corpus__<имя>", не длиннее 63):
+# 1–48 символов, буквы/цифры на концах
+NAMESPACE_PATTERN = r"^[a-z0-9](?:[a-z0-9_-]{0,46}[a-z0-9])?$"
+_NAMESPACE_RE = re.compile(NAMESPACE_PATTERN)
+
+DEFAULT_COLLECTION = "rag_corpus"
+
+
+class InvalidNamespaceError(ValueError):
+    pass
+
+
+def validate_namespace(namespace: str | None) -> str:
+    """Имя пространства (None — по умолчанию) или InvalidNamespaceError."""
+    if namespace is None:
+        return settings.rag_default_namespace
+    if not _NAMESPACE_RE.match(namespace):
+        raise InvalidNamespaceError(
+            f"Invalid namespace '{namespace}': use 1-48 lowercase letters, digits, '-' or '_'"
+        )
+    return namespace
+
+
+@dataclass(frozen=True)
+class NamespacePaths:
+    collection: str
+    bm25_index_path: Path
+    generations_path: Path
+
+    @property
+    def generation_marker(self) -> Path:
+        """Отпечаток корпуса рядом с bm25_index.json: читается без загрузки корпуса."""
+        return self.bm25_index_path.with_name(self.bm25_index_path.stem + ".generation")
+
+
+def namespace_paths(namespace: str) -> NamespacePaths:
+    if namespace == settings.rag_default_namespace:
+        return NamespacePaths(
+            collection=DEFAULT_COLLECTION,
+            bm25_index_path=settings.bm25_index_path,
+            generations_path=settings.index_generations_path,
+        )
+    root = settings.rag_namespaces_path / namespace
+    return NamespacePaths(
+        collection=f"{DEFAULT_COLLECTION}__{namespace}",
+        bm25_index_path=root / "bm25_index.json",
+        generations_path=root / "index_generations",
+    )
+
+
+M = TypeVar("M")
+
+
+class NamespaceManagers(Generic[M]):
+    """
+    Менеджеры корпусов по пространствам имён: создаются при первом обращении
+    и вытесняются по LRU сверх capacity. Пространство по умолчанию не
+    вытесняется. Загрузка идёт под блокировкой своего пространства, так что
+    медленная загрузка одного корпуса не задерживает запросы к другим.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], M],
+        capacity: int,
+        on_evict: Callable[[str, M], None] | None = None,
+    ) -> None:
+        self._factory = factory
+        self._capacity = max(1, capacity)
+        self._on_evict = on_evict
+        self._managers: "OrderedDict[str, M]" = OrderedDict()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str | None = None) -> M:
+        manager, _ = self._get(namespace, None)
+        return manager
+
+    def get_or_prepare(
+        self, namespace: str | None, prepare: Callable[[str], None]
+    ) -> tuple[M, bool]:
+        """
+        Загруженный менеджер (prepared=False) или, если пространство не
+        загружено, prepare(namespace) и новый менеджер (prepared=True).
+        prepare выполняется под блокировкой загрузки: ни get, ни borrow не
+        создадут менеджер по наполовину подготовленным файлам.
+        """
+        return self._get(namespace, prepare)
+
+    def _get(
+        self, namespace: str | None, prepare: Callable[[str], None] | None
+    ) -> tuple[M, bool]:
+        namespace = validate_namespace(namespace)
+        with self._lock:
+            manager = self._managers.get(namespace)
+            if manager is not None:
+                self._managers.move_to_end(namespace)
+                return manager, False
+            load_lock = self._load_locks.setdefault(namespace, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                manager = self._managers.get(namespace)
+            if manager is not None:
+                return manager, False
+            if prepare is not None:
+                prepare(namespace)
+            logger.info("Loading retrieval namespace '%s'", namespace)
+            manager = self._factory(namespace)
+            with self._lock:
+                self._managers[namespace] = manager
+                evicted = self._evict_locked()
+            for name, old in evicted:
+                logger.info("Evicted retrieval namespace '%s'", name)
+                if self._on_evict:
+                    self._on_evict(name, old)
+        return manager, prepare is not None
+
+    @contextmanager
+    def borrow(self, namespace: str | None = None) -> Iterator[M]:
+        """
+        Менеджер для фоновой задачи (например, сжатия всех пространств), не
+        меняющий LRU: загруженный менеджер отдаётся без продвижения в очереди,
+        а для незагруженного пространства создаётся временный, который никого
+        не вытесняет. Пока временный менеджер в работе, загрузка этого
+        пространства через get ждёт, так что второго менеджера не появляется.
+        """
+        namespace = validate_namespace(namespace)
+        with self._lock:
+            manager = self._managers.get(namespace)
+            load_lock = self._load_locks.setdefault(namespace, threading.Lock())
+        if manager is not None:
+            yield manager
+            return
+
+        with load_lock:
+            with self._lock:
+                manager = self._managers.get(namespace)
+            if manager is not None:
+                yield manager
+                return
+            manager = self._factory(namespace)
+            try:
+                yield manager
+            finally:
+                if self._on_evict:
+                    self._on_evict(namespace, manager)
+
+    def peek(self, namespace: str | None = None) -> M | None:
+        """Загруженный менеджер без создания и без продвижения в LRU."""
+        namespace = validate_namespace(namespace)
+        with self._lock:
+            return self._managers.get(namespace)
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._managers)
+
+    def _evict_locked(self) -> List[tuple[str, M]]:
+        evicted = []
+        candidates = [name for name in self._managers if name != settings.rag_default_namespace]
+        while len(self._managers) > self._capacity and candidates:
+            name = candidates.pop(0)
+            evicted.append((name, self._managers.pop(name)))
+        return evicted
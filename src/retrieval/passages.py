@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, List, Sequence
+
+from langchain_core.documents import Document
+
+from src.ingestion.preprocessor import split_sentences
+
+# сколько дочерних фрагментов запрашивать у ветви поиска на один итоговый документ:
+# несколько фрагментов обычно приходятся на один документ
+CHILD_FANOUT = 3
+
+# разделитель между несмежными фрагментами одного документа в контексте
+SPAN_SEPARATOR = "\n…\n"
+
+# служебные поля окна: позиция в документе [sentence_start, sentence_end)
+_WINDOW_KEYS = ("sentence_start", "sentence_end")
+# поля окон прежнего формата (окна внутри каждого чанка)
+_LEGACY_CHILD_KEYS = ("parent_id", "child_index")
+
+
+def is_window(doc: Document) -> bool:
+    return "sentence_start" in doc.metadata
+
+
+def _document_key(doc: Document) -> str | None:
+    return doc.metadata.get("doc_base_id") or doc.metadata.get("doc_id")
+
+
+def _overlap(head: Sequence[str], tail: Sequence[str]) -> int:
+    """Длина наибольшего суффикса head, совпадающего с префиксом tail."""
+    for size in range(min(len(head), len(tail)), 0, -1):
+        if head[-size:] == tail[:size]:
+            return size
+    return 0
+
+
+def document_sentences(chunks: Sequence[Document]) -> List[str]:
+    """
+    Предложения документа без перекрытия: чанки chunk_text повторяют хвост
+    предыдущего чанка, он отбрасывается при склейке.
+    """
+    ordered = sorted(chunks, key=lambda doc: doc.metadata.get("chunk_index", 0))
+    sentences: List[str] = []
+    for chunk in ordered:
+        chunk_sentences = split_sentences(chunk.page_content) or [chunk.page_content]
+        sentences.extend(chunk_sentences[_overlap(sentences, chunk_sentences) :])
+    return sentences
+
+
+def build_child_passages(parents: Sequence[Document], window: int) -> List[Document]:
+    """
+    Разбивает документы на окна по window предложений (без перекрытия).
+    Чанки группируются по doc_base_id, окна режутся по тексту документа без
+    перекрытия чанков, поэтому каждое предложение попадает ровно в одно окно;
+    окна с одинаковым текстом внутри документа отбрасываются. Поиск идёт по
+    окнам, а в контекст попадают только совпавшие участки документа
+    (см. assemble_parent_spans). window <= 0 — индексировать чанки как есть.
+    """
+    if window <= 0:
+        return list(parents)
+
+    children: List[Document] = []
+    documents: Dict[str, List[Document]] = {}
+    for parent in parents:
+        key = _document_key(parent)
+        if not key or is_window(parent):
+            # без id не связать с документом; уже окно — не дробим повторно
+            children.append(parent)
+            continue
+        documents.setdefault(key, []).append(parent)
+
+    for doc_base_id, chunks in documents.items():
+        metadata = {
+            key: value
+            for key, value in chunks[0].metadata.items()
+            if key not in ("doc_id", "chunk_index")
+        }
+        metadata["doc_base_id"] = doc_base_id
+        sentences = document_sentences(chunks)
+        seen: set[str] = set()
+        for start in range(0, len(sentences), window):
+            end = min(start + window, len(sentences))
+            content = " ".join(sentences[start:end])
+            if content in seen:
+                continue
+            seen.add(content)
+            digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+            children.append(
+                Document(
+                    page_content=content,
+                    metadata={
+                        **metadata,
+                        # позиция входит в id: сдвиг окна — это новое окно
+                        "doc_id": f"{doc_base_id}::s{start}:{digest}",
+                        "sentence_start": start,
+                        "sentence_end": end,
+                    },
+                )
+            )
+    return children
+
+
+def restore_parent_chunks(docs: Sequence[Document]) -> List[Document]:
+    """
+    Чанки из окон прежнего формата (parent_id/child_index): окна одного чанка
+    не перекрывались, поэтому их склейка по порядку даёт текст чанка.
+    Документы без parent_id возвращаются как есть.
+    """
+    restored: List[Document] = []
+    groups: Dict[str, List[Document]] = {}
+    for doc in docs:
+        parent_id = doc.metadata.get("parent_id")
+        if parent_id:
+            groups.setdefault(parent_id, []).append(doc)
+        else:
+            restored.append(doc)
+    for parent_id, children in groups.items():
+        children.sort(key=lambda doc: doc.metadata.get("child_index", 0))
+        metadata = {
+            key: value
+            for key, value in children[0].metadata.items()
+            if key not in _LEGACY_CHILD_KEYS
+        }
+        metadata["doc_id"] = parent_id
+        restored.append(
+            Document(
+                page_content=" ".join(child.page_content for child in children),
+                metadata=metadata,
+            )
+        )
+    return restored
+
+
+def assemble_parent_spans(children: Sequence[Document], k: int) -> List[Document]:
+    """
+    Группирует найденные окна по документу (в порядке лучшего окна) и склеивает
+    соседние окна в непрерывные участки. Возвращает не более k документов —
+    по одному на doc_base_id, с метаданными документа и участками в spans
+    (полуинтервалы номеров предложений).
+    """
+    groups: Dict[tuple, List[Document]] = {}
+    for child in children:
+        if is_window(child):
+            key_id = _document_key(child)
+        else:
+            key_id = child.metadata.get("doc_id") or id(child)
+        # одинаковые id в разных пространствах имён — разные документы
+        key = (child.metadata.get("namespace"), key_id)
+        if key not in groups:
+            if len(groups) >= k:
+                continue
+            groups[key] = []
+        groups[key].append(child)
+
+    assembled: List[Document] = []
+    for (_, doc_base_id), matched in groups.items():
+        if not is_window(matched[0]):
+            assembled.append(matched[0])
+            continue
+
+        by_start = {doc.metadata["sentence_start"]: doc for doc in matched}
+        spans: List[List[Document]] = []
+        for start in sorted(by_start):
+            window = by_start[start]
+            if spans and start == spans[-1][-1].metadata["sentence_end"]:
+                spans[-1].append(window)
+            else:
+                spans.append([window])
+
+        metadata = {
+            key: value for key, value in matched[0].metadata.items() if key not in _WINDOW_KEYS
+        }
+        metadata["doc_id"] = doc_base_id
+        metadata["spans"] = [
+            [span[0].metadata["sentence_start"], span[-1].metadata["sentence_end"]]
+            for span in spans
+        ]
+        assembled.append(
+            Document(
+                page_content=SPAN_SEPARATOR.join(
+                    " ".join(window.page_content for window in span) for span in spans
+                ),
+                metadata=metadata,
+            )
+        )
+    return assembled
@@ -0,0 +1,193 @@
+"""
+Уменьшение размерности эмбеддингов в поколениях индекса.
+
+- "pca": проекция на главные компоненты корпуса; среднее и компоненты
+  подбираются при публикации поколения и хранятся рядом с векторами,
+  поэтому запрос всегда проецируется той же матрицей, что и корпус.
+- "truncate": первые dim координат (для моделей, обученных в стиле
+  Matryoshka, где префикс вектора — сам по себе эмбеддинг).
+
+Грубый поиск идёт по уменьшенным векторам; если поколение хранит и полные
+векторы, лучшие кандидаты пересчитываются по ним (см. IndexGeneration).
+
+Оценка качества: python -m src.retrieval.reduction [--k 10] [--queries 200]
+печатает recall@k и объём векторов для нескольких размерностей.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PCA_MEAN = "pca_mean.npy"
+PCA_COMPONENTS = "pca_components.npy"
+
+# PCA подбирается по выборке: для ковариации корпуса этого достаточно
+PCA_FIT_SAMPLE = 20000
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class VectorReducer:
+    def __init__(
+        self,
+        kind: str,
+        dim: int,
+        mean: np.ndarray | None = None,
+        components: np.ndarray | None = None,
+    ) -> None:
+        self.kind = kind
+        self.dim = dim
+        self._mean = mean
+        self._components = components
+
+    @classmethod
+    def fit(cls, kind: str, vectors: np.ndarray, dim: int) -> "VectorReducer":
+        """vectors — нормированные полные векторы корпуса (n, full_dim)."""
+        full_dim = vectors.shape[1]
+        if kind == "truncate":
+            return cls(kind, min(dim, full_dim))
+        if kind != "pca":
+            raise ValueError(f"Unknown embedding reduction '{kind}'")
+
+        sample = vectors
+        if len(vectors) > PCA_FIT_SAMPLE:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), PCA_FIT_SAMPLE, replace=False)]
+        mean = sample.mean(axis=0)
+        # компонент не больше, чем позволяет ранг выборки
+        dim = max(1, min(dim, full_dim, len(sample)))
+        _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        return cls(kind, dim, mean.astype(np.float32), vt[:dim].astype(np.float32))
+
+    @classmethod
+    def load(cls, path: Path, kind: str, dim: int) -> "VectorReducer":
+        if kind != "pca":
+            return cls(kind, dim)
+        return cls(kind, dim, np.load(path / PCA_MEAN), np.load(path / PCA_COMPONENTS))
+
+    @property
+    def nbytes(self) -> int:
+        if self.kind != "pca":
+            return 0
+        return self._mean.nbytes + self._components.nbytes
+
+    def save(self, path: Path) -> None:
+        if self.kind == "pca":
+            np.save(path / PCA_MEAN, self._mean)
+            np.save(path / PCA_COMPONENTS, self._components)
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Нормированные полные векторы → нормированные уменьшенные."""
+        if self.kind == "truncate":
+            return normalize(vectors[..., : self.dim])
+        return normalize((vectors - self._mean) @ self._components.T)
+
+
+def _exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+def benchmark(
+    vectors: np.ndarray,
+    kinds: Sequence[str] = ("pca", "truncate"),
+    dims: Sequence[int] = (32, 64, 128, 192),
+    k: int = 10,
+    rescore_factor: int = 4,
+    queries: int = 200,
+) -> List[dict]:
+    """
+    recall@k уменьшенного поиска относительно точного поиска по полным
+    векторам (запросы — случайные документы корпуса) и доли относительно
+    полных векторов: memory — то, что читатель держит в памяти (уменьшенные
+    векторы и PCA), disk — файлы поколения (с пересчётом добавляются
+    полные векторы, и поколение становится больше исходного).
+    """
+    vectors = normalize(vectors)
+    n, full_dim = vectors.shape
+    rng = np.random.default_rng(0)
+    query_vectors = vectors[rng.choice(n, min(queries, n), replace=False)]
+    truth = _exact_top_k(vectors, query_vectors, k)
+    full_bytes = vectors.nbytes
+
+    rows = []
+    for kind in kinds:
+        for dim in dims:
+            if dim >= full_dim:
+                continue
+            reducer = VectorReducer.fit(kind, vectors, dim)
+            reduced = reducer.transform(vectors)
+            coarse = _exact_top_k(
+                reduced, reducer.transform(query_vectors), k * max(1, rescore_factor)
+            )
+            for factor in sorted({1, max(1, rescore_factor)}):
+                found = []
+                for qi, candidates in enumerate(coarse[:, : k * factor]):
+                    if factor > 1:
+                        scores = vectors[candidates] @ query_vectors[qi]
+                        candidates = candidates[np.argsort(-scores, kind="stable")]
+                    found.append(candidates[:k])
+                hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+                rows.append(
+                    {
+                        "kind": kind,
+                        "dim": reducer.dim,
+                        "rescore_factor": factor if factor > 1 else 0,
+                        "recall": hits / (len(truth) * k),
+                        "memory_ratio": (reduced.nbytes + reducer.nbytes) / full_bytes,
+                        "disk_ratio": (
+                            reduced.nbytes + reducer.nbytes + (full_bytes if factor > 1 else 0)
+                        )
+                        / full_bytes,
+                    }
+                )
+    return rows
+
+
+def main() -> None:
+    from src.config import get_settings
+    from src.retrieval.generations import IndexGeneration, read_current
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Recall@k vs memory for reduced embeddings")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rescore-factor", type=int, default=settings.embedding_rescore_factor)
+    parser.add_argument("--dims", type=int, nargs="+", default=[32, 64, 128, 192])
+    args = parser.parse_args()
+
+    root = settings.index_generations_path
+    name = read_current(root)
+    if name is None:
+        raise SystemExit(f"No published index generation in {root}")
+    vectors = IndexGeneration(root / name).full_vectors()
+    if vectors is None:
+        raise SystemExit(f"Generation {name} keeps only reduced vectors; republish with rescoring")
+
+    print(f"generation={name} documents={len(vectors)} dim={vectors.shape[1]} k={args.k}")
+    print(f"{'kind':<9} {'dim':>5} {'rescore':>8} {'recall@k':>9} {'memory':>7} {'disk':>7}")
+    for row in benchmark(
+        vectors,
+        dims=args.dims,
+        k=args.k,
+        rescore_factor=args.rescore_factor,
+        queries=args.queries,
+    ):
+        print(
+            f"{row['kind']:<9} {row['dim']:>5} {row['rescore_factor'] or '-':>8} "
+            f"{row['recall']:>9.3f} {row['memory_ratio']:>7.1%} {row['disk_ratio']:>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Dict, List, Sequence, Tuple
+
+from src.db import crud
+from src.db.registry import get_registry_generation
+
+# более короткие идентификаторы дают слишком много ложных совпадений в тексте
+MIN_PATTERN_LENGTH = 3
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """
+    Автомат Ахо–Корасик: поиск всех образцов за один линейный проход по тексту.
+    Образцы и текст сравниваются в нижнем регистре.
+    """
+
+    def __init__(self, patterns: Sequence[Tuple[str, int]]) -> None:
+        # patterns: (строка образца, идентификатор полезной нагрузки)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int]]] = [[]]  # (длина образца, payload)
+
+        for pattern, payload in patterns:
+            pattern = pattern.lower()
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(pattern), payload))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """Генерирует (start, end, payload) для всех вхождений образцов."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for pos, ch in enumerate(text.lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, payload in out[state]:
+                yield pos - length + 1, pos + 1, payload
+
+
+class RegistryMatcher:
+    """Находит в тексте БФТ упоминания систем реестра по system_id, имени и алиасам."""
+
+    def __init__(self, systems: Sequence, generation: int = 0) -> None:
+        self.generation = generation
+        self._systems: List[Dict[str, str]] = []
+        # payload -> (индекс системы, сработавший алиас или None)
+        self._payloads: List[Tuple[int, str | None]] = []
+        patterns: List[Tuple[str, int]] = []
+        seen: set[str] = set()
+
+        for system in systems:
+            sys_idx = len(self._systems)
+            self._systems.append({"system_id": system.system_id, "system_name": system.name})
+            keys = [(system.system_id, None), (system.name, None)]
+            keys += [(str(alias), str(alias)) for alias in (system.aliases or []) if alias]
+            for key, alias in keys:
+                key = (key or "").strip()
+                if len(key) < MIN_PATTERN_LENGTH or key.lower() in seen:
+                    continue
+                seen.add(key.lower())
+                patterns.append((key, len(self._payloads)))
+                self._payloads.append((sys_idx, alias))
+
+        self._automaton = AhoCorasick(patterns)
+
+    def match(self, text: str) -> List[Dict[str, str]]:
+        """Системы в порядке первого упоминания; учитываются только целые слова."""
+        found: Dict[int, Dict[str, str]] = {}
+        text = text.lower()
+        for start, end, payload in self._automaton.iter_matches(text):
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            sys_idx, alias = self._payloads[payload]
+            entry = found.setdefault(sys_idx, dict(self._systems[sys_idx]))
+            if alias and "alias" not in entry:
+                entry["alias"] = alias
+        return list(found.values())
+
+
+_matcher_lock = threading.Lock()
+_current_matcher: RegistryMatcher | None = None
+
+
+def get_registry_matcher() -> RegistryMatcher:
+    """Текущий автомат; перестраивается, когда меняется поколение реестра."""
+    global _current_matcher
+    generation = get_registry_generation()
+    matcher = _current_matcher
+    if matcher is None or matcher.generation != generation:
+        with _matcher_lock:
+            if _current_matcher is None or _current_matcher.generation != generation:
+                _current_matcher = RegistryMatcher(crud.list_systems(), generation=generation)
+            matcher = _current_matcher
+    return matcher
@@ -0,0 +1,237 @@
+"""
+Снимки RAG-корпуса для быстрого запуска реплик.
+
+Новая реплика не пересчитывает эмбеддинги всего корпуса и не копирует
+каталоги, в которые идёт запись: снимок снимается с согласованного среза
+корпуса (под блокировкой менеджера) и импортируется атомарно.
+
+Архив (tar.gz):
+
+    snapshot.json     формат, пространство имён, модель эмбеддингов и размерность,
+                      число документов, поколения корпуса и реестра, sha256 файлов
+    documents.jsonl   чанки с метаданными (по документу в строке)
+    embeddings.npy    векторы float32 (n, dim) в порядке documents.jsonl
+
+Импорт выполняется в writer/standalone (читатели получают корпус из
+поколений, которые публикует writer): под блокировкой корпуса векторы
+загружаются во временную коллекцию Chroma, которая затем заменяет рабочую,
+а bm25_index.json заменяется через os.replace. Если пространство ещё не
+загружено (новая реплика), файлы ставятся до создания менеджера, и его
+запуск ничего не эмбеддит: реестр систем сверяется с импортированным корпусом.
+
+Экспорт: python -m src.retrieval.snapshot export [--namespace NS] [--output PATH]
+Импорт:  python -m src.retrieval.snapshot import PATH [--namespace NS]
+(CLI-импорт — до запуска сервиса; в работающий сервис — через API.)
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import IO
+
+import numpy as np
+import orjson
+from langchain_core.documents import Document
+
+from src.config import get_settings
+from src.db.registry import get_registry_generation, init_registry_tracking
+from src.retrieval.hybrid import get_hybrid_retrieval_manager, install_corpus
+from src.retrieval.namespaces import validate_namespace
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_MANIFEST = "snapshot.json"
+DOCUMENTS_FILE = "documents.jsonl"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_snapshot(output: Path, namespace: str | None = None) -> dict:
+    """Пишет снимок корпуса пространства в output (атомарно); возвращает манифест."""
+    manager = get_hybrid_retrieval_manager(namespace)
+    if manager.read_only:
+        raise SnapshotError("Snapshots are exported from the writer process")
+    documents, vectors, corpus_generation = manager.export_state()
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=output.parent) as tmp:
+        staging = Path(tmp)
+        with open(staging / DOCUMENTS_FILE, "wb") as fh:
+            for doc in documents:
+                fh.write(orjson.dumps({"page_content": doc.page_content, "metadata": doc.metadata}))
+                fh.write(b"\n")
+        np.save(staging / EMBEDDINGS_FILE, vectors)
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "namespace": manager.namespace,
+            "model": settings.embedding_model_name,
+            "dim": int(vectors.shape[1]) if vectors.size else 0,
+            "count": len(documents),
+            "corpus_generation": corpus_generation,
+            "registry_generation": get_registry_generation(),
+            "created_at": time.time(),
+            "files": {
+                name: _sha256_file(staging / name) for name in (DOCUMENTS_FILE, EMBEDDINGS_FILE)
+            },
+        }
+        (staging / SNAPSHOT_MANIFEST).write_text(json.dumps(manifest), encoding="utf-8")
+
+        partial = staging / "snapshot.tar.gz"
+        with tarfile.open(partial, "w:gz") as tar:
+            # манифест первым: импорт проверяет совместимость до чтения данных
+            for name in (SNAPSHOT_MANIFEST, DOCUMENTS_FILE, EMBEDDINGS_FILE):
+                tar.add(staging / name, arcname=name)
+        os.replace(partial, output)
+
+    logger.info(
+        "Exported snapshot of namespace '%s' (%s documents) to %s",
+        manifest["namespace"],
+        manifest["count"],
+        output,
+    )
+    return manifest
+
+
+def _member(tar: tarfile.TarFile, name: str) -> IO[bytes]:
+    try:
+        member = tar.getmember(name)
+    except KeyError:
+        raise SnapshotError(f"Snapshot has no {name}") from None
+    fh = tar.extractfile(member) if member.isfile() else None
+    if fh is None:
+        raise SnapshotError(f"Snapshot entry {name} is not a regular file")
+    return fh
+
+
+def _check_manifest(manifest: dict) -> None:
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format')!r}")
+    if manifest.get("model") != settings.embedding_model_name:
+        raise SnapshotError(
+            f"Snapshot vectors were built with '{manifest.get('model')}', "
+            f"this node uses '{settings.embedding_model_name}'"
+        )
+
+
+def import_snapshot(archive: Path, namespace: str | None = None) -> dict:
+    """
+    Проверяет и устанавливает снимок в пространство namespace (по умолчанию —
+    то, из которого он снят). Эмбеддинги не пересчитываются.
+    """
+    if settings.index_role == "reader":
+        # второй публикатор поколений испортил бы индекс writer-а
+        raise SnapshotError("Snapshots are imported into the writer process")
+    started = time.monotonic()
+    try:
+        tar = tarfile.open(archive, "r:gz")
+    except (tarfile.TarError, OSError) as exc:
+        raise SnapshotError(f"Cannot read snapshot archive: {exc}") from exc
+
+    with tar, tempfile.TemporaryDirectory() as tmp:
+        try:
+            manifest = json.loads(_member(tar, SNAPSHOT_MANIFEST).read())
+        except json.JSONDecodeError as exc:
+            raise SnapshotError(f"Invalid snapshot manifest: {exc}") from exc
+        _check_manifest(manifest)
+        namespace = validate_namespace(namespace or manifest.get("namespace"))
+
+        # файлы читаются по известным именам: пути из архива не используются
+        for name in (DOCUMENTS_FILE, EMBEDDINGS_FILE):
+            expected = manifest.get("files", {}).get(name)
+            if not expected:
+                raise SnapshotError(f"Snapshot manifest has no checksum for {name}")
+            with open(Path(tmp) / name, "wb") as fh:
+                shutil.copyfileobj(_member(tar, name), fh)
+            if _sha256_file(Path(tmp) / name) != expected:
+                raise SnapshotError(f"Checksum mismatch for {name}")
+
+        with open(Path(tmp) / DOCUMENTS_FILE, "rb") as fh:
+            documents = [
+                Document(page_content=item["page_content"], metadata=item.get("metadata", {}))
+                for item in map(orjson.loads, fh)
+            ]
+        vectors = np.load(Path(tmp) / EMBEDDINGS_FILE)
+
+    count = manifest.get("count")
+    if len(documents) != count or len(vectors) != count:
+        raise SnapshotError("Snapshot document and vector counts do not match the manifest")
+    if count and vectors.shape[1] != manifest.get("dim"):
+        raise SnapshotError("Snapshot vector dimension does not match the manifest")
+    if manifest.get("registry_generation") != get_registry_generation():
+        logger.warning(
+            "Snapshot registry generation %s differs from local %s; "
+            "system documents are re-synced after import",
+            manifest.get("registry_generation"),
+            get_registry_generation(),
+        )
+
+    # реестр систем после установки сверяется с импортированными чанками
+    install_corpus(namespace, documents, vectors)
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Imported snapshot into namespace '%s' (%s documents) in %.1fs",
+        namespace,
+        count,
+        elapsed,
+    )
+    return {**manifest, "namespace": namespace, "elapsed_seconds": elapsed}
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export or import a RAG corpus snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_cmd = commands.add_parser("export")
+    export_cmd.add_argument("--namespace")
+    export_cmd.add_argument("--output", type=Path)
+    import_cmd = commands.add_parser("import")
+    import_cmd.add_argument("archive", type=Path)
+    import_cmd.add_argument("--namespace")
+    args = parser.parse_args()
+
+    from src.db.base import init_db
+
+    init_db()
+    init_registry_tracking()
+    try:
+        if args.command == "export":
+            namespace = validate_namespace(args.namespace)
+            output = args.output or Path(f"snapshot-{namespace}-{int(time.time())}.tar.gz")
+            manifest = export_snapshot(output, namespace)
+            print(f"{output}: {manifest['count']} documents, model {manifest['model']}")
+        else:
+            manifest = import_snapshot(args.archive, args.namespace)
+            print(
+                f"namespace {manifest['namespace']}: {manifest['count']} documents "
+                f"in {manifest['elapsed_seconds']:.1f}s"
+            )
+    except SnapshotError as exc:
+        raise SystemExit(str(exc)) from exc
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence
+
+from src.db import crud
+from src.db.registry import get_registry_generation
+
+# верхняя граница просмотра префиксного диапазона для коротких запросов
+MAX_PREFIX_SCAN = 500
+
+
+def normalize(value: str | None) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def trigrams(value: str) -> set[str]:
+    padded = f"  {value} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class SystemEntry:
+    system_id: str
+    name: str
+    aliases: List[str] = field(default_factory=list)
+
+    @property
+    def keys(self) -> List[str]:
+        return [normalize(key) for key in (self.system_id, self.name, *self.aliases) if key]
+
+
+class SystemSearchIndex:
+    """
+    In-memory индекс реестра систем для автодополнения.
+
+    Префиксный поиск — бинарный поиск по отсортированному списку ключей
+    (system_id, name, aliases и отдельные слова имени), нечёткий — по
+    пересечению триграмм. Индекс неизменяемый: при изменении реестра
+    строится новый экземпляр.
+    """
+
+    def __init__(self, entries: Sequence[SystemEntry], generation: int = 0) -> None:
+        self.generation = generation
+        self._entries = list(entries)
+        prefix_keys: List[tuple[str, int]] = []
+        self._trigrams: Dict[str, List[int]] = {}
+
+        for idx, entry in enumerate(self._entries):
+            keys = entry.keys
+            words = {word for key in keys for word in key.split() if word not in keys}
+            for key in (*keys, *words):
+                prefix_keys.append((key, idx))
+            grams = set().union(*(trigrams(key) for key in keys)) if keys else set()
+            for gram in grams:
+                self._trigrams.setdefault(gram, []).append(idx)
+
+        prefix_keys.sort()
+        self._prefix_keys = [key for key, _ in prefix_keys]
+        self._prefix_ids = [idx for _, idx in prefix_keys]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def search(self, query: str, limit: int = 10) -> List[tuple[SystemEntry, float]]:
+        query = normalize(query)
+        if not query:
+            return []
+
+        scores: Dict[int, float] = {}
+
+        pos = bisect.bisect_left(self._prefix_keys, query)
+        end = min(len(self._prefix_keys), pos + MAX_PREFIX_SCAN)
+        while pos < end and self._prefix_keys[pos].startswith(query):
+            idx = self._prefix_ids[pos]
+            key = self._prefix_keys[pos]
+            # точное совпадение выше префиксного, короткие ключи выше длинных
+            score = 1.0 if key == query else 0.8 - min(0.2, (len(key) - len(query)) / 100)
+            if score > scores.get(idx, 0.0):
+                scores[idx] = score
+            pos += 1
+
+        if len(scores) < limit:
+            query_grams = trigrams(query)
+            postings = [self._trigrams.get(gram, []) for gram in query_grams]
+            # слишком частые триграммы почти не различают системы, но дороги в подсчёте
+            stop_size = max(100, len(self._entries) // 10)
+            selective = [posting for posting in postings if len(posting) <= stop_size]
+            if len(selective) * 2 >= len(postings):
+                postings = selective
+            counts: Counter[int] = Counter()
+            for posting in postings:
+                counts.update(posting)
+            for idx, shared in counts.items():
+                similarity = shared / len(postings)
+                if similarity >= 0.5:
+                    scores[idx] = max(scores.get(idx, 0.0), 0.6 * similarity)
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], len(self._entries[item[0]].name), item[0]),
+        )
+        return [(self._entries[idx], round(score, 4)) for idx, score in ranked[:limit]]
+
+
+def load_system_entries() -> List[SystemEntry]:
+    return [
+        SystemEntry(
+            system_id=system.system_id,
+            name=system.name,
+            aliases=[str(alias) for alias in (system.aliases or []) if alias],
+        )
+        for system in crud.list_systems()
+    ]
+
+
+_index_lock = threading.Lock()
+_current_index: SystemSearchIndex | None = None
+
+
+def get_system_search_index() -> SystemSearchIndex:
+    """Текущий индекс; перестраивается, когда меняется поколение реестра."""
+    global _current_index
+    generation = get_registry_generation()
+    index = _current_index
+    if index is None or index.generation != generation:
+        with _index_lock:
+            if _current_index is None or _current_index.generation != generation:
+                _current_index = SystemSearchIndex(load_system_entries(), generation=generation)
+            index = _current_index
+    return index
@@ -1,5 +1,7 @@
-import json
 import re
+from typing import Iterable
+
+import orjson
 
 
 class LLMJsonParseError(ValueError):
@@ -8,14 +10,246 @@ class LLMJsonParseError(ValueError):
 
 CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
 
+_LITERALS = {"true": "true", "false": "false", "null": "null",
+             "True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def strip_code_fences(raw: str) -> str:
+    return CODE_FENCE_PATTERN.sub("", raw.strip()).strip()
+
+
+def _strip_trailing(out: list[str], chars: str) -> None:
+    while out and (out[-1].isspace() or out[-1] in chars):
+        out.pop()
+
+
+def repair_json(text: str) -> str:
+    """
+    Исправляет типичные дефекты JSON от LLM за один проход:
+    одинарные кавычки, висячие запятые, Python-литералы (True/None),
+    оборванные строки, значения и незакрытые скобки.
+    """
+    out: list[str] = []
+    stack: list[str] = []
+    # для каждого открытого объекта: True, если ожидается ключ
+    key_expected: list[bool] = []
+    quote: str | None = None
+    escape = False
+    i = 0
+    n = len(text)
+
+    while i < n:
+        ch = text[i]
+
+        if quote is not None:
+            if escape:
+                escape = False
+                if ch == "'":
+                    out[-1] = "'"  # \' -> '
+                else:
+                    out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            key_expected.append(ch == "{")
+            out.append(ch)
+        elif ch in "}]":
+            _strip_trailing(out, ",")
+            if stack:
+                stack.pop()
+                key_expected.pop()
+            out.append(ch)
+        elif ch == ",":
+            if key_expected and stack[-1] == "{":
+                key_expected[-1] = True
+            out.append(ch)
+        elif ch == ":":
+            if key_expected:
+                key_expected[-1] = False
+            out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            if stack and stack[-1] == "{" and key_expected[-1]:
+                out.append(f'"{word}"')  # ключ без кавычек
+            else:
+                out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if quote is not None:
+        if escape:
+            out.pop()
+        out.append('"')
+
+    # дописываем оборванный хвост: литерал, число, ключ без значения
+    tail = "".join(out[-6:])
+    for literal in ("true", "false", "null"):
+        size = next(
+            (
+                size
+                for size in range(len(literal) - 1, 0, -1)
+                if tail.endswith(literal[:size]) and not tail[:-size][-1:].isalnum()
+            ),
+            0,
+        )
+        if size:
+            out.append(literal[size:])
+            break
+    _strip_trailing(out, ",")
+    # оборванное число ("-", "1.", "1e-"): знак, точка и экспонента без цифр
+    # отбрасываются целиком; "e" в конце литерала (true/false) не трогается
+    end = len(out)
+    while end and out[end - 1] in ("-", "+", ".", "e", "E"):
+        end -= 1
+    if end < len(out) and not (end and out[end - 1][-1:].isalpha()):
+        del out[end:]
+        _strip_trailing(out, ",")
+    if out and out[-1] == ":":
+        out.append("null")
+    elif stack and stack[-1] == "{" and key_expected and key_expected[-1] and out[-1:] == ['"']:
+        out.append(": null")
+
+    for opener in reversed(stack):
+        _strip_trailing(out, ",")
+        out.append(_CLOSERS[opener])
+
+    return "".join(out)
+
+
+_SCAN_PATTERN = re.compile(r'[{}"\\]')
+
+
+class JsonObjectScanner:
+    """
+    Однопроходный поиск первого полного JSON-объекта верхнего уровня.
+
+    Учитывает строки и экранирование, работает без бэктрекинга и может
+    получать текст по частям (feed) — например, из потокового ответа LLM.
+    """
+
+    def __init__(self) -> None:
+        self._parts: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._result: str | None = None
+
+    @property
+    def started(self) -> bool:
+        return bool(self._parts)
+
+    @property
+    def result(self) -> str | None:
+        return self._result
+
+    @property
+    def partial(self) -> str:
+        """Текст начатого, но ещё не закрытого объекта."""
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> str | None:
+        """Возвращает текст объекта, как только он закрыт, иначе None."""
+        if self._result is not None or not chunk:
+            return self._result
+
+        offset = 0
+        if not self._parts:
+            offset = chunk.find("{")
+            if offset == -1:
+                return None
+
+        skip = offset if self._escape else -1
+        self._escape = False
+        for match in _SCAN_PATTERN.finditer(chunk, offset):
+            pos = match.start()
+            if pos == skip:
+                continue
+            ch = match.group()
+            if self._in_string:
+                if ch == "\\":
+                    if pos + 1 == len(chunk):
+                        self._escape = True
+                    skip = pos + 1
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[offset : pos + 1])
+                    self._result = "".join(self._parts)
+                    return self._result
+
+        self._parts.append(chunk[offset:])
+        return None
+
+
+def is_truncated_json(raw: str) -> bool:
+    """True, если в ответе открыт JSON-объект, который так и не был закрыт."""
+    scanner = JsonObjectScanner()
+    return scanner.feed(strip_code_fences(raw)) is None and scanner.started
 
-def extract_json_from_response(raw: str) -> dict:
+
+def _loads_object(candidate: str, repair: bool) -> dict:
+    try:
+        return orjson.loads(candidate)
+    except orjson.JSONDecodeError as exc:
+        if not repair:
+            raise LLMJsonParseError(f"Invalid JSON extracted: {exc}") from exc
+    try:
+        return orjson.loads(repair_json(candidate))
+    except orjson.JSONDecodeError as exc:
+        raise LLMJsonParseError(f"Invalid JSON after repair: {exc}") from exc
+
+
+def extract_json_from_chunks(chunks: Iterable[str], repair: bool = True) -> dict:
+    """Потоковый вариант extract_json_from_response: читает чанки до закрытия объекта."""
+    scanner = JsonObjectScanner()
+    for chunk in chunks:
+        candidate = scanner.feed(chunk)
+        if candidate is not None:
+            return _loads_object(candidate, repair)
+    if scanner.started and repair:
+        return _loads_object(strip_code_fences(scanner.partial), repair)
+    raise LLMJsonParseError("Unable to locate JSON object in LLM response")
+
+
+def extract_json_from_response(raw: str, repair: bool = True) -> dict:
     """
     Извлекает JSON-объект из строки ответа LLM.
 
     Поддерживает форматы:
     - чистый JSON;
-    - обёрнутый в ```json ... ```.
+    - обёрнутый в ```json ... ```;
+    - JSON, окружённый текстом (берётся первый полный объект верхнего уровня);
+    - с типичными дефектами (см. repair_json), если repair=True.
 
     Raises:
         LLMJsonParseError: если JSON не найден или невалиден.
@@ -23,24 +257,13 @@ def extract_json_from_response(raw: str) -> dict:
     if not raw or not raw.strip():
         raise LLMJsonParseError("LLM response is empty")
 
-    stripped = raw.strip()
-
     # Удаляем Markdown-кодовые блоки
-    stripped = CODE_FENCE_PATTERN.sub("", stripped).strip()
+    stripped = strip_code_fences(raw)
 
     # Пробуем прямой парсинг
     try:
-        return json.loads(stripped)
-    except json.JSONDecodeError:
+        return orjson.loads(stripped)
+    except orjson.JSONDecodeError:
         pass
 
-    # Пытаемся вытащить JSON через регулярку
-    match = re.search(r"\{.*\}", stripped, re.DOTALL)
-    if match:
-        candidate = match.group(0)
-        try:
-            return json.loads(candidate)
-        except json.JSONDecodeError as exc:
-            raise LLMJsonParseError(f"Invalid JSON extracted: {exc}") from exc
-
-    raise LLMJsonParseError("Unable to locate JSON object in LLM response")
\ No newline at end of file
+    return extract_json_from_chunks([stripped], repair=repair)
@@ -0,0 +1,138 @@
+"""
+Неблокирующее структурированное логирование.
+
+Вызывающий поток только кладёт LogRecord в очередь (QueueHandler); форматирование
+в JSON, обработка больших payload-ов и запись на диск выполняются потоком
+QueueListener. Большие значения передаются через extra={"payload": ...} и
+обрезаются, хешируются или пишутся целиком по правилам из настроек.
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import logging
+import queue
+import random
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Iterator
+
+import orjson
+
+from src.config import get_settings
+
+settings = get_settings()
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+# попал ли текущий запрос в выборку для полного логирования payload-ов
+payload_sampled_var: ContextVar[bool] = ContextVar("payload_sampled", default=False)
+
+_listener: QueueListener | None = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def request_context(request_id: str | None = None) -> Iterator[str]:
+    """Привязывает request id (и решение о выборке payload-ов) к текущему контексту."""
+    request_id = request_id or new_request_id()
+    id_token = request_id_var.set(request_id)
+    sampled_token = payload_sampled_var.set(random.random() < settings.log_payload_sample_rate)
+    try:
+        yield request_id
+    finally:
+        request_id_var.reset(id_token)
+        payload_sampled_var.reset(sampled_token)
+
+
+def _payload_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        # список сообщений LangChain: "тип: содержимое"
+        return "\n".join(
+            f"{getattr(item, 'type', 'item')}: {getattr(item, 'content', item)}" for item in value
+        )
+    return str(getattr(value, "content", value))
+
+
+def summarize_payload(value: Any, sampled: bool = False) -> dict | None:
+    mode = "full" if sampled else settings.log_payload_mode
+    if mode == "off":
+        return None
+    text = _payload_text(value)
+    summary: dict[str, Any] = {"chars": len(text)}
+    if mode == "hash":
+        summary["sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    elif mode == "full" or len(text) <= settings.log_payload_max_chars:
+        summary["text"] = text
+    else:
+        summary["text"] = text[: settings.log_payload_max_chars]
+        summary["truncated"] = True
+        summary["sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return summary
+
+
+class ContextFilter(logging.Filter):
+    """Копирует контекст запроса в запись: в потоке listener-а его уже нет."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.payload_sampled = payload_sampled_var.get()
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке: запись уходит в
+    очередь как есть и форматируется listener-ом (в пределах одного процесса).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if hasattr(record, "payload"):
+            payload = summarize_payload(record.payload, getattr(record, "payload_sampled", False))
+            if payload is not None:
+                entry["payload"] = payload
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode("utf-8")
+
+
+def setup_logging() -> None:
+    """Настраивает корневой логгер: очередь в вызывающем потоке, JSON-файл в фоне."""
+    global _listener
+    if _listener is not None:
+        return
+
+    settings.log_path.parent.mkdir(parents=True, exist_ok=True)
+    file_handler = logging.FileHandler(settings.log_path, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(settings.log_level)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.embeddings import client as client_module
+from src.embeddings.client import SocketEmbeddings
+from src.embeddings.server import EmbeddingServer
+
+
+class FakeModel:
+    """Вектор — (длина текста, число переводов строк, номер вызова encode)."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls += 1
+        return np.array([[len(t), t.count("\n"), self.calls] for t in texts], dtype=np.float32)
+
+
+class FakeModelServer(EmbeddingServer):
+    def _load_model(self) -> None:
+        self._model = FakeModel()
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = tmp_path / "embed.sock"
+    server = FakeModelServer("fake", path, max_batch=4, batch_wait=0.001)
+    started = threading.Event()
+    control = {}
+
+    async def run() -> None:
+        control["loop"] = asyncio.get_running_loop()
+        control["task"] = asyncio.current_task()
+        started.set()
+        await server.serve_forever()
+
+    def target() -> None:
+        try:
+            asyncio.run(run())
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    started.wait(timeout=5)
+    deadline = time.monotonic() + 5
+    while not path.exists():
+        assert time.monotonic() < deadline, "embedding server did not start"
+        time.sleep(0.01)
+    yield path
+    control["loop"].call_soon_threadsafe(control["task"].cancel)
+    thread.join(timeout=5)
+
+
+def test_splits_requests_above_protocol_limit(socket_path, monkeypatch):
+    monkeypatch.setattr(client_module, "MAX_TEXTS", 3)
+    texts = ["x" * n for n in range(1, 8)]
+
+    embeddings = SocketEmbeddings(socket_path)
+    vectors = embeddings.embed_documents(texts)
+    embeddings._close()
+
+    assert [v[0] for v in vectors] == [float(n) for n in range(1, 8)]
+    # три запроса: 3 + 3 + 1 текст
+    assert sorted({v[2] for v in vectors}) == [1.0, 2.0, 3.0]
+
+
+def test_server_replaces_newlines_like_huggingface(socket_path):
+    embeddings = SocketEmbeddings(socket_path)
+
+    assert embeddings.embed_query("a\nb")[:2] == [3.0, 0.0]
+    assert embeddings.embed_documents(["a\nb\nc"])[0][:2] == [5.0, 0.0]
+    embeddings._close()
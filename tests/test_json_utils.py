@@ -0,0 +1,80 @@
+import pytest
+
+from src.utils.json_utils import (
+    JsonObjectScanner,
+    LLMJsonParseError,
+    extract_json_from_chunks,
+    extract_json_from_response,
+    is_truncated_json,
+    repair_json,
+)
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        # висячие запятые
+        ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+        # одинарные кавычки и экранированная кавычка внутри строки
+        ("{'a': 'it\\'s', 'b': \"x\"}", {"a": "it's", "b": "x"}),
+        # Python-литералы и ключи без кавычек
+        ("{a: True, b: None, c: False}", {"a": True, "b": None, "c": False}),
+        # оборванная строка и незакрытые скобки
+        ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+        ('{"a": "unterminated', {"a": "unterminated"}),
+        # оборванный литерал
+        ('{"a": tru', {"a": True}),
+        ('{"a": [fals', {"a": [False]}),
+        # ключ без значения
+        ('{"a": 1, "b"', {"a": 1, "b": None}),
+        ('{"a": 1, "b": ', {"a": 1, "b": None}),
+        # оборванное число: знак, точка, экспонента без цифр
+        ('{"a": -', {"a": None}),
+        ('{"a": -.', {"a": None}),
+        ('{"a": 1.', {"a": 1}),
+        ('{"a": 1e-', {"a": 1}),
+        ('{"a": -1.5e', {"a": -1.5}),
+        ('{"a": [1, -', {"a": [1]}),
+    ],
+)
+def test_repair_json(raw, expected):
+    assert extract_json_from_response(raw) == expected
+
+
+def test_repair_keeps_literal_ending_in_e():
+    assert repair_json('{"a": true') == '{"a": true}'
+    assert repair_json('{"a": false') == '{"a": false}'
+
+
+def test_extract_from_fenced_and_surrounded_text():
+    raw = 'Ответ:\n```json\n{"a": {"b": "}"}}\n```\nГотово.'
+    assert extract_json_from_response(raw) == {"a": {"b": "}"}}
+    assert extract_json_from_response('prefix {"a": 1} suffix {"b": 2}') == {"a": 1}
+
+
+def test_extract_without_repair_raises():
+    with pytest.raises(LLMJsonParseError):
+        extract_json_from_response('{"a": 1,}', repair=False)
+
+
+def test_empty_response_raises():
+    with pytest.raises(LLMJsonParseError):
+        extract_json_from_response("   ")
+
+
+def test_scanner_handles_chunk_boundaries():
+    chunks = ['{"a": "x\\', '"y", "b": {', '"c": 1}', "} trailing"]
+    scanner = JsonObjectScanner()
+    results = [scanner.feed(chunk) for chunk in chunks]
+    assert results[:3] == [None, None, None]
+    assert results[3] == '{"a": "x\\"y", "b": {"c": 1}}'
+
+
+def test_extract_from_chunks_repairs_truncated_stream():
+    assert extract_json_from_chunks(['{"a": [1, ', "2"]) == {"a": [1, 2]}
+
+
+def test_is_truncated_json():
+    assert is_truncated_json('{"a": [1, 2')
+    assert not is_truncated_json('{"a": 1}')
+    assert not is_truncated_json("no json here")
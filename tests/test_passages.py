@@ -0,0 +1,98 @@
+import re
+
+import pytest
+from langchain_core.documents import Document
+
+from src.retrieval import passages
+from src.retrieval.budget import fuse_documents
+from src.retrieval.passages import (
+    SPAN_SEPARATOR,
+    assemble_parent_spans,
+    build_child_passages,
+    restore_parent_chunks,
+)
+
+SENTENCES = [f"Sentence number {i} about payments." for i in range(60)]
+
+
+def _sentences(text):
+    return [sentence.strip() for sentence in re.findall(r"[^.…]+\.", text)]
+
+
+@pytest.fixture(autouse=True)
+def simple_sentence_splitter(monkeypatch):
+    # токенизатор nltk в тестах не нужен: предложения кончаются точкой
+    monkeypatch.setattr(passages, "split_sentences", _sentences)
+
+
+def _chunks(bounds, base="rag::wiki::payments"):
+    # как chunk_text: каждый следующий чанк повторяет хвост предыдущего
+    return [
+        Document(
+            page_content=" ".join(SENTENCES[start:end]),
+            metadata={
+                "doc_id": f"{base}::{index}",
+                "doc_base_id": base,
+                "source": "wiki",
+                "chunk_index": index,
+            },
+        )
+        for index, (start, end) in enumerate(bounds)
+    ]
+
+
+OVERLAPPING = [(0, 20), (12, 32), (24, 44), (36, 60)]
+
+
+def test_windows_cover_each_sentence_once():
+    windows = build_child_passages(_chunks(OVERLAPPING), window=3)
+
+    assert len(windows) == 20
+    covered = [s for window in windows for s in _sentences(window.page_content)]
+    assert covered == SENTENCES
+    assert {w.metadata["doc_base_id"] for w in windows} == {"rag::wiki::payments"}
+    assert windows[15].metadata["sentence_start"] == 45
+    assert windows[15].metadata["sentence_end"] == 48
+
+
+def test_overlapping_chunks_assemble_without_repeated_sentences():
+    windows = build_child_passages(_chunks(OVERLAPPING), window=3)
+    # результат поиска по «Sentence number 47»: лучшие окна и их соседи
+    hits = [windows[15], windows[16], windows[14], windows[2]]
+
+    context = assemble_parent_spans(fuse_documents({("default", "dense"): hits}), k=6)
+
+    assert len(context) == 1
+    doc = context[0]
+    sentences = _sentences(doc.page_content)
+    assert len(sentences) == len(set(sentences))
+    assert doc.metadata["doc_id"] == "rag::wiki::payments"
+    assert doc.metadata["spans"] == [[6, 9], [42, 51]]
+    assert SPAN_SEPARATOR in doc.page_content
+
+
+def test_identical_windows_are_dropped_before_ranking():
+    first = build_child_passages(_chunks([(0, 6)], base="rag::a::x"), window=3)
+    second = build_child_passages(_chunks([(0, 6)], base="rag::b::x"), window=3)
+
+    fused = fuse_documents(
+        {("default", "lexical"): first + second, ("default", "dense"): second + first}
+    )
+
+    assert len(fused) == 2
+    assert len({doc.page_content for doc in fused}) == 2
+
+
+def test_restores_chunks_from_legacy_windows():
+    legacy = [
+        Document(
+            page_content=text,
+            metadata={"doc_id": f"p::w{i}", "parent_id": "p", "child_index": i, "chunk_index": 4},
+        )
+        for i, text in enumerate(["A one. A two.", "A three."])
+    ]
+
+    [chunk] = restore_parent_chunks(list(reversed(legacy)))
+
+    assert chunk.page_content == "A one. A two. A three."
+    assert chunk.metadata == {"doc_id": "p", "chunk_index": 4}
@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from src.config import LLMBackendSettings
+from src.llm import router as router_module
+from src.llm.router import LLMRouter, NoHealthyBackendError
+
+
+class _Chunk:
+    def __init__(self, content: str) -> None:
+        self.content = content
+
+
+class StubModel:
+    """Чат-модель-заглушка: задержка до первого токена и/или ошибка."""
+
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False) -> None:
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def astream(self, messages):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        yield _Chunk(self.name)
+
+
+@pytest.fixture
+def stubs(monkeypatch):
+    models: dict[str, StubModel] = {}
+    built: list[str] = []
+
+    def build_chat_model(provider, model, **kwargs):
+        built.append(model)
+        return models[model]
+
+    monkeypatch.setattr(router_module, "build_chat_model", build_chat_model)
+    return models, built
+
+
+def _router(names, **kwargs) -> LLMRouter:
+    return LLMRouter([LLMBackendSettings(name=name, model=name) for name in names], **kwargs)
+
+
+def test_fails_over_to_next_backend(stubs):
+    models, _ = stubs
+    models["a"] = StubModel("a", fail=True)
+    models["b"] = StubModel("b")
+    router = _router(["a", "b"])
+
+    assert router.invoke([]) == "b"
+    assert models["a"].calls == 1
+
+
+def test_raises_when_all_backends_fail(stubs):
+    models, _ = stubs
+    models["a"] = StubModel("a", fail=True)
+    models["b"] = StubModel("b", fail=True)
+
+    with pytest.raises(NoHealthyBackendError):
+        _router(["a", "b"]).invoke([])
+
+
+def test_failing_backend_leaves_rotation_after_threshold(stubs):
+    models, _ = stubs
+    models["a"] = StubModel("a", fail=True)
+    router = _router(["a"], failure_threshold=2, cooldown=60)
+    state = router.backends[0]
+
+    with pytest.raises(NoHealthyBackendError):
+        router.invoke([])
+    assert state.unhealthy_until == 0.0
+    with pytest.raises(NoHealthyBackendError):
+        router.invoke([])
+    assert state.unhealthy_until > time.monotonic()
+
+
+def test_unhealthy_backend_is_skipped(stubs):
+    models, _ = stubs
+    models["a"] = StubModel("a")
+    models["b"] = StubModel("b")
+    router = _router(["a", "b"])
+    {b.name: b for b in router.backends}["a"].unhealthy_until = time.monotonic() + 60
+
+    for _ in range(3):
+        assert router.invoke([]) == "b"
+    assert models["a"].calls == 0
+
+
+def test_hedges_slow_backend_and_cancels_loser(stubs):
+    models, _ = stubs
+    models["slow"] = StubModel("slow", delay=1.0)
+    models["fast"] = StubModel("fast")
+    router = _router(["slow", "fast"], hedge_enabled=True, hedge_initial_delay=0.05)
+
+    started = time.monotonic()
+    assert router.invoke([]) == "fast"
+    assert time.monotonic() - started < 0.5
+    assert models["slow"].cancelled == 1
+
+
+def test_does_not_hedge_to_unhealthy_backend(stubs):
+    models, _ = stubs
+    models["slow"] = StubModel("slow", delay=0.2)
+    models["fast"] = StubModel("fast")
+    router = _router(["slow", "fast"], hedge_enabled=True, hedge_initial_delay=0.05)
+    {b.name: b for b in router.backends}["fast"].unhealthy_until = time.monotonic() + 60
+
+    assert router.invoke([]) == "slow"
+    assert models["fast"].calls == 0
+
+
+def test_reuses_client_per_backend(stubs):
+    models, built = stubs
+    models["a"] = StubModel("a")
+    router = _router(["a"])
+
+    for _ in range(3):
+        router.invoke([])
+    assert built == ["a"]